@@ -1,6 +1,31 @@
 ﻿# catalog/admin.py
+import csv
+
 from django.contrib import admin
-from .models import Product, Event, EventRegistration
+from django.db.models import Count
+from django.http import Http404, StreamingHttpResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from .models import (
+    Product,
+    Event,
+    EventRegistration,
+    EventWaitlistEntry,
+    Room,
+    RoomBooking,
+    RoomBookingSeries,
+    Task,
+    ArchivedEvent,
+    ArchivedRoomBooking,
+)
+
+
+class Echo:
+    """File-like object for csv.writer that just hands each row back."""
+
+    def write(self, value):
+        return value
 
 
 @admin.register(Product)
@@ -9,20 +34,151 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("name",)}
     search_fields = ("name", "category")
     list_filter = ("category",)
-
-
-class EventRegistrationInline(admin.TabularInline):
-    model = EventRegistration
-    extra = 0
-    readonly_fields = ("user", "registered_at")
-    can_delete = False
+    # don't run a second COUNT(*) over the whole table on every changelist
+    show_full_result_count = False
 
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ("title", "date", "capacity")
+    list_display = ("title", "date", "capacity", "registrations")
     prepopulated_fields = {"slug": ("title",)}
-    search_fields = ("title", "location")
-    inlines = [EventRegistrationInline]
+    search_fields = ("title",)
+    readonly_fields = ("attendees",)
+    show_full_result_count = False
+
+    # No registrations inline: a popular event would render every attendee
+    # (plus a user query per row) on the change page. The attendee list is
+    # streamed from its own URL instead, only when someone asks for it.
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.annotate(num_registrations=Count("registrations"))
+
+    @admin.display(description="Registrations", ordering="num_registrations")
+    def registrations(self, obj):
+        return obj.num_registrations
+
+    @admin.display(description="Attendees")
+    def attendees(self, obj):
+        if obj.pk is None:
+            return "-"
+        url = reverse("admin:catalog_event_attendees", args=[obj.pk])
+        return format_html(
+            '{} registered · <a href="{}">Download attendee list (CSV)</a>',
+            obj.registrations_count,
+            url,
+        )
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<path:object_id>/attendees/",
+                self.admin_site.admin_view(self.attendees_view),
+                name="catalog_event_attendees",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def attendees_view(self, request, object_id):
+        """Stream an event's attendees as CSV without loading them all."""
+        event = self.get_object(request, object_id)
+        if event is None or not self.has_view_permission(request, event):
+            raise Http404("Event not found.")
+
+        rows = (
+            EventRegistration.objects
+            .filter(event=event)
+            .order_by("registered_at")
+            .values_list("user__username", "user__email", "registered_at")
+            .iterator(chunk_size=2000)
+        )
+        writer = csv.writer(Echo())
+
+        def stream():
+            yield writer.writerow(["username", "email", "registered_at"])
+            for username, email, registered_at in rows:
+                yield writer.writerow([username, email, registered_at.isoformat()])
+
+        response = StreamingHttpResponse(stream(), content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="{event.slug}-attendees.csv"'
+        return response
+
+
+@admin.register(EventRegistration)
+class EventRegistrationAdmin(admin.ModelAdmin):
+    list_display = ("event", "user", "registered_at")
+    list_select_related = ("event", "user")
+    raw_id_fields = ("event", "user")
+    search_fields = ("event__title", "user__username")
+    date_hierarchy = "registered_at"
+    show_full_result_count = False
+
+
+@admin.register(EventWaitlistEntry)
+class EventWaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ("event", "user", "joined_at")
+    list_select_related = ("event", "user")
+    raw_id_fields = ("event", "user")
+    search_fields = ("event__title", "user__username")
+
+
+@admin.register(Room)
+class RoomAdmin(admin.ModelAdmin):
+    list_display = ("name", "capacity", "color")
+    prepopulated_fields = {"slug": ("name",)}
+    search_fields = ("name",)
+
+
+@admin.register(RoomBooking)
+class RoomBookingAdmin(admin.ModelAdmin):
+    list_display = ("room", "user", "start_time", "end_time", "fee_charged")
+    list_select_related = ("room", "user")
+    list_filter = ("room",)
+    raw_id_fields = ("user",)
+    search_fields = ("user__username", "room__name")
+    date_hierarchy = "start_time"
+    show_full_result_count = False
+
+
+@admin.register(RoomBookingSeries)
+class RoomBookingSeriesAdmin(admin.ModelAdmin):
+    list_display = ("room", "user", "start_time", "interval_weeks", "occurrences", "until")
+    list_select_related = ("room", "user")
+    raw_id_fields = ("user",)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ("name", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status",)
+    search_fields = ("name", "dedup_key")
+    readonly_fields = ("last_error",)
+    show_full_result_count = False
+
+
+class ArchiveAdmin(admin.ModelAdmin):
+    """Archived rows are written only by catalog/archive.py."""
+
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedEvent)
+class ArchivedEventAdmin(ArchiveAdmin):
+    list_display = ("title", "date", "capacity", "archived_at")
+    search_fields = ("title", "slug")
+    date_hierarchy = "date"
 
 
+@admin.register(ArchivedRoomBooking)
+class ArchivedRoomBookingAdmin(ArchiveAdmin):
+    list_display = ("room", "user", "start_time", "end_time", "fee_charged")
+    list_select_related = ("room", "user")
+    list_filter = ("room",)
+    search_fields = ("user__username", "room__name")
+    date_hierarchy = "start_time"
@@ -0,0 +1,133 @@
+# catalog/admission.py
+"""
+Admission control for event sign-ups.
+
+When a popular event opens, event_register is hit by hundreds of users at
+once. Before the view touches the database, admit() checks, in the cache
+only:
+
+1. a per-user rate: ADMISSION_USER_LIMIT attempts per
+   ADMISSION_USER_WINDOW seconds.
+2. a per-event rate: at most ADMISSION_EVENT_RATE attempts per second
+   reach the database; the rest are shed with 429 + Retry-After.
+3. the event's "full" flag: set once a registration attempt sees the event
+   at capacity, cleared by the signals when a registration is removed or
+   the event is edited. A full event skips the capacity COUNT and the
+   user goes straight onto its waitlist (catalog/waitlist.py).
+
+The rates come first so a rush on a full event is throttled too.
+
+Rates are fixed-window counters (cache.add + cache.incr) and the flag is a
+plain key, all in the ADMISSION_CACHE cache. It has to be shared by every
+worker process (the default is its own database cache table) for the
+limits to hold, and for a spot freed in one process to clear the flag in
+the others.
+
+Every decision is counted; metrics() returns the totals.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+ADMITTED = "admitted"
+FULL = "full"
+EVENT_RATE = "event_rate"
+USER_RATE = "user_rate"
+DECISIONS = (ADMITTED, FULL, EVENT_RATE, USER_RATE)
+
+# how long a "full" flag lives if nothing clears it
+FULL_FLAG_TIMEOUT = 300
+# keep the totals around for a day after the last update
+METRICS_TIMEOUT = 24 * 3600
+
+
+def _cache():
+    return caches[getattr(settings, "ADMISSION_CACHE", "default")]
+
+
+def _hit(key, timeout):
+    """Atomically count one hit on `key`; returns the new total."""
+    cache = _cache()
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # expired between add() and incr()
+        cache.add(key, 1, timeout)
+        return 1
+
+
+def _full_key(slug):
+    return f"admission:full:{slug}"
+
+
+def _slug_key(event_id):
+    return f"admission:full-slug:{event_id}"
+
+
+def is_full(slug):
+    return _cache().get(_full_key(slug)) is not None
+
+
+def mark_full(event):
+    # the flag is looked up by slug (no query in the view); the id -> slug
+    # entry lets the signals clear it knowing only event_id
+    _cache().set_many(
+        {_full_key(event.slug): event.pk, _slug_key(event.pk): event.slug},
+        FULL_FLAG_TIMEOUT,
+    )
+
+
+def clear_full(event_id):
+    cache = _cache()
+    slug = cache.get(_slug_key(event_id))
+    if slug is not None:
+        cache.delete_many([_full_key(slug), _slug_key(event_id)])
+
+
+def admit(slug, user_id):
+    """Decide whether a registration attempt may go on to the database."""
+    now = int(time.time())
+    decision = ADMITTED
+
+    window = getattr(settings, "ADMISSION_USER_WINDOW", 10)
+    user_hits = _hit(f"admission:user:{user_id}:{now // window}", window)
+    if user_hits > getattr(settings, "ADMISSION_USER_LIMIT", 5):
+        decision = USER_RATE
+    elif _hit(f"admission:event:{slug}:{now}", 2) > getattr(settings, "ADMISSION_EVENT_RATE", 20):
+        decision = EVENT_RATE
+    elif is_full(slug):
+        decision = FULL
+
+    _hit(f"admission:metrics:{decision}", METRICS_TIMEOUT)
+    return decision
+
+
+def shed_response(decision):
+    """429 for a rate-limited attempt; browsers / clients retry after a second or two."""
+    if decision == USER_RATE:
+        retry_after = getattr(settings, "ADMISSION_USER_WINDOW", 10)
+        text = "You're trying to register too often. Please wait a few seconds."
+    else:
+        retry_after = 1
+        text = "Registration is very busy right now. Please try again in a moment."
+    response = HttpResponse(text, status=429, content_type="text/plain; charset=utf-8")
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def metrics():
+    """
+    {decision: count} since the counters were last reset, plus a 'shed'
+    total of the 429s. FULL attempts aren't shed: they join the waitlist.
+    """
+    counts = _cache().get_many([f"admission:metrics:{d}" for d in DECISIONS])
+    totals = {d: counts.get(f"admission:metrics:{d}", 0) for d in DECISIONS}
+    totals["shed"] = totals[EVENT_RATE] + totals[USER_RATE]
+    return totals
+
+
+def reset_metrics():
+    _cache().delete_many([f"admission:metrics:{d}" for d in DECISIONS])
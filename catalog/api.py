@@ -0,0 +1,343 @@
+# catalog/api.py
+"""
+Versioned JSON read API for the kiosk and mobile clients (/api/v1/...).
+
+    GET /api/v1/events/?fields=title,start_time,registered&limit=20
+    -> {"data":[{"id":3,"title":...},...],"next":"WyIyMDI2LTEw..."}
+
+- fields: sparse fieldsets; only the named fields are selected from the
+  database (id is always included). Unknown names are a 400.
+- limit / cursor: keyset pagination. Each resource is ordered by indexed
+  columns ending in the primary key, and `next` encodes the last row's
+  values, so page N costs the same as page 1 (no OFFSET). Cursor values
+  are checked against the ordering columns' types; a bad one is a 400.
+- /bookings/ is for signed-in users only (401 otherwise), like the
+  booking pages.
+- Related data (registration counts, the current user's registrations,
+  booking rooms) is loaded for the whole page with one IN query per
+  relation, never per row. A page costs the same number of queries
+  whatever its size.
+
+Responses are compact JSON (no whitespace); dates and decimals go through
+DjangoJSONEncoder as ISO strings / strings.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db.models import Count, Q
+from django.http import JsonResponse
+from django.urls import reverse
+
+from .models import Event, EventRegistration, Product, Room, RoomBooking
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class BadRequest(ValueError):
+    """A query parameter the API can't honour; reported as a 400."""
+
+
+# =========================
+# CURSORS
+# =========================
+
+def encode_cursor(values):
+    # full isoformat: DjangoJSONEncoder drops microseconds, and the cursor
+    # must compare equal to the stored value
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, (date, datetime)) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequest("invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise BadRequest("invalid cursor")
+    return values
+
+
+def _cursor_values(model, ordering, cursor):
+    """The cursor's values as the ordering columns' Python types."""
+    values = []
+    for column, raw in zip(ordering, decode_cursor(cursor, len(ordering))):
+        try:
+            value = model._meta.get_field(column).to_python(raw)
+        except (TypeError, ValueError, ValidationError):
+            raise BadRequest("invalid cursor")
+        if value is None:
+            raise BadRequest("invalid cursor")
+        values.append(value)
+    return values
+
+
+def _after(ordering, values):
+    """Rows strictly after `values` in (ordering) order, as one Q."""
+    # (a, b, c) > (x, y, z)  ==  a > x  OR  (a = x AND b > y)  OR  ...
+    condition = Q()
+    for i, column in enumerate(ordering):
+        step = Q(**{f"{column}__gt": values[i]})
+        for prev, value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev: value})
+        condition |= step
+    return condition
+
+
+# =========================
+# RESOURCES
+# =========================
+
+class Resource:
+    """
+    One list endpoint. `columns` maps API field names to model fields read
+    with .values(); `loaders` maps the remaining field names to
+    (columns needed, method name). A loader gets the request and the whole
+    page of rows and fills its field in on every row.
+    """
+
+    model = None
+    ordering = ("id",)
+    columns = {}
+    loaders = {}
+    default_fields = ()
+    # answer signed-in users only (the matching HTML page is @login_required)
+    login_required = False
+
+    def queryset(self, request):
+        return self.model.objects.all()
+
+    @property
+    def field_names(self):
+        return ["id", *self.columns, *self.loaders]
+
+    def parse_fields(self, request):
+        requested = request.GET.get("fields")
+        if not requested:
+            return ["id", *self.default_fields]
+        names = ["id"]
+        for name in requested.split(","):
+            name = name.strip()
+            if name and name not in names:
+                if name not in self.columns and name not in self.loaders:
+                    raise BadRequest(
+                        f"unknown field {name!r}; choose from {', '.join(self.field_names)}"
+                    )
+                names.append(name)
+        return names
+
+    def page(self, request):
+        fields = self.parse_fields(request)
+        limit = _limit(request)
+
+        # only the columns this page needs, read as plain tuples
+        columns = ["id", *self.ordering]
+        for name in fields:
+            if name in self.columns:
+                columns.append(self.columns[name])
+            elif name in self.loaders:
+                columns.extend(self.loaders[name][0])
+        columns = list(dict.fromkeys(columns))
+
+        qs = self.queryset(request).order_by(*self.ordering)
+        cursor = request.GET.get("cursor")
+        if cursor:
+            qs = qs.filter(_after(self.ordering, _cursor_values(self.model, self.ordering, cursor)))
+        rows = [dict(zip(columns, values)) for values in qs.values_list(*columns)[:limit + 1]]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1][column] for column in self.ordering])
+
+        for name in fields:
+            if name in self.loaders:
+                getattr(self, self.loaders[name][1])(request, rows)
+
+        data = [
+            {name: row[self.columns.get(name, name)] for name in fields}
+            for row in rows
+        ]
+        return {"data": data, "next": next_cursor}
+
+
+def _limit(request):
+    raw = request.GET.get("limit")
+    if raw is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise BadRequest("limit must be a number")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise BadRequest(f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+class ProductResource(Resource):
+    model = Product
+    columns = {
+        "name": "name",
+        "slug": "slug",
+        "price": "price",
+        "category": "category",
+        "inventory": "inventory_qty",
+        "description": "description",
+    }
+    loaders = {
+        "image": (("image", "image_url"), "load_image"),
+        "url": (("slug",), "load_url"),
+    }
+    default_fields = ("name", "slug", "price", "category", "inventory", "image")
+
+    def queryset(self, request):
+        qs = Product.objects.all()
+        category = request.GET.get("category")
+        if category:
+            qs = qs.filter(category=category)
+        return qs
+
+    def load_image(self, request, rows):
+        for row in rows:
+            if row["image"]:
+                row["image"] = default_storage.url(row["image"])
+            else:
+                row["image"] = row["image_url"] or None
+
+    def load_url(self, request, rows):
+        _fill_urls(rows, "product_detail")
+
+
+class EventResource(Resource):
+    model = Event
+    # event_date_start_idx covers (date, start_time)
+    ordering = ("date", "start_time", "id")
+    columns = {
+        "title": "title",
+        "slug": "slug",
+        "description": "description",
+        "date": "date",
+        "start_time": "start_time",
+        "capacity": "capacity",
+    }
+    loaders = {
+        "registrations": ((), "load_registrations"),
+        "registered": ((), "load_registered"),
+        "url": (("slug",), "load_url"),
+    }
+    default_fields = ("title", "slug", "date", "start_time", "capacity", "registrations")
+
+    def load_registrations(self, request, rows):
+        counts = dict(
+            EventRegistration.objects.filter(event_id__in=[r["id"] for r in rows])
+            .order_by()
+            .values("event_id")
+            .annotate(n=Count("pk"))
+            .values_list("event_id", "n")
+        ) if rows else {}
+        for row in rows:
+            row["registrations"] = counts.get(row["id"], 0)
+
+    def load_registered(self, request, rows):
+        mine = set()
+        if rows and request.user.is_authenticated:
+            mine = set(
+                EventRegistration.objects.filter(
+                    user=request.user, event_id__in=[r["id"] for r in rows]
+                ).values_list("event_id", flat=True)
+            )
+        for row in rows:
+            row["registered"] = row["id"] in mine
+
+    def load_url(self, request, rows):
+        _fill_urls(rows, "event_detail")
+
+
+class RoomResource(Resource):
+    model = Room
+    columns = {
+        "name": "name",
+        "slug": "slug",
+        "capacity": "capacity",
+        "description": "description",
+        "color": "color",
+    }
+    default_fields = ("name", "slug", "capacity", "color")
+
+
+class BookingResource(Resource):
+    model = RoomBooking
+    # booking_start_idx
+    ordering = ("start_time", "id")
+    columns = {
+        "start_time": "start_time",
+        "end_time": "end_time",
+        "series": "series_id",
+    }
+    loaders = {
+        "room": (("room_id",), "load_room"),
+        "mine": (("user_id",), "load_mine"),
+    }
+    default_fields = ("room", "start_time", "end_time", "mine")
+    login_required = True
+    room_fields = ("id", "name", "slug", "color")
+
+    def queryset(self, request):
+        qs = RoomBooking.objects.all()
+        room = request.GET.get("room")
+        if room:
+            qs = qs.filter(room__slug=room)
+        return qs
+
+    def load_room(self, request, rows):
+        room_ids = {row["room_id"] for row in rows}
+        rooms = {
+            room["id"]: room
+            for room in Room.objects.filter(pk__in=room_ids).values(*self.room_fields)
+        } if room_ids else {}
+        for row in rows:
+            row["room"] = rooms.get(row["room_id"])
+
+    def load_mine(self, request, rows):
+        for row in rows:
+            row["mine"] = row["user_id"] == request.user.pk
+
+
+def _fill_urls(rows, url_name):
+    # reverse() once and substitute, rather than once per row
+    pattern = reverse(url_name, args=["__slug__"])
+    for row in rows:
+        row["url"] = pattern.replace("__slug__", row["slug"])
+
+
+RESOURCES = {
+    "products": ProductResource(),
+    "events": EventResource(),
+    "rooms": RoomResource(),
+    "bookings": BookingResource(),
+}
+
+
+def respond(request, resource):
+    """The JSON response for GET /api/v1/<resource>/."""
+    resource = RESOURCES[resource]
+    if resource.login_required and not request.user.is_authenticated:
+        body, status = {"error": "authentication required"}, 401
+    else:
+        try:
+            body = resource.page(request)
+            status = 200
+        except BadRequest as exc:
+            body, status = {"error": str(exc)}, 400
+    response = JsonResponse(body, status=status, json_dumps_params={"separators": (",", ":")})
+    response["Vary"] = "Cookie"
+    return response
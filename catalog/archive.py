@@ -0,0 +1,108 @@
+# catalog/archive.py
+"""
+Hot/cold archival.
+
+Past events (with their registrations) and room bookings that ended long
+ago are copied into the Archived* tables and deleted from the hot ones, a
+batch at a time, each batch in its own transaction. The default pages only
+ever read the hot tables; "Past events" and "Booking history" read the
+archive. Rows keep their primary keys.
+
+Moving a booking is not a cancellation, so the rollup signals are paused
+while bookings are deleted here and the utilization report is unchanged.
+
+Run it with `python manage.py archive_old_data` (e.g. nightly from cron).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups
+from .models import (
+    ArchivedEvent,
+    ArchivedEventRegistration,
+    ArchivedRoomBooking,
+    Event,
+    EventRegistration,
+    RoomBooking,
+)
+
+BATCH_SIZE = 500
+
+
+def _copy(obj, archive_model):
+    """Archive-model instance with the same column values as `obj`."""
+    return archive_model(**{
+        field.attname: getattr(obj, field.attname)
+        for field in archive_model._meta.concrete_fields
+        if field.attname != "archived_at"
+    })
+
+
+def event_cutoff(days=None):
+    """Events dated before this day belong in the archive."""
+    if days is None:
+        days = getattr(settings, "ARCHIVE_EVENTS_AFTER_DAYS", 7)
+    return timezone.localdate() - timedelta(days=days)
+
+
+def booking_cutoff(days=None):
+    """Bookings that ended before this moment belong in the archive."""
+    if days is None:
+        days = getattr(settings, "ARCHIVE_BOOKINGS_AFTER_DAYS", 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_events(days=None, batch_size=BATCH_SIZE):
+    """
+    Move events dated more than `days` ago and their registrations.
+    Returns (events moved, registrations moved).
+    """
+    cutoff = event_cutoff(days)
+    moved_events = moved_registrations = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                Event.objects.filter(date__lt=cutoff).order_by("date", "start_time")[:batch_size]
+            )
+            if not events:
+                break
+            ids = [event.pk for event in events]
+            registrations = list(EventRegistration.objects.filter(event_id__in=ids).order_by())
+
+            ArchivedEvent.objects.bulk_create(_copy(e, ArchivedEvent) for e in events)
+            ArchivedEventRegistration.objects.bulk_create(
+                (_copy(r, ArchivedEventRegistration) for r in registrations),
+                batch_size=1000,
+            )
+            # cascades to the registrations
+            Event.objects.filter(pk__in=ids).delete()
+
+        moved_events += len(events)
+        moved_registrations += len(registrations)
+    return moved_events, moved_registrations
+
+
+def archive_bookings(days=None, batch_size=BATCH_SIZE):
+    """Move bookings that ended more than `days` ago. Returns the number moved."""
+    cutoff = booking_cutoff(days)
+    moved = 0
+    with rollups.signals_paused():
+        while True:
+            with transaction.atomic():
+                bookings = list(
+                    # start_time < end_time, so the start_time filter is
+                    # redundant but lets the booking_start_idx narrow the scan
+                    RoomBooking.objects.filter(start_time__lt=cutoff, end_time__lt=cutoff)
+                    .order_by("start_time")[:batch_size]
+                )
+                if not bookings:
+                    break
+                ArchivedRoomBooking.objects.bulk_create(
+                    _copy(b, ArchivedRoomBooking) for b in bookings
+                )
+                RoomBooking.objects.filter(pk__in=[b.pk for b in bookings]).delete()
+            moved += len(bookings)
+    return moved
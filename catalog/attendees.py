@@ -0,0 +1,160 @@
+# catalog/attendees.py
+"""
+Bulk event registration for staff (tournament rosters, walk-ins).
+
+import_attendees() registers a whole list of usernames / emails at once:
+one query resolves the users, one reads the event's registrations, and
+bulk_create(ignore_conflicts=True) inserts the new ones, instead of the
+lookup + COUNT + INSERT per person that event_register does. Every input
+row gets a status in the returned report.
+
+Used by the staff "Import attendees" page and `manage.py import_attendees`.
+"""
+import csv
+import io
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from . import admission, pagecache, waitlist
+from .models import Event, EventRegistration
+
+# per-row statuses
+REGISTERED = "registered"
+ALREADY_REGISTERED = "already registered"
+DUPLICATE = "duplicate row"
+NOT_FOUND = "no such user"
+AMBIGUOUS = "matches several accounts"
+FULL = "event full"
+
+# header cells that are skipped when they appear on the first row
+HEADER_NAMES = frozenset(("username", "email", "user", "attendee"))
+# keep each IN (...) well under SQLite's bound-variable limit
+LOOKUP_CHUNK = 5000
+
+
+def read_identifiers(text):
+    """
+    (line number, username-or-email) for every non-empty CSV row.
+    Only the first column is used; a header row is skipped.
+    """
+    rows = []
+    for line_no, row in enumerate(csv.reader(io.StringIO(text)), start=1):
+        value = row[0].strip() if row else ""
+        if not value:
+            continue
+        if line_no == 1 and value.lower() in HEADER_NAMES:
+            continue
+        rows.append((line_no, value))
+    return rows
+
+
+def _is_email(value):
+    return "@" in value
+
+
+def resolve_users(values):
+    """
+    Map each identifier to the (pk, username) pairs it matches, one per
+    user. Every identifier is tried as an exact username (usernames may
+    contain "@"); ones with "@" also match emails case-insensitively.
+    """
+    User = get_user_model()
+    values = sorted(set(values))
+
+    found = {value: {} for value in values}
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        chunk = values[start:start + LOOKUP_CHUNK]
+        emails = {}
+        for value in chunk:
+            if _is_email(value):
+                emails.setdefault(value.lower(), []).append(value)
+        rows = (
+            User.objects.annotate(email_lower=Lower("email"))
+            .filter(Q(username__in=chunk) | Q(email_lower__in=list(emails)))
+            .values_list("pk", "username", "email_lower")
+        )
+        for pk, username, email in rows:
+            # keyed by pk: someone whose username is also their email
+            # matches once, not twice
+            if username in found:
+                found[username][pk] = (pk, username)
+            for value in emails.get(email, ()):
+                found[value][pk] = (pk, username)
+    return {value: list(matches.values()) for value, matches in found.items()}
+
+
+def import_attendees(event, rows):
+    """
+    Register the users named in `rows` ((line, identifier) pairs, see
+    read_identifiers) for `event`, respecting its capacity and the
+    one-registration-per-user constraint. Rows are taken in file order,
+    so when the event fills up it is the last rows that are turned away.
+
+    Returns one dict per row: line, identifier, username, status.
+    """
+    users = resolve_users([identifier for _, identifier in rows])
+
+    with transaction.atomic():
+        # serialize with other imports / sign-ups for this event
+        event = Event.objects.select_for_update().get(pk=event.pk)
+        registered = set(
+            EventRegistration.objects.filter(event=event).values_list("user_id", flat=True)
+        )
+        spots = event.capacity - len(registered) if event.capacity else None
+
+        report, new, queued = [], [], set()
+        for line, identifier in rows:
+            matches = users[identifier]
+            entry = {"line": line, "identifier": identifier, "username": ""}
+            report.append(entry)
+
+            if not matches:
+                entry["status"] = NOT_FOUND
+                continue
+            if len(matches) > 1:
+                entry["status"] = AMBIGUOUS
+                continue
+            user_id, entry["username"] = matches[0]
+            if user_id in registered:
+                entry["status"] = ALREADY_REGISTERED
+            elif user_id in queued:
+                entry["status"] = DUPLICATE
+            elif spots is not None and spots <= 0:
+                entry["status"] = FULL
+            else:
+                entry["status"] = REGISTERED
+                queued.add(user_id)
+                new.append(EventRegistration(event=event, user_id=user_id))
+                if spots is not None:
+                    spots -= 1
+
+        # ignore_conflicts: someone who registered themselves since the
+        # read above keeps that registration instead of failing the batch
+        EventRegistration.objects.bulk_create(new, ignore_conflicts=True, batch_size=1000)
+        # registered now, so no longer waiting
+        waitlist.leave_many(event, queued)
+    if new:
+        # bulk_create sends no signals
+        pagecache.bump(EventRegistration)
+    if spots is not None and spots <= 0:
+        # as event_register does once a sign-up takes the last spot
+        admission.mark_full(event)
+    return report
+
+
+def summarize(report):
+    """{status: count} for a report, in first-seen order."""
+    counts = {}
+    for entry in report:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return counts
+
+
+def write_report(report, fileobj):
+    writer = csv.writer(fileobj)
+    writer.writerow(["line", "identifier", "username", "status"])
+    for entry in report:
+        writer.writerow([entry["line"], entry["identifier"], entry["username"], entry["status"]])
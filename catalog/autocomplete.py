@@ -0,0 +1,300 @@
+# catalog/autocomplete.py
+"""
+In-memory prefix index for the search-as-you-type endpoint.
+
+Every word start of a product name becomes a key ("settlers of catan" ->
+"settlers of catan", "catan"), clipped to KEY_BYTES of UTF-8 and stored in
+a sorted fixed-width NumPy bytes array with a parallel array of product
+ids. A lookup is two binary searches (np.searchsorted) plus a short slice,
+independent of catalog size. Memory is KEY_BYTES + 8 bytes per key, about
+100 bytes per product, so a 500k catalog stays around 50 MB. Display
+fields for the few winners are fetched by primary key.
+
+Writers build new arrays and swap one reference, so readers always see a
+consistent snapshot without locking. Saves and deletes in this process
+arrive through signals and are only recorded (no query, no copy); the
+next lookup merges every recorded change in one pass, so a burst of
+saves costs one O(n) merge instead of one per save. Category names are
+kept as a code per key, so a change never has to re-read the categories
+from the database. Each recorded change gets a generation number; a
+build() that ran while changes came in merges the newer ones before it
+swaps its snapshot in, so none are lost. Saves and deletes in other
+worker processes are picked up at most every REFRESH_SECONDS by sync(),
+which runs on a background thread so a request never waits on it.
+"""
+import bisect
+import threading
+import time
+import unicodedata
+
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Count, Max
+
+from .models import Product
+
+KEY_BYTES = 24
+MAX_KEYS_PER_PRODUCT = 4
+REFRESH_SECONDS = 60
+SKIP_WORDS = frozenset(("a", "an", "and", "of", "the", "to", "for", "in", "on", "with"))
+
+
+def normalize(text):
+    """Lowercase, strip accents, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.casefold().split())
+
+
+def _clip(text):
+    return text.encode("utf-8")[:KEY_BYTES]
+
+
+def product_keys(name):
+    """Keys for one product: the full name plus later word starts."""
+    words = normalize(name).split(" ")
+    keys = []
+    for i, word in enumerate(words):
+        if not word or (i and word in SKIP_WORDS):
+            continue
+        keys.append(_clip(" ".join(words[i:])))
+        if len(keys) >= MAX_KEYS_PER_PRODUCT:
+            break
+    return keys
+
+
+class Snapshot:
+    """One immutable state of the index; replaced wholesale, never mutated."""
+
+    __slots__ = ("keys", "ids", "codes", "categories", "generation")
+
+    def __init__(self, keys, ids, codes, categories, generation):
+        self.keys = keys              # sorted S{KEY_BYTES} array
+        self.ids = ids                # product id per key
+        self.codes = codes            # category code per key
+        self.categories = categories  # sorted (normalized, original) pairs
+        self.generation = generation  # last recorded change included
+
+
+class PrefixIndex:
+    def __init__(self):
+        import numpy as np
+
+        self._np = np
+        self._key_dtype = np.dtype(f"S{KEY_BYTES}")
+        self._snapshot = Snapshot(
+            np.empty(0, self._key_dtype), np.empty(0, np.int64), np.empty(0, np.int32), [], 0
+        )
+        self._write_lock = threading.Lock()
+        # category name <-> code, append-only
+        self._category_names = []
+        self._category_codes = {}
+        # product id -> (generation, name, category), or (generation, None, None)
+        # if deleted; at most one entry per product, trimmed by each build()
+        self._changes = {}
+        self._generation = 0
+        self._built = False
+        self._seen = None  # _catalog_state() at last sync
+        self._checked_at = 0.0
+        self._refreshing = False
+
+    def _code(self, category):
+        # callers hold _write_lock
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self._category_names)
+            self._category_names.append(category)
+        return code
+
+    # ---- building ----
+
+    def build(self):
+        """Load every product name and category (one streaming query)."""
+        np = self._np
+        with self._write_lock:
+            started = self._generation
+        seen = self._catalog_state()
+
+        keys, ids, local_codes, categories = [], [], [], {}
+        rows = Product.objects.values_list("pk", "name", "category").iterator(chunk_size=10000)
+        for pk, name, category in rows:
+            code = categories.setdefault(category, len(categories))
+            for key in product_keys(name):
+                keys.append(key)
+                ids.append(pk)
+                local_codes.append(code)
+
+        keys = np.asarray(keys, dtype=self._key_dtype)
+        order = np.argsort(keys, kind="stable")
+        with self._write_lock:
+            to_global = np.array([self._code(c) for c in categories], dtype=np.int32)
+            codes = to_global[np.asarray(local_codes, dtype=np.intp)] if ids else np.empty(0, np.int32)
+            snapshot = Snapshot(
+                keys[order], np.asarray(ids, dtype=np.int64)[order], codes[order], [], started
+            )
+            # changes recorded before the read are in the rows; the ones
+            # recorded while we were reading are merged before the swap
+            self._changes = {pk: c for pk, c in self._changes.items() if c[0] > started}
+            self._snapshot = self._merge(snapshot, self._changes, self._generation)
+            self._seen = seen
+            self._checked_at = time.monotonic()
+            self._built = True
+
+    def warm(self):
+        """Build at startup; a missing table (before migrate) is not fatal."""
+        try:
+            self.build()
+        except DatabaseError:
+            pass
+
+    def _categories_of(self, codes):
+        np = self._np
+        present = np.flatnonzero(np.bincount(codes, minlength=len(self._category_names)))
+        names = [self._category_names[code] for code in present.tolist()]
+        # distinct categories are few; keep them as (normalized, original)
+        return sorted((normalize(c), c) for c in names if c)
+
+    def _catalog_state(self):
+        # ids are never reused, so an add raises last_id even when a
+        # delete keeps the count the same
+        state = Product.objects.aggregate(
+            n=Count("pk"), last_id=Max("pk"), last=Max("updated_at")
+        )
+        return state["n"], state["last_id"], state["last"]
+
+    def ensure_fresh(self):
+        """
+        Build on first use; after that, start a background sync() at most
+        every REFRESH_SECONDS. No query on the request's own thread.
+        """
+        if not self._built:
+            self.build()
+            return
+        if self._refreshing or time.monotonic() - self._checked_at < REFRESH_SECONDS:
+            return
+        self._checked_at = time.monotonic()
+        self._refreshing = True
+        threading.Thread(target=self._background_sync, daemon=True).start()
+
+    def sync(self):
+        """Catch up with saves and deletes made by other processes."""
+        state = self._catalog_state()
+        if state == self._seen:
+            return
+        seen_count, seen_last_id, seen_last = self._seen
+        if state[:2] == (seen_count, seen_last_id) and seen_last is not None:
+            # nothing added or removed: only apply the edited ones
+            edited = Product.objects.filter(updated_at__gt=seen_last).only("pk", "name", "category")
+            for product in edited:
+                self.update(product)
+            self._seen = state
+        else:
+            self.build()
+
+    def _background_sync(self):
+        try:
+            self.sync()
+        finally:
+            self._refreshing = False
+            close_old_connections()
+
+    # ---- incremental updates (signals) ----
+
+    def update(self, product):
+        """Record a saved product; merged on the next lookup."""
+        self._record(product.pk, product.name, product.category)
+
+    def remove(self, product_id):
+        self._record(product_id, None, None)
+
+    def _record(self, product_id, name, category):
+        if not self._built:
+            return
+        with self._write_lock:
+            self._generation += 1
+            self._changes[product_id] = (self._generation, name, category)
+
+    def _current(self):
+        """The snapshot, with any recorded changes merged in first."""
+        snapshot = self._snapshot
+        if snapshot.generation == self._generation:
+            return snapshot
+        with self._write_lock:
+            snapshot = self._snapshot
+            if snapshot.generation != self._generation:
+                changes = {
+                    pk: c for pk, c in self._changes.items() if c[0] > snapshot.generation
+                }
+                snapshot = self._snapshot = self._merge(snapshot, changes, self._generation)
+            return snapshot
+
+    def _merge(self, snapshot, changes, generation):
+        """A new Snapshot with `changes` applied (callers hold _write_lock)."""
+        np = self._np
+        keep = ~np.isin(snapshot.ids, np.fromiter(changes, dtype=np.int64, count=len(changes)))
+        keys, ids, codes = snapshot.keys[keep], snapshot.ids[keep], snapshot.codes[keep]
+
+        new_keys, new_ids, new_codes = [], [], []
+        for pk, (_, name, category) in changes.items():
+            if name is None:
+                continue
+            code = self._code(category)
+            for key in product_keys(name):
+                new_keys.append(key)
+                new_ids.append(pk)
+                new_codes.append(code)
+        if new_keys:
+            new_keys = np.asarray(new_keys, dtype=self._key_dtype)
+            order = np.argsort(new_keys, kind="stable")
+            new_keys = new_keys[order]
+            # one insert of the whole (sorted) batch: a single copy
+            positions = np.searchsorted(keys, new_keys)
+            keys = np.insert(keys, positions, new_keys)
+            ids = np.insert(ids, positions, np.asarray(new_ids, dtype=np.int64)[order])
+            codes = np.insert(codes, positions, np.asarray(new_codes, dtype=np.int32)[order])
+        return Snapshot(keys, ids, codes, self._categories_of(codes), generation)
+
+    # ---- lookups ----
+
+    def product_ids(self, query, limit=8):
+        """Ids of products with a name word starting with `query`, in key order."""
+        prefix = _clip(normalize(query))
+        if not prefix:
+            return []
+        np = self._np
+        snapshot = self._current()
+        keys, ids = snapshot.keys, snapshot.ids
+
+        lo = np.searchsorted(keys, prefix, side="left")
+        if len(prefix) < KEY_BYTES:
+            # 0xff never appears in UTF-8, so this sorts after every match
+            hi = np.searchsorted(keys, prefix + b"\xff", side="left")
+        else:
+            hi = np.searchsorted(keys, prefix, side="right")
+
+        found = []
+        # a product can match on several keys; over-fetch a little, dedupe
+        for pk in ids[lo:min(hi, lo + limit * MAX_KEYS_PER_PRODUCT)].tolist():
+            if pk not in found:
+                found.append(pk)
+                if len(found) == limit:
+                    break
+        return found
+
+    def categories(self, query, limit=3):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        entries = self._current().categories
+        lo = bisect.bisect_left(entries, (prefix,))
+        out = []
+        for norm, original in entries[lo:lo + limit]:
+            if not norm.startswith(prefix):
+                break
+            out.append(original)
+        return out
+
+    def __len__(self):
+        return len(self._current().keys)
+
+
+product_index = PrefixIndex()
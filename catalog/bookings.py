@@ -0,0 +1,93 @@
+# catalog/bookings.py
+"""
+Booking helpers that work on many sessions at once.
+
+A recurring series is checked against the room's existing bookings with
+ONE range query plus an in-memory sweep, then inserted with one
+bulk_create, instead of an overlap query + INSERT per session.
+"""
+from django.db import transaction
+
+from .models import RoomBooking
+from . import rollups
+
+
+def find_conflicts(slots, busy):
+    """
+    Return the indexes of `slots` that overlap any interval in `busy`.
+
+    Both are iterables of (start, end) pairs; intervals are half-open, so a
+    session ending at 9pm doesn't clash with one starting at 9pm.
+    Sweep-line over the sorted endpoints: O((n + m) log(n + m)).
+    """
+    points = []
+    for i, (start, end) in enumerate(slots):
+        points.append((start, 1, i))
+        points.append((end, 0, i))
+    for start, end in busy:
+        points.append((start, 1, None))
+        points.append((end, 0, None))
+
+    # at equal times, ends (0) sort before starts (1)
+    points.sort(key=lambda p: (p[0], p[1]))
+
+    busy_open = 0
+    slots_open = set()
+    conflicts = set()
+    for _, is_start, slot in points:
+        if slot is None:
+            if is_start:
+                busy_open += 1
+                conflicts.update(slots_open)
+            else:
+                busy_open -= 1
+        elif is_start:
+            slots_open.add(slot)
+            if busy_open:
+                conflicts.add(slot)
+        else:
+            slots_open.discard(slot)
+
+    return sorted(conflicts)
+
+
+def book_series(series):
+    """
+    Save `series` and create a RoomBooking for every session.
+
+    All-or-nothing: returns (bookings, []) on success, or ([], conflicts)
+    where conflicts is the list of (start, end) sessions that collide with
+    existing bookings (nothing is written in that case).
+    """
+    slots = list(series.occurrence_times())
+    if not slots:
+        return [], []
+
+    with transaction.atomic():
+        busy = (
+            RoomBooking.objects
+            .filter(
+                room=series.room,
+                start_time__lt=slots[-1][1],
+                end_time__gt=slots[0][0],
+            )
+            .values_list("start_time", "end_time")
+        )
+        conflicts = find_conflicts(slots, busy)
+        if conflicts:
+            return [], [slots[i] for i in conflicts]
+
+        series.save()
+        bookings = RoomBooking.objects.bulk_create(
+            RoomBooking(
+                room=series.room,
+                user=series.user,
+                series=series,
+                start_time=start,
+                end_time=end,
+            )
+            for start, end in slots
+        )
+        # bulk_create skips post_save, so feed the usage rollups directly
+        rollups.apply_bookings(bookings)
+    return bookings, []
@@ -0,0 +1,305 @@
+# catalog/cards.py
+"""
+Compiled renderers for the product and event grid cards.
+
+product_list and event_list spend most of their render time in the
+per-card template nodes: three {% url %} reversals, the filters and a
+dozen variable lookups for every item, 1,000 times over on a big page.
+render_product_cards() / render_event_cards() produce the same markup
+with one str.format() per card:
+
+- URL prefixes are reversed once per page; a card only splices its slug
+  or id in (an argument the URL converter wouldn't pass as-is goes
+  through reverse(), so errors are the same too).
+- Truncated descriptions and formatted start times are memoized
+  (truncatewords and date are the most expensive filters on these pages).
+- Plain strings are just escaped; every other value goes through Django's
+  own render_value_in_context() and the filters the templates use, so
+  localization and time zones match the templates exactly. The CSRF
+  input is rendered once by the real {% csrf_token %} node.
+
+The markup below mirrors the loop bodies of catalog/_product_cards.html
+and events/_event_cards.html byte for byte (see CardParityTests). The
+catalog_cards template tags fall back to those templates when
+settings.FAST_CARD_RENDERING is off.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from django.template import defaultfilters
+from django.template.base import render_value_in_context
+from django.template.defaulttags import CsrfTokenNode
+from django.urls import converters, reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from django.utils.timezone import template_localtime
+from django.utils.translation import get_language
+
+# stands in for the slug / id while reversing a URL prefix
+PLACEHOLDER = "7355608"
+DESCRIPTION_WORDS = 25
+START_TIME_FORMAT = "M d, Y H:i"
+MEMO_SIZE = 8192
+
+# =========================
+# MARKUP
+# =========================
+
+# One loop iteration each: from the newline after {% for %} up to the
+# indentation in front of {% endfor %}.
+PRODUCT_CARD = """
+        <article class="auction-card">
+
+          <!-- IMAGE AREA -->
+          <a href="{detail_url}" class="auction-image">
+            {image}
+          </a>
+
+          <!-- MAIN CONTENT -->
+          <div class="auction-main">
+            <header class="auction-card-header">
+              <h2 class="auction-title">
+                <a href="{detail_url}">
+                  {name}
+                </a>
+              </h2>
+            </header>
+
+            <div class="auction-body">
+              {description}
+            </div>
+
+            <!-- FOOTER -->
+            <footer class="auction-card-footer">
+              <div class="auction-footer-meta">
+                <p class="auction-meta-line">
+                  <span class="auction-meta-em">${price}</span>
+                  · Category: {category}
+                </p>
+                <p class="auction-meta-line">
+                  In Stock: <span class="auction-meta-em">{inventory_qty}</span>
+                </p>
+              </div>
+
+              <div class="auction-footer-actions">
+                <a href="{detail_url}"
+                   class="btn btn-sm btn-secondary auction-details-btn">
+                  View Details
+                </a>
+
+                <form method="post" action="{cart_add_url}">
+                  {csrf_input}
+                  <button type="submit"
+                          class="btn btn-sm btn-primary auction-details-btn">
+                    Add to Cart
+                  </button>
+                </form>
+              </div>
+            </footer>
+          </div>
+        </article>
+      """
+
+PRODUCT_IMAGE = '\n              <img src="{src}" alt="{name}">\n            '
+PRODUCT_NO_IMAGE = (
+    '\n              <div class="auction-image-placeholder">\n'
+    "                No image uploaded yet\n"
+    "              </div>\n            "
+)
+PRODUCT_DESCRIPTION = (
+    '\n                <p class="auction-description">\n'
+    "                  {text}\n"
+    "                </p>\n              "
+)
+PRODUCT_NO_DESCRIPTION = (
+    '\n                <p class="auction-description auction-description--muted">\n'
+    "                  No description provided yet.\n"
+    "                </p>\n              "
+)
+
+EVENT_CARD = """
+        <article class="auction-card">
+          <div class="auction-main">
+            <header class="auction-card-header">
+              <h2 class="auction-title">
+                <a href="{detail_url}">
+                  {title}
+                </a>
+              </h2>
+            </header>
+
+            <div class="auction-body">
+              <p class="auction-description">
+                {description}
+              </p>
+            </div>
+          </div>
+
+          <footer class="auction-card-footer">
+            <div class="auction-footer-meta">
+              <p class="auction-meta-line">
+                <span class="auction-meta-em">Starts:</span>
+                {start_time}
+              </p>
+
+              {spots}
+            </div>
+
+            <div class="auction-footer-actions">
+              <a href="{detail_url}"
+                 class="btn btn-secondary btn-sm auction-details-btn">
+                View Details
+              </a>
+            </div>
+          </footer>
+        </article>
+      """
+
+EVENT_SPOTS = (
+    '\n                <p class="auction-meta-line">\n'
+    '                  <span class="auction-meta-em">Spots:</span>\n'
+    "                  {taken}/{capacity}\n"
+    "                </p>\n              "
+)
+EVENT_UNLIMITED = (
+    '\n                <p class="auction-meta-line">\n'
+    '                  <span class="auction-meta-em">Spots:</span>\n'
+    "                  Unlimited\n"
+    "                </p>\n              "
+)
+
+
+# =========================
+# HELPERS
+# =========================
+
+def _value_renderer(context):
+    """
+    {{ value }}, with shortcuts: plain strings have nothing to localize, and
+    the small ints on a page (stock, capacity, sign-ups) repeat a lot.
+    """
+    autoescape = context.autoescape
+    ints = {}
+
+    def value(v):
+        if type(v) is str:
+            return escape(v) if autoescape else v
+        if type(v) is int:
+            if v not in ints:
+                ints[v] = render_value_in_context(v, context)
+            return ints[v]
+        return render_value_in_context(v, context)
+
+    return value
+
+
+def _url_maker(url_name, converter, context):
+    """
+    {% url url_name arg %} for one page: reverse() once, then splice each
+    argument between the (already escaped) prefix and suffix.
+    """
+    prefix, _, suffix = reverse(url_name, args=[PLACEHOLDER]).partition(PLACEHOLDER)
+    prefix = render_value_in_context(prefix, context)
+    suffix = render_value_in_context(suffix, context)
+    plain = re.compile(converter.regex)
+
+    def url(arg):
+        text = converter.to_url(arg)
+        if type(text) is str and plain.fullmatch(text):
+            return prefix + text + suffix
+        return render_value_in_context(reverse(url_name, args=[arg]), context)
+
+    return url
+
+
+def truncated(text, language):
+    """text|truncatewords:25, memoized for plain strings."""
+    if type(text) is not str:
+        # SafeString etc. keep their own type through the filter
+        return defaultfilters.truncatewords(text, DESCRIPTION_WORDS)
+    return _truncated(text, language)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _truncated(text, language):
+    # the "…" marker is translated, hence the language in the key
+    return defaultfilters.truncatewords(text, DESCRIPTION_WORDS)
+
+
+def start_time(value, context, language):
+    """value|date:"M d, Y H:i", memoized on the local wall-clock minute."""
+    value = template_localtime(value, context.use_tz)
+    if not isinstance(value, datetime):
+        return defaultfilters.date(value, START_TIME_FORMAT)
+    # the format shows neither seconds nor the zone
+    return _start_time(value.replace(second=0, microsecond=0, tzinfo=None), language)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _start_time(wall_clock, language):
+    # month abbreviations are translated
+    return defaultfilters.date(wall_clock, START_TIME_FORMAT)
+
+
+# =========================
+# RENDERERS
+# =========================
+
+def render_product_cards(products, context):
+    """The {% for p in products %} loop of catalog/_product_cards.html."""
+    value = _value_renderer(context)
+    detail_url = _url_maker("product_detail", converters.SlugConverter(), context)
+    cart_add_url = _url_maker("cart_add", converters.IntConverter(), context)
+    csrf_input = CsrfTokenNode().render(context)
+    no_category = mark_safe("Uncategorized")
+    language = get_language()
+
+    parts = []
+    for p in products:
+        name = value(p.name)
+        if p.image:
+            image = PRODUCT_IMAGE.format(src=value(p.image.url), name=name)
+        elif p.image_url:
+            image = PRODUCT_IMAGE.format(src=value(p.image_url), name=name)
+        else:
+            image = PRODUCT_NO_IMAGE
+        if p.description:
+            description = PRODUCT_DESCRIPTION.format(text=value(truncated(p.description, language)))
+        else:
+            description = PRODUCT_NO_DESCRIPTION
+        parts.append(PRODUCT_CARD.format(
+            detail_url=detail_url(p.slug),
+            image=image,
+            name=name,
+            description=description,
+            price=value(p.price),
+            category=value(defaultfilters.default(p.category, no_category)),
+            inventory_qty=value(p.inventory_qty),
+            cart_add_url=cart_add_url(p.id),
+            csrf_input=csrf_input,
+        ))
+    return "".join(parts)
+
+
+def render_event_cards(events, context):
+    """The {% for e in events %} loop of events/_event_cards.html."""
+    value = _value_renderer(context)
+    detail_url = _url_maker("event_detail", converters.SlugConverter(), context)
+    no_description = mark_safe("No description yet.")
+    language = get_language()
+
+    parts = []
+    for e in events:
+        if e.capacity:
+            spots = EVENT_SPOTS.format(taken=value(e.registrations_count), capacity=value(e.capacity))
+        else:
+            spots = EVENT_UNLIMITED
+        parts.append(EVENT_CARD.format(
+            detail_url=detail_url(e.slug),
+            title=value(e.title),
+            description=value(truncated(defaultfilters.default(e.description, no_description), language)),
+            start_time=value(start_time(e.start_time, context, language)),
+            spots=spots,
+        ))
+    return "".join(parts)
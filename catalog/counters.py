@@ -0,0 +1,168 @@
+# catalog/counters.py
+"""
+Write-behind popularity counters for Product.
+
+product_detail / cart_add only bump an in-process dict; a background
+thread flushes the totals every PRODUCT_COUNTER_FLUSH_SECONDS as a few
+batched `UPDATE ... SET n = n + k` statements, so the read path never
+writes to SQLite.
+
+Each flush carries a UUID that is recorded (CounterFlush) in the same
+transaction as its UPDATEs. A batch whose commit failed is merged back
+and retried with the same id, so a retry after an ambiguous failure can
+never be applied twice. Pending counts are flushed at interpreter exit,
+so a graceful worker restart doesn't drop them.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CounterFlush, Product
+
+logger = logging.getLogger(__name__)
+
+FIELDS = Product.COUNTER_FIELDS
+
+
+class CounterBuffer:
+    def __init__(self, flush_seconds=None):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        # batches taken out of _pending but not yet known to be committed
+        self._inflight = []
+        self._db_name = None
+        self._thread = None
+
+    # ---- recording ----
+
+    def incr(self, product_id, field, amount=1):
+        """Record `amount` hits for one product. Never touches the database."""
+        with self._lock:
+            if self._db_name is None:
+                self._db_name = connection.settings_dict["NAME"]
+            self._pending[product_id][field] += amount
+        self._ensure_thread()
+
+    def view(self, product_id):
+        self.incr(product_id, "view_count")
+
+    def cart_add(self, product_id):
+        self.incr(product_id, "cart_add_count")
+
+    def pending(self):
+        """Copy of the counts not yet flushed (for tests / debugging)."""
+        with self._lock:
+            merged = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+            for _, batch in self._inflight:
+                _merge_into(merged, batch)
+            _merge_into(merged, self._pending)
+            return {pid: dict(v) for pid, v in merged.items()}
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._inflight.clear()
+            self._db_name = None
+
+    # ---- flushing ----
+
+    def flush(self):
+        """Write all pending counts. Returns the number of products updated."""
+        with self._flush_lock:
+            with self._lock:
+                if self._db_name and self._db_name != connection.settings_dict["NAME"]:
+                    # gathered against another database (e.g. a test DB that
+                    # has since been torn down): never apply them here
+                    self._pending.clear()
+                    self._inflight.clear()
+                if self._pending:
+                    self._inflight.append((uuid.uuid4(), self._pending))
+                    self._pending = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+                batches = list(self._inflight)
+                self._db_name = None
+
+            updated = 0
+            for flush_id, batch in batches:
+                try:
+                    updated += _apply_batch(flush_id, batch)
+                except Exception:
+                    logger.exception("Product counter flush %s failed; will retry", flush_id)
+                    break
+                with self._lock:
+                    self._inflight.remove((flush_id, batch))
+            return updated
+
+    def _ensure_thread(self):
+        seconds = self.flush_seconds
+        if seconds is None:
+            seconds = getattr(settings, "PRODUCT_COUNTER_FLUSH_SECONDS", 30)
+        if not seconds or (self._thread and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds,), name="product-counters", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, seconds):
+        while True:
+            time.sleep(seconds)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+def _merge_into(target, batch):
+    for product_id, counts in batch.items():
+        for field, amount in counts.items():
+            target[product_id][field] += amount
+
+
+def _apply_batch(flush_id, batch):
+    """
+    Apply one batch in a single transaction, skipping it if this flush id
+    was already committed. Products that share the same increments are
+    grouped into one UPDATE ... WHERE id IN (...).
+    """
+    groups = defaultdict(list)
+    for product_id, counts in batch.items():
+        deltas = tuple(counts[f] for f in FIELDS)
+        if any(deltas):
+            groups[deltas].append(product_id)
+
+    with transaction.atomic():
+        _, created = CounterFlush.objects.get_or_create(id=flush_id)
+        if not created:
+            return 0
+
+        updated = 0
+        for deltas, product_ids in groups.items():
+            changes = {
+                field: F(field) + amount for field, amount in zip(FIELDS, deltas) if amount
+            }
+            updated += Product.objects.filter(pk__in=product_ids).update(**changes)
+
+        # flush ids only need to outlive a retry; keep a day's worth
+        CounterFlush.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=1)
+        ).delete()
+    return updated
+
+
+# process-wide buffer used by the views
+product_counters = CounterBuffer()
+atexit.register(product_counters.flush)
@@ -1,9 +1,12 @@
 ﻿# catalog/forms.py
+from datetime import timedelta
+
 from django import forms
 from django.utils.text import slugify
 from django.utils import timezone
 
-from .models import Product, Event, RoomBooking
+from .attendees import read_identifiers
+from .models import Product, Event, RoomBooking, RoomBookingSeries
 
 
 class ProductForm(forms.ModelForm):
@@ -95,3 +98,128 @@ class RoomBookingForm(forms.ModelForm):
             self.add_error("start_time", "Start time cannot be in the past.")
 
         return cleaned
+
+
+class RoomBookingSeriesForm(forms.ModelForm):
+    """
+    Form for a weekly recurring booking.
+
+    The first session is given by start_time/end_time; it repeats every
+    `interval_weeks` for `occurrences` sessions or until a date.
+    `skip_dates` is a comma-separated list of dates to leave out.
+    """
+
+    skip_dates = forms.CharField(
+        required=False,
+        help_text="Comma-separated dates to skip, e.g. 2025-12-24, 2025-12-31",
+    )
+
+    class Meta:
+        model = RoomBookingSeries
+        fields = [
+            "room",
+            "start_time",
+            "end_time",
+            "interval_weeks",
+            "occurrences",
+            "until",
+        ]
+        widgets = {
+            "start_time": forms.DateTimeInput(attrs={"type": "datetime-local"}),
+            "end_time": forms.DateTimeInput(attrs={"type": "datetime-local"}),
+            "until": forms.DateInput(attrs={"type": "date"}),
+        }
+
+    def clean_skip_dates(self):
+        raw = self.cleaned_data.get("skip_dates") or ""
+        field = forms.DateField()
+        dates = []
+        for chunk in raw.split(","):
+            chunk = chunk.strip()
+            if chunk:
+                dates.append(field.clean(chunk).isoformat())
+        return dates
+
+    def clean(self):
+        """
+        - end_time after start_time, start_time not in the past
+        - a session can't be longer than the repeat interval
+        - needs either a number of sessions or an end date
+        - at most MAX_OCCURRENCES sessions, however the end is given
+        """
+        cleaned = super().clean()
+        start = cleaned.get("start_time")
+        end = cleaned.get("end_time")
+        interval = cleaned.get("interval_weeks") or 1
+        occurrences = cleaned.get("occurrences")
+        until = cleaned.get("until")
+
+        if start and end and end <= start:
+            self.add_error("end_time", "End time must be after start time.")
+        elif start and end and end - start > timedelta(weeks=interval):
+            self.add_error("end_time", "A session can't run longer than the repeat interval.")
+
+        if start and start < timezone.now():
+            self.add_error("start_time", "Start time cannot be in the past.")
+
+        if not occurrences and not until:
+            self.add_error("occurrences", "Give a number of sessions or an end date.")
+        elif occurrences and occurrences > RoomBookingSeries.MAX_OCCURRENCES:
+            self.add_error(
+                "occurrences",
+                f"At most {RoomBookingSeries.MAX_OCCURRENCES} sessions per series.",
+            )
+
+        if until and start and until < timezone.localtime(start).date():
+            self.add_error("until", "End date must be after the first session.")
+        elif until and start and end and not self.errors:
+            series = RoomBookingSeries(
+                start_time=start,
+                end_time=end,
+                interval_weeks=interval,
+                occurrences=occurrences,
+                until=until,
+                exceptions=cleaned.get("skip_dates", []),
+            )
+            if series.is_truncated():
+                self.add_error(
+                    "until",
+                    f"That end date needs more than {RoomBookingSeries.MAX_OCCURRENCES} "
+                    "sessions; pick an earlier date or give a number of sessions.",
+                )
+
+        return cleaned
+
+    def save(self, commit=True):
+        self.instance.exceptions = self.cleaned_data.get("skip_dates", [])
+        return super().save(commit=commit)
+
+
+class AttendeeImportForm(forms.Form):
+    """
+    Staff: register many users for an event at once.
+    Takes a CSV file and/or pasted lines; first column is a username or email.
+    """
+
+    csv_file = forms.FileField(required=False, label="CSV file")
+    attendees = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 8}),
+        help_text="One username or email per line.",
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        text = cleaned.get("attendees") or ""
+        upload = cleaned.get("csv_file")
+        if upload:
+            try:
+                # pasted lines are numbered after the file's
+                text = upload.read().decode("utf-8-sig").rstrip("\r\n") + "\n" + text
+            except UnicodeDecodeError:
+                raise forms.ValidationError("The CSV file must be UTF-8 encoded.")
+        rows = read_identifiers(text)
+        if not rows and not self.errors:
+            raise forms.ValidationError("Upload a CSV file or paste at least one username or email.")
+        cleaned["rows"] = rows
+        return cleaned
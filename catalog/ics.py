@@ -0,0 +1,82 @@
+# catalog/ics.py
+"""
+Tiny iCalendar (RFC 5545) writer used by the .ics feed views.
+
+Everything here is a generator so a feed can be handed straight to
+StreamingHttpResponse and never holds more than one chunk of rows.
+"""
+from datetime import timezone as dt_timezone
+
+CRLF = "\r\n"
+PRODID = "-//Game Store//Calendar//EN"
+
+
+def escape_text(value):
+    """Escape a TEXT value (backslash, semicolon, comma, newlines)."""
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def format_dt(value):
+    """Datetime -> UTC basic format, e.g. 20250101T180000Z."""
+    return value.astimezone(dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def fold(line):
+    """Fold a content line at 75 octets as the RFC requires."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + CRLF
+
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # don't split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return (CRLF + " ").join(parts) + CRLF
+
+
+def vevent(uid, start, summary, end=None, description="", location="", stamp=None):
+    """Render one VEVENT block as a string."""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{uid}",
+        f"DTSTAMP:{format_dt(stamp or start)}",
+        f"DTSTART:{format_dt(start)}",
+    ]
+    if end is not None:
+        lines.append(f"DTEND:{format_dt(end)}")
+    lines.append(f"SUMMARY:{escape_text(summary)}")
+    if description:
+        lines.append(f"DESCRIPTION:{escape_text(description)}")
+    if location:
+        lines.append(f"LOCATION:{escape_text(location)}")
+    lines.append("END:VEVENT")
+    return "".join(fold(line) for line in lines)
+
+
+def stream_calendar(name, vevents):
+    """Wrap an iterable of VEVENT strings in a VCALENDAR, chunk by chunk."""
+    yield "".join(
+        fold(line)
+        for line in (
+            "BEGIN:VCALENDAR",
+            "VERSION:2.0",
+            f"PRODID:{PRODID}",
+            "CALSCALE:GREGORIAN",
+            f"X-WR-CALNAME:{escape_text(name)}",
+        )
+    )
+    yield from vevents
+    yield fold("END:VCALENDAR")
@@ -0,0 +1,368 @@
+# catalog/loadgen.py
+"""
+Scripted user-journey load generator (`manage.py load_journeys`).
+
+bench_views times single pages; real traffic is people walking through
+the shop with a session: browse, search, open a product, fill a cart,
+sign up, register for an event, book a room. A journey is written in a
+small line-based DSL, one request per line:
+
+    # name      METHOD  path                         [field=value ...]  [-> codes]
+    browse      GET     /
+    add         POST    /cart/add/{product_id}/                         -> 302
+    bump        POST    /cart/update/{product_id}/   direction=up       -> 302
+
+{placeholders} come from the virtual user's variables (see
+user_variables()). POSTs carry the session cookies and the CSRF token
+like a browser would. Redirects are not followed: if a journey should
+load the page a redirect points at, that is its own line (and its own
+timing). Without "-> codes", any status below 400 counts as success;
+429 (admission control shedding load) is reported as shed, not as an
+error.
+
+run() starts `users` virtual users with asyncio, at most `concurrency`
+at a time, each with its own cookie jar, over plain HTTP/1.1 on the
+standard library's asyncio streams (one connection per request). The
+Report has throughput and p50/p95/p99 per step. check_integrity()
+then looks in the database for what concurrency breaks and status
+codes don't show: events over capacity, overlapping room bookings.
+"""
+import asyncio
+import random
+import re
+import shlex
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import quote, urlencode, urlsplit
+
+from django.db.models import Count, Exists, F, OuterRef
+from django.utils import timezone
+
+from .models import Event, Product, Room, RoomBooking
+from .stats import percentile
+
+DEFAULT_JOURNEY = """
+# browse and search the catalog
+browse         GET   /
+search         GET   /?q={search}
+product        GET   /product/{product_slug}/
+suggest        GET   /search/suggest/?q={search}
+
+# fill a cart
+cart_add       POST  /cart/add/{product_id}/                          -> 302
+cart_more      POST  /cart/update/{product_id}/  direction=up         -> 302
+cart_less      POST  /cart/update/{product_id}/  direction=down       -> 302
+cart           GET   /cart/
+
+# sign up (logs the session in), then events and rooms
+signup         POST  /signup/  username={username} password1={password} password2={password}  -> 302
+events         GET   /events/
+event          GET   /events/{event_slug}/
+event_register POST  /events/{event_slug}/register/                   -> 302
+rooms          GET   /rooms/
+room_book      POST  /rooms/  room={room_id} start_time={slot_start} end_time={slot_end}  -> 200,302
+"""
+
+PASSWORD = "load-Test-pw-4821"
+# room slots are drawn from a small grid so virtual users collide on them
+SLOT_DAYS = 3
+SLOT_HOURS = range(10, 22)
+
+STATUS_RE = re.compile(rb"^HTTP/1\.[01] (\d{3})")
+
+
+class JourneyError(ValueError):
+    """A journey line the parser can't read."""
+
+
+class Step:
+    __slots__ = ("name", "method", "path", "fields", "expect")
+
+    def __init__(self, name, method, path, fields=None, expect=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.fields = fields or {}
+        self.expect = expect  # set of status codes, or None for "< 400"
+
+    def ok(self, status):
+        return status in self.expect if self.expect else status < 400
+
+    def __repr__(self):
+        return f"<Step {self.name} {self.method} {self.path}>"
+
+
+def parse_journey(text):
+    """DSL text -> list of Steps."""
+    steps = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        expect = None
+        if "->" in line:
+            line, codes = line.split("->", 1)
+            try:
+                expect = {int(code) for code in codes.replace(",", " ").split()}
+            except ValueError:
+                raise JourneyError(f"line {line_no}: bad status codes {codes.strip()!r}")
+        words = shlex.split(line)
+        if len(words) < 3:
+            raise JourneyError(f"line {line_no}: expected 'name METHOD path [field=value ...]'")
+        name, method, path, *pairs = words
+        method = method.upper()
+        if method not in ("GET", "POST"):
+            raise JourneyError(f"line {line_no}: method must be GET or POST, not {method}")
+        fields = {}
+        for pair in pairs:
+            key, sep, value = pair.partition("=")
+            if not sep:
+                raise JourneyError(f"line {line_no}: expected field=value, got {pair!r}")
+            fields[key] = value
+        steps.append(Step(name, method, path, fields, expect))
+    if not steps:
+        raise JourneyError("the journey has no steps")
+    return steps
+
+
+# =========================
+# VIRTUAL USER DATA
+# =========================
+
+def load_fixtures():
+    """What the journeys pick from; read once, before the run starts."""
+    products = list(Product.objects.values_list("id", "slug", "name")[:500])
+    events = list(
+        Event.objects.filter(start_time__gte=timezone.now()).values_list("slug", flat=True)[:50]
+    )
+    rooms = list(Room.objects.values_list("id", flat=True))
+    return {"products": products, "events": events, "rooms": rooms}
+
+
+def user_variables(fixtures, run_id, n, rng):
+    """The {placeholders} one virtual user's journey is filled in with."""
+    values = {"username": f"load-{run_id}-{n}", "password": PASSWORD, "n": n}
+    if fixtures["products"]:
+        product_id, slug, name = rng.choice(fixtures["products"])
+        words = name.split()
+        values.update(
+            product_id=product_id,
+            product_slug=slug,
+            search=words[0][:4].lower() if words else "game",
+        )
+    if fixtures["events"]:
+        values["event_slug"] = rng.choice(fixtures["events"])
+    if fixtures["rooms"]:
+        day = timezone.localdate() + timedelta(days=rng.randrange(1, SLOT_DAYS + 1))
+        hour = rng.choice(SLOT_HOURS)
+        values.update(
+            room_id=rng.choice(fixtures["rooms"]),
+            slot_start=f"{day:%Y-%m-%d} {hour:02d}:00",
+            slot_end=f"{day:%Y-%m-%d} {hour + 1:02d}:00",
+        )
+    return values
+
+
+def _fill(template, values, escape):
+    try:
+        return re.sub(r"\{(\w+)\}", lambda m: escape(str(values[m.group(1)])), template)
+    except KeyError as exc:
+        raise JourneyError(f"no value for {{{exc.args[0]}}} (is the catalog empty?)")
+
+
+# =========================
+# HTTP
+# =========================
+
+class Client:
+    """One virtual user's browser: a cookie jar and HTTP/1.1 over asyncio."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        if parts.scheme != "http":
+            raise ValueError("load_journeys only speaks plain http:// to a local server")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.netloc = parts.netloc
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = {}
+
+    async def request(self, method, path, fields=None):
+        """Send one request; returns the status code (the body is read and dropped)."""
+        body = urlencode(fields or {}).encode() if method == "POST" else b""
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.netloc}",
+            "Connection: close",
+            "User-Agent: shop-load-journeys",
+            "Accept: text/html,application/json",
+        ]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        if method == "POST":
+            lines += [
+                "Content-Type: application/x-www-form-urlencoded",
+                f"Content-Length: {len(body)}",
+                f"Referer: {self.base_url}{path}",
+                f"X-CSRFToken: {self.cookies.get('csrftoken', '')}",
+            ]
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+        async def exchange():
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                writer.write(request)
+                await writer.drain()
+                return await reader.read()
+            finally:
+                writer.close()
+
+        raw = await asyncio.wait_for(exchange(), self.timeout)
+        head = raw.split(b"\r\n\r\n", 1)[0]
+        match = STATUS_RE.match(head)
+        if not match:
+            raise ConnectionError("malformed HTTP response")
+        for line in head.split(b"\r\n")[1:]:
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.lower() == "set-cookie":
+                self._store_cookie(value.strip())
+        return int(match.group(1))
+
+    def _store_cookie(self, header):
+        pair, *attrs = header.split(";")
+        name, _, value = pair.strip().partition("=")
+        expired = any(a.strip().lower() == "max-age=0" for a in attrs)
+        if expired or not value.strip('"'):
+            self.cookies.pop(name, None)
+        else:
+            self.cookies[name] = value
+
+
+# =========================
+# RUN + REPORT
+# =========================
+
+class Report:
+    def __init__(self, steps):
+        self.order = [step.name for step in steps]
+        self.latencies = defaultdict(list)  # step -> seconds
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.shed = defaultdict(int)
+        self.error_samples = []
+        self.elapsed = 0.0
+        self.journeys = 0
+
+    def record(self, step, seconds, status=None, error=None):
+        self.latencies[step.name].append(seconds)
+        if error is not None:
+            self.errors[step.name] += 1
+            label = type(error).__name__
+        else:
+            self.statuses[step.name][status] += 1
+            label = None
+            if status == 429:
+                self.shed[step.name] += 1
+            elif not step.ok(status):
+                self.errors[step.name] += 1
+                label = f"HTTP {status}"
+        if label and len(self.error_samples) < 20:
+            self.error_samples.append(f"{step.name} {step.method} {step.path}: {label}")
+
+    @property
+    def requests(self):
+        return sum(len(v) for v in self.latencies.values())
+
+    def rows(self):
+        """Per-step summary dicts, in journey order; latencies in ms."""
+        out = []
+        for name in dict.fromkeys(self.order):
+            values = sorted(s * 1000 for s in self.latencies[name])
+            out.append({
+                "step": name,
+                "requests": len(values),
+                "rps": len(values) / self.elapsed if self.elapsed else 0.0,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "errors": self.errors[name],
+                "shed": self.shed[name],
+            })
+        return out
+
+
+async def _journey(client, steps, values, report):
+    for step in steps:
+        path = _fill(step.path, values, lambda v: quote(v, safe="/"))
+        fields = {k: _fill(v, values, str) for k, v in step.fields.items()}
+        started = time.perf_counter()
+        try:
+            status = await client.request(step.method, path, fields)
+        except (OSError, asyncio.TimeoutError, ConnectionError) as exc:
+            report.record(step, time.perf_counter() - started, error=exc)
+            continue
+        report.record(step, time.perf_counter() - started, status=status)
+
+
+async def run(base_url, steps, users=50, concurrency=20, timeout=10.0, fixtures=None, seed=None):
+    """Run `users` journeys against `base_url`; returns (Report, run id)."""
+    fixtures = fixtures if fixtures is not None else await _async_fixtures()
+    run_id = uuid.uuid4().hex[:8]
+    rng = random.Random(seed)
+    report = Report(steps)
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(n):
+        values = user_variables(fixtures, run_id, n, rng)
+        async with gate:
+            await _journey(Client(base_url, timeout), steps, values, report)
+            report.journeys += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(users)))
+    report.elapsed = time.perf_counter() - started
+    return report, run_id
+
+
+async def _async_fixtures():
+    from asgiref.sync import sync_to_async
+
+    return await sync_to_async(load_fixtures)()
+
+
+# =========================
+# INTEGRITY
+# =========================
+
+def check_integrity():
+    """
+    Problems in the data that concurrent journeys can cause:
+    registrations beyond an event's capacity, overlapping bookings of one
+    room. Returns a list of human-readable findings (empty is good).
+    """
+    findings = []
+    overfull = (
+        Event.objects.filter(capacity__gt=0)
+        .annotate(n=Count("registrations"))
+        .filter(n__gt=F("capacity"))
+        .values_list("slug", "n", "capacity")
+    )
+    for slug, n, capacity in overfull:
+        findings.append(f"event {slug}: {n} registrations for {capacity} places")
+
+    clash = RoomBooking.objects.filter(
+        room=OuterRef("room"),
+        start_time__lt=OuterRef("end_time"),
+        end_time__gt=OuterRef("start_time"),
+    ).exclude(pk=OuterRef("pk"))
+    overlapping = (
+        RoomBooking.objects.filter(Exists(clash))
+        .order_by("room__name", "start_time")
+        .values_list("pk", "room__name", "start_time", "end_time")
+    )
+    for pk, room, start, end in overlapping:
+        findings.append(f"room {room}: booking #{pk} ({start:%Y-%m-%d %H:%M}-{end:%H:%M}) overlaps another")
+    return findings
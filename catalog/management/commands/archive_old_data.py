@@ -0,0 +1,32 @@
+# catalog/management/commands/archive_old_data.py
+from django.core.management.base import BaseCommand
+
+from catalog import archive
+
+
+class Command(BaseCommand):
+    help = "Move past events (with registrations) and old room bookings to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--event-days", type=int, default=None,
+            help="Archive events dated more than this many days ago "
+                 "(default: settings.ARCHIVE_EVENTS_AFTER_DAYS).",
+        )
+        parser.add_argument(
+            "--booking-days", type=int, default=None,
+            help="Archive bookings that ended more than this many days ago "
+                 "(default: settings.ARCHIVE_BOOKINGS_AFTER_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=archive.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        events, registrations = archive.archive_events(
+            days=options["event_days"], batch_size=options["batch_size"]
+        )
+        bookings = archive.archive_bookings(
+            days=options["booking_days"], batch_size=options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {events} events, {registrations} registrations and {bookings} bookings."
+        ))
@@ -0,0 +1,110 @@
+# catalog/management/commands/bench_templates.py
+"""
+Time product_list.html / event_list.html with N cards, rendered by the
+compiled card renderers (catalog/cards.py) and by the template loops they
+replace, and check both produce the same page:
+
+    python manage.py bench_templates --cards 1000 --repeat 20
+
+Rendering only: the products and events are built in memory, so no
+database or web server is involved.
+"""
+import re
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from catalog.models import Event, Product
+from catalog.stats import percentile
+
+# {% csrf_token %} masks the token differently on every render
+CSRF_VALUE_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*"')
+
+WORDS = (
+    "co-op campaign with split-screen support, twelve maps, a level editor and "
+    "a soundtrack by the original composer; includes every expansion released so far "
+    "plus the <director's> cut & bonus artbook"
+).split()
+
+
+def sample_products(n):
+    products = []
+    for i in range(1, n + 1):
+        p = Product(
+            id=i,
+            name=f"Game #{i} & friends",
+            slug=f"game-{i}",
+            price=Decimal(i % 90) + Decimal("0.99"),
+            inventory_qty=i % 17,
+            category=("Board", "Card", "Video", "")[i % 4],
+            description=" ".join(WORDS[: 5 + i % len(WORDS)]) if i % 5 else "",
+            image_url=f"https://cdn.example.com/games/{i}.png" if i % 3 else "",
+        )
+        products.append(p)
+    return products
+
+
+def sample_events(n):
+    start = timezone.now()
+    events = []
+    for i in range(1, n + 1):
+        e = Event(
+            id=i,
+            title=f"Tournament #{i}",
+            slug=f"tournament-{i}",
+            description=" ".join(WORDS[: 3 + i % len(WORDS)]) if i % 4 else "",
+            start_time=start + timedelta(hours=i),
+            capacity=(0, 16, 32)[i % 3],
+        )
+        e.num_registrations = i % 16
+        events.append(e)
+    return events
+
+
+class Command(BaseCommand):
+    help = "Compare card-grid render times: compiled renderers vs the template loops."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cards", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        cards, repeat = options["cards"], options["repeat"]
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+        get_token(request)
+
+        pages = [
+            ("product_list", "catalog/product_list.html",
+             {"products": sample_products(cards), "sort": "newest"}),
+            ("event_list", "events/event_list.html", {"events": sample_events(cards)}),
+        ]
+        self.stdout.write(f"{cards} cards, {repeat} renders each (ms: p50 / p95)")
+        for label, template_name, context in pages:
+            timings = {}
+            for fast in (False, True):
+                with override_settings(FAST_CARD_RENDERING=fast):
+                    html = render_to_string(template_name, context, request)  # warm up
+                    html = CSRF_VALUE_RE.sub(r'\1"', html)
+                    samples = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        render_to_string(template_name, context, request)
+                        samples.append((time.perf_counter() - started) * 1000)
+                timings[fast] = (html, sorted(samples))
+
+            if timings[False][0] != timings[True][0]:
+                raise CommandError(f"{label}: compiled cards differ from the template output")
+            template_ms, fast_ms = timings[False][1], timings[True][1]
+            self.stdout.write(
+                f"{label:<13} template {percentile(template_ms, 50):8.1f} / {percentile(template_ms, 95):8.1f}"
+                f"   compiled {percentile(fast_ms, 50):8.1f} / {percentile(fast_ms, 95):8.1f}"
+                f"   {percentile(template_ms, 50) / percentile(fast_ms, 50):.1f}x faster"
+            )
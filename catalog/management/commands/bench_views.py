@@ -0,0 +1,74 @@
+# catalog/management/commands/bench_views.py
+"""
+Hammer the read-heavy catalog pages of a running server and report
+requests/sec and latency percentiles.
+
+Compare the sync (WSGI) and async (ASGI) paths by running the same
+command against each server, e.g.:
+
+    gunicorn shop.wsgi -w 4 -b 127.0.0.1:8000
+    python manage.py bench_views --base-url http://127.0.0.1:8000
+
+    uvicorn shop.asgi:application --workers 4 --port 8001
+    python manage.py bench_views --base-url http://127.0.0.1:8001
+"""
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from catalog.models import Product, Event
+from catalog.stats import percentile
+
+
+class Command(BaseCommand):
+    help = "Load test product/event list + detail pages and print RPS and p50/p95/p99."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--timeout", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        base = options["base_url"].rstrip("/")
+
+        paths = ["/", "/events/"]
+        product = Product.objects.order_by("id").values_list("slug", flat=True).first()
+        event = Event.objects.order_by("id").values_list("slug", flat=True).first()
+        if product:
+            paths.append(f"/product/{product}/")
+        if event:
+            paths.append(f"/events/{event}/")
+
+        total = options["requests"]
+        timeout = options["timeout"]
+
+        def hit(i):
+            url = base + paths[i % len(paths)]
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as resp:
+                    resp.read()
+                    ok = resp.status == 200
+            except (urllib.error.URLError, OSError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            results = list(pool.map(hit, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(r[0] * 1000 for r in results)
+        errors = sum(1 for r in results if not r[1])
+
+        self.stdout.write(f"Target:      {base} ({', '.join(paths)})")
+        self.stdout.write(f"Requests:    {total} @ concurrency {options['concurrency']}")
+        self.stdout.write(f"Errors:      {errors}")
+        self.stdout.write(f"Throughput:  {total / elapsed:.1f} req/s")
+        for pct in (50, 95, 99):
+            self.stdout.write(f"p{pct}:         {percentile(latencies, pct):.1f} ms")
+        self.stdout.write(f"max:         {latencies[-1]:.1f} ms")
@@ -0,0 +1,24 @@
+# catalog/management/commands/build_catalog_snapshot.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import snapshot
+
+
+class Command(BaseCommand):
+    help = "Write the mmapped product snapshot that catalog pages are served from."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="Defaults to settings.CATALOG_SNAPSHOT_PATH.")
+
+    def handle(self, *args, **options):
+        path = options["path"] or snapshot.snapshot_path()
+        if not path:
+            raise CommandError("CATALOG_SNAPSHOT_PATH is not set; pass --path.")
+        started = time.perf_counter()
+        count = snapshot.build(path)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {count} product(s) to {path} in {elapsed:.2f}s.")
+        )
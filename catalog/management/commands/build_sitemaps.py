@@ -0,0 +1,21 @@
+# catalog/management/commands/build_sitemaps.py
+from django.core.management.base import BaseCommand
+
+from catalog import sitemaps
+
+
+class Command(BaseCommand):
+    help = "Rewrite the product / event sitemap shards whose rows changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url",
+            help="Scheme and host for <loc>, e.g. https://shop.example.com (default: SITEMAP_BASE_URL)",
+        )
+        parser.add_argument("--force", action="store_true", help="Rewrite every shard.")
+
+    def handle(self, *args, **options):
+        written = sitemaps.refresh(options["base_url"], force=options["force"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rewrote {len(written)} sitemap shard(s) in {sitemaps.sitemap_root()}."
+        ))
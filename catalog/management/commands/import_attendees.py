@@ -0,0 +1,47 @@
+# catalog/management/commands/import_attendees.py
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import attendees
+from catalog.models import Event
+
+
+class Command(BaseCommand):
+    help = (
+        "Register the users listed in a CSV (first column: username or email) "
+        "for an event, and print a per-row report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("event", help="Event slug.")
+        parser.add_argument("csv_path", help="CSV file, or - for stdin.")
+        parser.add_argument("--report", help="Write the per-row report as CSV to this path.")
+
+    def handle(self, *args, **options):
+        try:
+            event = Event.objects.get(slug=options["event"])
+        except Event.DoesNotExist:
+            raise CommandError(f"No event with slug {options['event']!r}.")
+
+        if options["csv_path"] == "-":
+            text = sys.stdin.read()
+        else:
+            try:
+                with open(options["csv_path"], encoding="utf-8-sig", newline="") as fh:
+                    text = fh.read()
+            except OSError as exc:
+                raise CommandError(str(exc))
+
+        report = attendees.import_attendees(event, attendees.read_identifiers(text))
+
+        if options["report"]:
+            with open(options["report"], "w", encoding="utf-8", newline="") as fh:
+                attendees.write_report(report, fh)
+        else:
+            for row in report:
+                if row["status"] != attendees.REGISTERED:
+                    self.stdout.write(f"line {row['line']}: {row['identifier']}: {row['status']}")
+
+        summary = ", ".join(f"{count} {status}" for status, count in attendees.summarize(report).items())
+        self.stdout.write(self.style.SUCCESS(f"{event.title}: {summary or 'nothing to import'}."))
@@ -0,0 +1,95 @@
+# catalog/management/commands/load_journeys.py
+"""
+Run scripted user journeys (catalog/loadgen.py) against a running server
+and report throughput and per-step p50/p95/p99, then check the database
+for overbooking. Point it at a server using the same database, e.g.:
+
+    gunicorn shop.wsgi -w 4 -b 127.0.0.1:8000
+    python manage.py load_journeys --users 200 --concurrency 50
+
+    python manage.py load_journeys --journey my_journey.txt --cleanup
+"""
+import asyncio
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog import loadgen
+
+
+class Command(BaseCommand):
+    help = "Simulate concurrent shoppers walking a journey; print per-step latency percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("--journey", help="Journey DSL file (default: the built-in shop journey).")
+        parser.add_argument("--users", type=int, default=50, help="Virtual users, one journey each.")
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--timeout", type=float, default=10.0)
+        parser.add_argument("--seed", type=int, help="Make the users' random choices repeatable.")
+        parser.add_argument(
+            "--cleanup", action="store_true", help="Delete the accounts this run signed up afterwards."
+        )
+        parser.add_argument("--print-journey", action="store_true", help="Show the built-in journey and exit.")
+
+    def handle(self, *args, **options):
+        if options["print_journey"]:
+            self.stdout.write(loadgen.DEFAULT_JOURNEY.strip())
+            return
+
+        text = loadgen.DEFAULT_JOURNEY
+        if options["journey"]:
+            with open(options["journey"], encoding="utf-8") as f:
+                text = f.read()
+        try:
+            steps = loadgen.parse_journey(text)
+        except loadgen.JourneyError as exc:
+            raise CommandError(f"Bad journey: {exc}")
+
+        fixtures = loadgen.load_fixtures()
+        try:
+            report, run_id = asyncio.run(loadgen.run(
+                options["base_url"],
+                steps,
+                users=options["users"],
+                concurrency=options["concurrency"],
+                timeout=options["timeout"],
+                fixtures=fixtures,
+                seed=options["seed"],
+            ))
+        except (ValueError, loadgen.JourneyError) as exc:
+            raise CommandError(str(exc))
+
+        self.write_report(report, options)
+        findings = loadgen.check_integrity()
+
+        if options["cleanup"]:
+            deleted = get_user_model().objects.filter(username__startswith=f"load-{run_id}-").delete()[0]
+            self.stdout.write(f"Cleanup:     deleted {deleted} row(s) created for run {run_id}")
+
+        if findings:
+            for finding in findings:
+                self.stdout.write(self.style.ERROR(f"  {finding}"))
+            raise CommandError(f"{len(findings)} integrity problem(s) found.")
+        self.stdout.write(self.style.SUCCESS("Integrity:   no overfull events or overlapping bookings"))
+
+    def write_report(self, report, options):
+        w = self.stdout.write
+        w(f"Target:      {options['base_url']} (run {report.journeys} journeys, "
+          f"{len(report.order)} steps each)")
+        w(f"Users:       {options['users']} @ concurrency {options['concurrency']}")
+        w(f"Requests:    {report.requests} in {report.elapsed:.1f}s "
+          f"= {report.requests / report.elapsed if report.elapsed else 0:.1f} req/s")
+        w("")
+        w(f"{'step':<16}{'reqs':>6}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'shed':>6}")
+        for row in report.rows():
+            w(
+                f"{row['step']:<16}{row['requests']:>6}{row['rps']:>8.1f}{row['p50']:>9.1f}"
+                f"{row['p95']:>9.1f}{row['p99']:>9.1f}{row['errors']:>8}{row['shed']:>6}"
+            )
+        if report.error_samples:
+            w("")
+            w("First errors:")
+            for sample in report.error_samples:
+                w(f"  {sample}")
+        w("")
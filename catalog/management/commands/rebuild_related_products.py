@@ -0,0 +1,25 @@
+# catalog/management/commands/rebuild_related_products.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from catalog import related
+
+
+class Command(BaseCommand):
+    help = "Recompute related products (TF-IDF). Incremental unless --full."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute every product.")
+        parser.add_argument("-k", type=int, default=related.TOP_K, help="Neighbours per product.")
+        parser.add_argument("--chunk-size", type=int, default=related.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = related.rebuild(
+            full=options["full"], k=options["k"], chunk_size=options["chunk_size"]
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated related products for {written} product(s) in {elapsed:.1f}s.")
+        )
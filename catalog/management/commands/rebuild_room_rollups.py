@@ -0,0 +1,15 @@
+# catalog/management/commands/rebuild_room_rollups.py
+from django.core.management.base import BaseCommand
+
+from catalog import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the hourly room usage rollups from every RoomBooking (NumPy backfill)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rows = rollups.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} hourly rollup rows."))
@@ -0,0 +1,26 @@
+# catalog/management/commands/run_tasks.py
+from django.core.management.base import BaseCommand
+
+from catalog import tasks
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks (catalog.tasks) on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Thread pool size.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds between polls when idle.")
+        parser.add_argument("--once", action="store_true", help="Run what is due now, then exit.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Task worker {tasks.worker_id()} started ({options['workers']} threads).")
+        try:
+            ran = tasks.run_worker(
+                concurrency=options["workers"],
+                poll_seconds=options["poll"],
+                once=options["once"],
+            )
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Ran {ran} task(s)."))
@@ -0,0 +1,35 @@
+# catalog/middleware.py
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+
+class AsyncURLConfMiddleware:
+    """
+    Route ASGI requests through settings.ASGI_URLCONF so uvicorn serves the
+    async catalog views, while WSGI (runserver, gunicorn) keeps the sync ones.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self._set_urlconf(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        self._set_urlconf(request)
+        return await self.get_response(request)
+
+    def _set_urlconf(self, request):
+        urlconf = getattr(settings, "ASGI_URLCONF", None)
+        if urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = urlconf
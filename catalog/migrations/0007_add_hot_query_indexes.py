@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-19 14:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0006_alter_roombooking_options_remove_roombooking_date_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date', 'start_time'], name='event_date_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventregistration',
+            index=models.Index(fields=['user', '-registered_at'], name='eventreg_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventregistration',
+            index=models.Index(fields=['event', 'registered_at'], name='eventreg_event_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'name'], name='product_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roombooking',
+            index=models.Index(fields=['start_time'], name='booking_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roombooking',
+            index=models.Index(fields=['room', 'start_time', 'end_time'], name='booking_room_span_idx'),
+        ),
+    ]
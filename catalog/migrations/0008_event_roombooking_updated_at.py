@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 14:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_add_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='roombooking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 14:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_roombookingseries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('occupied_seconds', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage_rollups', to='catalog.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='rollup_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'hour'), name='rollup_room_hour_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-19 14:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0013_relatedproduct'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('slug', models.SlugField()),
+                ('description', models.TextField(blank=True)),
+                ('date', models.DateField()),
+                ('start_time', models.DateTimeField()),
+                ('capacity', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-date', '-start_time'],
+                'indexes': [models.Index(fields=['date', 'start_time'], name='archevent_date_start_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedEventRegistration',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('registered_at', models.DateTimeField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registrations', to='catalog.archivedevent')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-registered_at'],
+                'indexes': [models.Index(fields=['event', 'registered_at'], name='archreg_event_time_idx'), models.Index(fields=['user', '-registered_at'], name='archreg_user_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedRoomBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField()),
+                ('fee_charged', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='catalog.room')),
+                ('series', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_bookings', to='catalog.roombookingseries')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-start_time'],
+                'indexes': [models.Index(fields=['user', '-start_time'], name='archbooking_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # the page cache and admission cache are DatabaseCaches shared by every
+    # process; their tables aren't models, so `migrate` alone wouldn't
+    # create them
+    call_command("createcachetable", database=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0017_calendarfeed'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
-﻿from django.db import models
+﻿from datetime import timedelta
+
+from django.db import DatabaseError, models, transaction
 from django.conf import settings
 from django.utils import timezone
 
@@ -18,9 +20,104 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     category = models.CharField(max_length=80, blank=True)
 
+    # popularity counters; written in batches by catalog/counters.py,
+    # never directly from a request
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    cart_add_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # bumped on every save (not by the counter flushes, which use .update())
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # admin list_filter by category, and product_list ?category= in
+            # its default newest-first order
+            models.Index(fields=["category", "-id"], name="product_category_idx"),
+            # product_list ?sort=popular
+            models.Index(
+                fields=["-cart_add_count", "-view_count", "-id"],
+                name="product_popularity_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
+    # the columns catalog/counters.py flushes (its FIELDS)
+    COUNTER_FIELDS = ("view_count", "cart_add_count")
+
+    def save(self, *args, **kwargs):
+        # An ordinary save of a loaded product (admin, product_edit) must
+        # not write back the counters it read earlier: the flusher may have
+        # added to them since. Only the counter flushes (.update() with F())
+        # change those columns. A caller passing update_fields (even None)
+        # or force_insert gets a plain save.
+        if (
+            self._state.adding
+            or args
+            or "update_fields" in kwargs
+            or kwargs.get("force_insert")
+        ):
+            return super().save(*args, **kwargs)
+
+        fields = [
+            f.name for f in self._meta.concrete_fields
+            if not f.primary_key and f.name not in self.COUNTER_FIELDS
+        ]
+        try:
+            # savepoint: a failed save leaves the outer transaction usable
+            with transaction.atomic(using=kwargs.get("using")):
+                super().save(update_fields=fields, **kwargs)
+        except DatabaseError:
+            if Product.objects.filter(pk=self.pk).exists():
+                raise
+            # deleted since it was loaded: re-insert it, as a plain save does
+            super().save(**kwargs)
+
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed "you might also like" neighbours for a product.
+    Written offline by catalog/related.py; product_detail reads the
+    top rows with one indexed query.
+    """
+
+    product = models.ForeignKey(
+        Product,
+        related_name="related_links",
+        on_delete=models.CASCADE,
+    )
+    related = models.ForeignKey(
+        Product,
+        related_name="+",
+        on_delete=models.CASCADE,
+    )
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["product", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["product", "rank"], name="related_product_rank_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class CounterFlush(models.Model):
+    """
+    One committed batch of popularity counter increments.
+    Lets a retried flush detect that it was already applied.
+    """
+
+    id = models.UUIDField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return str(self.id)
+
 
 class Event(models.Model):
     title = models.CharField(max_length=200)
@@ -36,16 +133,26 @@ class Event(models.Model):
 
     capacity = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped on every save; used for calendar feed ETags / LAST-MODIFIED
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         # sort upcoming events by date, then time
         ordering = ["date", "start_time"]
+        indexes = [
+            # event_list ORDER BY date, start_time without a temp sort
+            models.Index(fields=["date", "start_time"], name="event_date_start_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
     @property
     def registrations_count(self):
+        # views can pre-load this via .annotate(num_registrations=Count(...))
+        # so list pages don't run one COUNT per event
+        if "num_registrations" in self.__dict__:
+            return self.num_registrations
         return self.registrations.count()
 
     @property
@@ -67,11 +174,47 @@ class EventRegistration(models.Model):
     class Meta:
         unique_together = ("event", "user")
         ordering = ["-registered_at"]
+        indexes = [
+            # (event, user) is already covered by unique_together; this one
+            # serves "my registrations" lookups by user, newest first
+            models.Index(fields=["user", "-registered_at"], name="eventreg_user_idx"),
+            # attendee lists for one event, in sign-up order
+            models.Index(fields=["event", "registered_at"], name="eventreg_event_time_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user} -> {self.event}"
 
 
+class EventWaitlistEntry(models.Model):
+    """
+    A user waiting for a spot at a full event. The queue is FIFO by id;
+    catalog/waitlist.py promotes the head to an EventRegistration as soon
+    as a registration is deleted.
+    """
+
+    event = models.ForeignKey(
+        Event,
+        related_name="waitlist",
+        on_delete=models.CASCADE,
+    )
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("event", "user")
+        ordering = ["event", "id"]
+        verbose_name_plural = "event waitlist entries"
+        indexes = [
+            # queue position: COUNT(*) WHERE event = ? AND id <= ?;
+            # promotion: WHERE event = ? ORDER BY id LIMIT n
+            models.Index(fields=["event", "id"], name="waitlist_event_pos_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} waiting for {self.event}"
+
+
 # =========================
 # ROOMS & ROOM BOOKINGS
 # =========================
@@ -97,6 +240,79 @@ class Room(models.Model):
         return self.name
 
 
+class RoomBookingSeries(models.Model):
+    """
+    A weekly recurring reservation (e.g. a TTRPG campaign night).
+    Each session is stored as a normal RoomBooking pointing back here.
+    """
+
+    MAX_OCCURRENCES = 104  # two years of weekly sessions
+
+    room = models.ForeignKey(
+        Room,
+        related_name="booking_series",
+        on_delete=models.CASCADE,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+
+    # first session; later sessions repeat the same wall-clock times
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+
+    interval_weeks = models.PositiveSmallIntegerField(default=1)
+
+    # stop after N sessions, or on/before a date (whichever comes first)
+    occurrences = models.PositiveIntegerField(null=True, blank=True)
+    until = models.DateField(null=True, blank=True)
+
+    # ISO dates ("2025-12-24") that are skipped
+    exceptions = models.JSONField(default=list, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "room booking series"
+
+    def __str__(self):
+        return f"{self.room.name} every {self.interval_weeks} week(s) for {self.user}"
+
+    def occurrence_times(self):
+        """
+        Yield (start, end) for every session, in order.
+        Repeats in local time so sessions stay at 7pm across DST changes.
+        Skipped dates don't count towards `occurrences`.
+        """
+        limit = min(self.occurrences or self.MAX_OCCURRENCES, self.MAX_OCCURRENCES)
+        return self._session_times(limit)
+
+    def is_truncated(self):
+        """True if `until` needs more than MAX_OCCURRENCES sessions."""
+        if self.occurrences and self.occurrences <= self.MAX_OCCURRENCES:
+            return False
+        sessions = self._session_times(self.MAX_OCCURRENCES + 1)
+        return sum(1 for _ in sessions) > self.MAX_OCCURRENCES
+
+    def _session_times(self, limit):
+        local_start = timezone.localtime(self.start_time).replace(tzinfo=None)
+        duration = self.end_time - self.start_time
+        step = timedelta(weeks=self.interval_weeks or 1)
+        skipped = set(self.exceptions or [])
+
+        made = 0
+        current = local_start
+        while made < limit:
+            if self.until and current.date() > self.until:
+                break
+            if current.date().isoformat() not in skipped:
+                made += 1
+                start = timezone.make_aware(current)
+                yield start, start + duration
+            current += step
+
+
 class RoomBooking(models.Model):
     """
     A single reservation of a room by a user.
@@ -113,6 +329,15 @@ class RoomBooking(models.Model):
         on_delete=models.CASCADE,
     )
 
+    # set when the booking is one session of a recurring series
+    series = models.ForeignKey(
+        RoomBookingSeries,
+        related_name="bookings",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
 
@@ -124,9 +349,208 @@ class RoomBooking(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["start_time"]
+        indexes = [
+            # shared calendar: ORDER BY start_time
+            models.Index(fields=["start_time"], name="booking_start_idx"),
+            # overlap check: room = ? AND start_time < ? AND end_time > ?
+            models.Index(fields=["room", "start_time", "end_time"], name="booking_room_span_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.room.name} for {self.user} at {self.start_time}"
+
+
+class CalendarFeed(models.Model):
+    """
+    Version of a user's personal .ics feed link (see views.calendar_token).
+    The version is signed into the link, so bumping it revokes every link
+    handed out before. Users without a row are on version 0.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        related_name="calendar_feed",
+        on_delete=models.CASCADE,
+    )
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Calendar feed v{self.version} for {self.user}"
+
+
+class RoomUsageRollup(models.Model):
+    """
+    Pre-aggregated room usage for one room and one clock hour (UTC).
+
+    Kept up to date from booking create/cancel signals (catalog/rollups.py)
+    so the utilization report never scans RoomBooking.
+    """
+
+    room = models.ForeignKey(
+        Room,
+        related_name="usage_rollups",
+        on_delete=models.CASCADE,
+    )
+    hour = models.DateTimeField()
+
+    # seconds of this hour covered by bookings (can exceed 3600 only if
+    # bookings overlap, which the booking views prevent)
+    occupied_seconds = models.IntegerField(default=0)
+
+    # fees of bookings that START in this hour
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["room", "hour"], name="rollup_room_hour_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["hour"], name="rollup_hour_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id} @ {self.hour}: {self.occupied_seconds}s"
+
+
+class Task(models.Model):
+    """
+    A unit of deferred work for the local task runner (catalog/tasks.py).
+    Executed by `python manage.py run_tasks`; no external broker needed.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # at most one queued task per key (see constraint below); a running
+    # one doesn't count, so work queued during a run isn't dropped
+    dedup_key = models.CharField(max_length=200, blank=True, null=True)
+
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["run_at", "id"]
+        indexes = [
+            # worker poll: status = 'queued' AND run_at <= now ORDER BY run_at
+            models.Index(fields=["status", "run_at"], name="task_due_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedup_key"],
+                condition=models.Q(status="queued"),
+                name="task_queued_dedup_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.status}]"
+
+
+# =========================
+# ARCHIVE (COLD TABLES)
+# =========================
+# Past events (with their registrations) and old room bookings are moved
+# here by catalog/archive.py so the hot tables above stay small. Rows keep
+# their original primary keys.
+
+class ArchivedEvent(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    # not unique: a new hot Event may reuse the slug of an archived one
+    slug = models.SlugField()
+    description = models.TextField(blank=True)
+    date = models.DateField()
+    start_time = models.DateTimeField()
+    capacity = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-date", "-start_time"]
+        indexes = [
+            models.Index(fields=["date", "start_time"], name="archevent_date_start_idx"),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedEventRegistration(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    event = models.ForeignKey(
+        ArchivedEvent,
+        related_name="registrations",
+        on_delete=models.CASCADE,
+    )
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    registered_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-registered_at"]
+        indexes = [
+            models.Index(fields=["event", "registered_at"], name="archreg_event_time_idx"),
+            models.Index(fields=["user", "-registered_at"], name="archreg_user_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} -> {self.event}"
+
+
+class ArchivedRoomBooking(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    room = models.ForeignKey(
+        Room,
+        related_name="archived_bookings",
+        on_delete=models.CASCADE,
+    )
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # cancelling a series later must not erase its past sessions
+    series = models.ForeignKey(
+        RoomBookingSeries,
+        related_name="archived_bookings",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    fee_charged = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-start_time"]
+        indexes = [
+            # booking history: user = ? ORDER BY start_time DESC
+            models.Index(fields=["user", "-start_time"], name="archbooking_user_idx"),
+        ]
 
     def __str__(self):
         return f"{self.room.name} for {self.user} at {self.start_time}"
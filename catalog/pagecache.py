@@ -0,0 +1,261 @@
+# catalog/pagecache.py
+"""
+Full-page cache for anonymous GET requests.
+
+    @cache_anonymous_page(Product)
+    def product_list(request): ...
+
+A page is stored under its full path (query string included) plus the
+current version counter of every model it is built from. Saving or
+deleting one of those models bumps the counter (catalog/signals.py), so
+all pages built from it miss on their next request without any key
+scanning; the old entries simply expire.
+
+Only visitors without a login, a cart or pending messages are served from
+the cache; everyone else falls through to the view as before.
+
+Dogpile protection: on a miss, one request takes a short lock (cache.add)
+and renders the page. Concurrent requests get the previous copy of the
+page if there is one, or wait briefly for the lock holder to store it.
+
+CSRF: form tokens are replaced with a placeholder before a page is stored
+and with a token for the current visitor when it is served.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.messages.storage.session import SessionStorage
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+from .cart import CART_SESSION_ID
+
+CSRF_INPUT_RE = re.compile(rb'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = b"__pagecache_csrf__"
+
+# a renderer that dies holding the lock only blocks regeneration this long
+LOCK_SECONDS = 10
+# how long a request without a stale copy waits for another one's render
+WAIT_SECONDS = 2.0
+POLL_SECONDS = 0.05
+
+HIT, MISS, STALE = "hit", "miss", "stale"
+
+
+def _cache():
+    return caches[getattr(settings, "PAGE_CACHE_ALIAS", "default")]
+
+
+def _timeout():
+    return getattr(settings, "PAGE_CACHE_SECONDS", 300)
+
+
+# =========================
+# VERSION COUNTERS
+# =========================
+
+def _version_key(model):
+    return f"pagecache:v:{model._meta.label_lower}"
+
+
+def _seed():
+    # counters start from the clock, so one that was evicted from the cache
+    # and re-created can never match the key of a page stored before
+    return time.time_ns() // 1000
+
+
+def bump(model):
+    """Invalidate every cached page built from `model`."""
+    cache = _cache()
+    key = _version_key(model)
+    if cache.add(key, _seed(), None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _seed(), None)
+
+
+def _versions(models):
+    cache = _cache()
+    keys = [_version_key(m) for m in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, _seed(), None)
+            found[key] = cache.get(key)
+    return [str(found[key]) for key in keys]
+
+
+# =========================
+# LOOKUP / STORE
+# =========================
+
+def is_cacheable(request):
+    """Anonymous GET/HEAD with no cart and no flash messages waiting."""
+    if request.method not in ("GET", "HEAD") or _timeout() <= 0:
+        return False
+    if CookieStorage.cookie_name in request.COOKIES:
+        return False
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        session = request.session
+        if (
+            session.get(SESSION_KEY)
+            or session.get(CART_SESSION_ID)
+            or session.get(SessionStorage.session_key)
+        ):
+            return False
+    return True
+
+
+class PageLookup:
+    """Cache keys and lock state for one request's page."""
+
+    def __init__(self, request, models):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        self.page_key = f"pagecache:page:{path}:{'.'.join(_versions(models))}"
+        # last copy stored for this path, whatever its versions; served
+        # while someone else regenerates
+        self.last_key = f"pagecache:last:{path}"
+        self.lock_key = f"{self.page_key}:lock"
+        self.locked = False
+        self.deadline = None
+
+    def lookup(self):
+        """
+        (entry, state). entry is None when the caller should render: it
+        then either holds the lock (MISS) or should keep calling wait().
+        """
+        cache = _cache()
+        entry = cache.get(self.page_key)
+        if entry is not None:
+            return entry, HIT
+        if cache.add(self.lock_key, 1, LOCK_SECONDS):
+            self.locked = True
+            return None, MISS
+        entry = cache.get(self.last_key)
+        if entry is not None:
+            return entry, STALE
+        self.deadline = time.monotonic() + WAIT_SECONDS
+        return None, None
+
+    def wait(self):
+        """Poll once for the lock holder's page; (None, MISS) once we stop waiting."""
+        entry = _cache().get(self.page_key)
+        if entry is not None:
+            return entry, HIT
+        if time.monotonic() >= self.deadline:
+            return None, MISS
+        return None, None
+
+    def store(self, request, response):
+        """Save a plain 200 page that didn't touch the session or set cookies."""
+        try:
+            if (
+                response.status_code == 200
+                and not response.streaming
+                and not response.cookies
+                and not getattr(getattr(request, "session", None), "modified", False)
+            ):
+                entry = {
+                    "content": CSRF_INPUT_RE.sub(
+                        rb"\1" + CSRF_PLACEHOLDER + rb"\2", response.content
+                    ),
+                    "content_type": response["Content-Type"],
+                    "meta": getattr(response, "page_cache_meta", None),
+                }
+                timeout = _timeout()
+                _cache().set(self.page_key, entry, timeout)
+                _cache().set(self.last_key, entry, timeout * 2)
+        finally:
+            self.release()
+
+    def release(self):
+        if self.locked:
+            _cache().delete(self.lock_key)
+            self.locked = False
+
+
+def _serve(request, entry, state, on_hit):
+    content = entry["content"]
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content, content_type=entry["content_type"])
+    response["X-Page-Cache"] = state
+    if on_hit is not None:
+        on_hit(request, entry["meta"])
+    return response
+
+
+# =========================
+# DECORATOR
+# =========================
+
+def cache_anonymous_page(*models, on_hit=None):
+    """
+    Cache a view's page for anonymous visitors until one of `models`
+    changes (or PAGE_CACHE_SECONDS pass). Works on sync and async views.
+
+    A view can set `response.page_cache_meta` (anything picklable); it is
+    stored with the page and passed to `on_hit(request, meta)` whenever the
+    cached copy is served, for side effects the view would have had.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if not await sync_to_async(is_cacheable)(request):
+                    return await view(request, *args, **kwargs)
+                page = await sync_to_async(PageLookup)(request, models)
+                entry, state = await sync_to_async(page.lookup)()
+                while state is None:
+                    await asyncio.sleep(POLL_SECONDS)
+                    entry, state = await sync_to_async(page.wait)()
+                if entry is not None:
+                    return _serve(request, entry, state, on_hit)
+
+                try:
+                    response = await view(request, *args, **kwargs)
+                except BaseException:
+                    await sync_to_async(page.release)()
+                    raise
+                await sync_to_async(page.store)(request, response)
+                response["X-Page-Cache"] = MISS
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not is_cacheable(request):
+                return view(request, *args, **kwargs)
+            page = PageLookup(request, models)
+            entry, state = page.lookup()
+            while state is None:
+                time.sleep(POLL_SECONDS)
+                entry, state = page.wait()
+            if entry is not None:
+                return _serve(request, entry, state, on_hit)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                page.release()
+                raise
+            page.store(request, response)
+            response["X-Page-Cache"] = MISS
+            return response
+
+        return wrapper
+
+    return decorator
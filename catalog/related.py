@@ -0,0 +1,320 @@
+# catalog/related.py
+"""
+Offline "related products" computation.
+
+Products are turned into L2-normalised TF-IDF vectors over their name,
+category and description, stored CSR-style in NumPy arrays. Cosine
+similarity is computed a chunk of rows at a time against an inverted
+index (term -> postings), so memory stays at chunk_size x n_products
+floats and 100k products finish in minutes. The top-k neighbours per
+product are written to RelatedProduct.
+
+rebuild(full=False) only recomputes products saved since the last run
+(Product.updated_at) or whose list lost a neighbour to a delete (see
+mark_neighbours_stale), and patches the lists of products they now beat.
+Scores in untouched lists were computed with the IDF weights of their
+day, so once the oldest list is FULL_REBUILD_AGE old an incremental run
+becomes a full one.
+"""
+import math
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import pagecache
+from .models import Product, RelatedProduct
+from .tasks import task
+
+TOP_K = 8
+CHUNK_SIZE = 256
+# terms in more than this share of products say nothing about similarity
+MAX_DF = 0.5
+MAX_DF_MIN_DOCS = 100
+# past this share of changed products an incremental run isn't worth it
+FULL_REBUILD_SHARE = 0.2
+# bound on how stale the IDF weights behind any stored score can get
+FULL_REBUILD_AGE = timedelta(days=1)
+# computed_at of lists that lost a neighbour and must be recomputed
+STALE = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+# the fields the vectors are built from
+TEXT_FIELDS = ("name", "category", "description")
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it its of on or the this to with".split()
+)
+# name, category, description
+FIELD_WEIGHTS = (2, 2, 1)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+class TfidfIndex:
+    """TF-IDF vectors for every product plus the postings needed to score them."""
+
+    def __init__(self, ids, indptr, indices, data, n_terms):
+        import numpy as np
+
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+        # column-major copy (postings per term) for the similarity pass
+        order = np.argsort(indices, kind="stable")
+        rows = np.repeat(np.arange(len(ids)), np.diff(indptr))
+        self.post_docs = rows[order]
+        self.post_data = data[order]
+        self.post_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=n_terms), out=self.post_ptr[1:])
+
+    @classmethod
+    def build(cls, rows):
+        """rows: iterable of (pk, name, category, description) tuples."""
+        import numpy as np
+
+        ids, doc_terms = [], []
+        df = Counter()
+        for pk, *fields in rows:
+            counts = Counter()
+            for text, weight in zip(fields, FIELD_WEIGHTS):
+                for token in tokenize(text):
+                    counts[token] += weight
+            ids.append(pk)
+            doc_terms.append(counts)
+            df.update(counts.keys())
+
+        n_docs = len(ids)
+        # small catalogs keep every term; IDF alone weighs them down
+        max_df = int(MAX_DF * n_docs) if n_docs >= MAX_DF_MIN_DOCS else n_docs
+        vocab = {}
+        for term, freq in df.items():
+            if freq <= max_df:
+                vocab[term] = len(vocab)
+        idf = np.zeros(len(vocab))
+        for term, col in vocab.items():
+            idf[col] = math.log((1 + n_docs) / (1 + df[term])) + 1
+
+        indptr = [0]
+        indices, data = [], []
+        for counts in doc_terms:
+            for term, tf in counts.items():
+                col = vocab.get(term)
+                if col is not None:
+                    indices.append(col)
+                    data.append(1 + math.log(tf))
+            indptr.append(len(indices))
+
+        indptr = np.asarray(indptr, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int64)
+        data = np.asarray(data, dtype=np.float64) * idf[indices] if len(indices) else np.zeros(0)
+
+        # L2-normalise each row so the dot product is the cosine similarity
+        lengths = np.diff(indptr)
+        row_of = np.repeat(np.arange(n_docs), lengths)
+        norms = np.sqrt(np.bincount(row_of, weights=data ** 2, minlength=n_docs))
+        norms[norms == 0] = 1
+        data = data / norms[row_of]
+
+        return cls(np.asarray(ids, dtype=np.int64), indptr, indices, data, len(vocab))
+
+    def similarities(self, rows):
+        """Dense (len(rows), n_products) cosine similarity matrix for some rows."""
+        import numpy as np
+
+        n = len(self.ids)
+        out = np.zeros(len(rows) * n)
+
+        # (chunk row, term, weight) triples for the requested rows
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        if not lengths.sum():
+            return out.reshape(len(rows), n)
+        q_row = np.repeat(np.arange(len(rows)), lengths)
+        q_pos = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+        q_term = self.indices[q_pos]
+        q_val = self.data[q_pos]
+
+        # expand each triple over the term's postings and scatter-add
+        p_start = self.post_ptr[q_term]
+        p_len = self.post_ptr[q_term + 1] - p_start
+        rep = np.repeat(np.arange(len(q_term)), p_len)
+        p_pos = np.arange(p_len.sum()) - np.repeat(np.cumsum(p_len) - p_len, p_len) + np.repeat(p_start, p_len)
+        flat = q_row[rep] * n + self.post_docs[p_pos]
+        out += np.bincount(flat, weights=q_val[rep] * self.post_data[p_pos], minlength=len(out))
+        return out.reshape(len(rows), n)
+
+
+def top_k(sim, rows, k):
+    """For each chunk row, the (column, score) pairs of its k best neighbours."""
+    import numpy as np
+
+    sim[np.arange(len(rows)), rows] = 0  # never recommend the product itself
+    k = min(k, sim.shape[1])
+    if k <= 0:
+        return [[] for _ in rows]
+    best = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+    results = []
+    for i in range(len(rows)):
+        cols = best[i][np.argsort(-sim[i, best[i]], kind="stable")]
+        results.append([(int(c), float(sim[i, c])) for c in cols if sim[i, c] > 0])
+    return results
+
+
+def _load_index():
+    rows = (
+        Product.objects.order_by("pk")
+        .values_list("pk", *TEXT_FIELDS)
+        .iterator(chunk_size=5000)
+    )
+    return TfidfIndex.build(rows)
+
+
+def _write(lists, now):
+    """Replace the RelatedProduct rows of the given products."""
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=list(lists)).delete()
+        RelatedProduct.objects.bulk_create(
+            (
+                RelatedProduct(
+                    product_id=product_id,
+                    related_id=related_id,
+                    rank=rank,
+                    score=score,
+                    computed_at=now,
+                )
+                for product_id, neighbours in lists.items()
+                for rank, (related_id, score) in enumerate(neighbours)
+            ),
+            batch_size=2000,
+        )
+    pagecache.bump(RelatedProduct)
+
+
+def mark_neighbours_stale(product_id):
+    """
+    `product_id` is being deleted: flag the lists that point at it (the
+    CASCADE leaves them a neighbour short) for the next incremental run.
+    """
+    affected = list(
+        RelatedProduct.objects.filter(related_id=product_id)
+        .exclude(product_id=product_id)
+        .values_list("product_id", flat=True)
+    )
+    if affected:
+        RelatedProduct.objects.filter(product_id__in=affected).update(computed_at=STALE)
+    return affected
+
+
+def rebuild(full=False, k=TOP_K, chunk_size=CHUNK_SIZE):
+    """
+    Recompute related products. Returns the number of products whose list
+    was rewritten.
+
+    Incremental (default): products saved since the last run, with no
+    list yet, or whose list was marked stale get a fresh list; every other
+    product has those products merged into / dropped from its existing
+    list.
+    """
+    import numpy as np
+
+    now = timezone.now()
+    index = _load_index()
+    if not len(index.ids):
+        RelatedProduct.objects.all().delete()
+        return 0
+
+    position = {int(pk): i for i, pk in enumerate(index.ids)}
+
+    if full:
+        targets = np.arange(len(index.ids))
+    else:
+        runs = RelatedProduct.objects.filter(computed_at__gt=STALE).aggregate(
+            last=Max("computed_at"), oldest=Min("computed_at")
+        )
+        if runs["oldest"] is not None and runs["oldest"] < now - FULL_REBUILD_AGE:
+            return rebuild(full=True, k=k, chunk_size=chunk_size)
+        changed = Product.objects.exclude(
+            pk__in=RelatedProduct.objects.values("product_id")
+        ) | Product.objects.filter(
+            pk__in=RelatedProduct.objects.filter(computed_at=STALE).values("product_id")
+        )
+        if runs["last"] is not None:
+            changed = changed | Product.objects.filter(updated_at__gt=runs["last"])
+        targets = np.asarray(
+            sorted(position[pk] for pk in changed.values_list("pk", flat=True).distinct()),
+            dtype=np.int64,
+        )
+        if not len(targets):
+            return 0
+        if len(targets) > FULL_REBUILD_SHARE * len(index.ids):
+            return rebuild(full=True, k=k, chunk_size=chunk_size)
+
+    written = 0
+    changed_ids = set(int(index.ids[t]) for t in targets)
+    # incremental: best score each untouched product has against a changed one
+    incoming = {}
+
+    for start in range(0, len(targets), chunk_size):
+        rows = targets[start:start + chunk_size]
+        sim = index.similarities(rows)
+        lists = {
+            int(index.ids[row]): [(int(index.ids[c]), s) for c, s in neighbours]
+            for row, neighbours in zip(rows, top_k(sim, rows, k))
+        }
+        _write(lists, now)
+        written += len(lists)
+
+        if not full:
+            for i, row in enumerate(rows):
+                hits = np.nonzero(sim[i])[0]
+                for col in hits:
+                    other = int(index.ids[col])
+                    if other not in changed_ids:
+                        incoming.setdefault(other, []).append((int(index.ids[row]), float(sim[i, col])))
+
+    if not full:
+        written += _merge_incoming(incoming, changed_ids, k, now)
+    return written
+
+
+def _merge_incoming(incoming, changed_ids, k, now):
+    """Patch untouched products' lists with their scores against changed products."""
+    affected = set(incoming)
+    # lists that still point at a changed product must be refreshed too
+    affected.update(
+        RelatedProduct.objects.filter(related_id__in=changed_ids)
+        .exclude(product_id__in=changed_ids)
+        .values_list("product_id", flat=True)
+    )
+    if not affected:
+        return 0
+
+    lists = {pk: [] for pk in affected}
+    for product_id, related_id, score in RelatedProduct.objects.filter(
+        product_id__in=affected
+    ).values_list("product_id", "related_id", "score").iterator(chunk_size=5000):
+        if related_id not in changed_ids:
+            lists[product_id].append((related_id, score))
+
+    for product_id, scores in incoming.items():
+        lists[product_id].extend(scores)
+
+    for product_id, neighbours in lists.items():
+        neighbours.sort(key=lambda pair: -pair[1])
+        lists[product_id] = neighbours[:k]
+
+    _write(lists, now)
+    return len(lists)
+
+
+@task(max_attempts=3)
+def refresh_related_products():
+    """Debounced incremental rebuild, queued when products' text changes or they are deleted."""
+    rebuild(full=False)
@@ -0,0 +1,271 @@
+# catalog/rollups.py
+"""
+Hourly room-usage rollups (RoomUsageRollup).
+
+- apply_bookings(): incremental +/- update, called from the booking
+  signals in catalog/signals.py and from bulk paths like book_series().
+- rebuild(): NumPy-vectorized backfill from the whole RoomBooking table.
+- usage_by_*(): the report queries; they only ever read the rollup table.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay, TruncMonth
+
+from .models import ArchivedRoomBooking, Room, RoomBooking, RoomUsageRollup
+
+HOUR = 3600
+
+_signals = threading.local()
+
+
+@contextmanager
+def signals_paused():
+    """
+    Have the booking signals leave the rollups alone in this thread, e.g.
+    while archival moves bookings to ArchivedRoomBooking: the usage still
+    happened, so it must not be subtracted.
+    """
+    previous = getattr(_signals, "paused", False)
+    _signals.paused = True
+    try:
+        yield
+    finally:
+        _signals.paused = previous
+
+
+def signals_are_paused():
+    return getattr(_signals, "paused", False)
+
+
+def floor_hour(value):
+    """Truncate an aware datetime to the start of its UTC hour."""
+    return value.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def hourly_bins(start, end):
+    """Yield (hour_start, seconds_covered) for each clock hour [start, end) touches."""
+    hour = floor_hour(start)
+    while hour < end:
+        next_hour = hour + timedelta(hours=1)
+        covered = (min(end, next_hour) - max(start, hour)).total_seconds()
+        if covered > 0:
+            yield hour, int(covered)
+        hour = next_hour
+
+
+def apply_bookings(bookings, sign=1):
+    """
+    Add (sign=1) or remove (sign=-1) the bookings' usage from the rollups.
+    Reads the affected rollup rows once, then bulk updates / creates.
+    """
+    deltas = defaultdict(lambda: [0, Decimal("0")])
+    for booking in bookings:
+        for hour, seconds in hourly_bins(booking.start_time, booking.end_time):
+            deltas[(booking.room_id, hour)][0] += sign * seconds
+        deltas[(booking.room_id, floor_hour(booking.start_time))][1] += (
+            sign * Decimal(booking.fee_charged or 0)
+        )
+    if deltas:
+        _merge(deltas)
+
+
+def _merge(deltas):
+    room_ids = {room_id for room_id, _ in deltas}
+    hours = {hour for _, hour in deltas}
+
+    with transaction.atomic():
+        existing = {
+            (row.room_id, row.hour): row
+            for row in RoomUsageRollup.objects.select_for_update().filter(
+                room_id__in=room_ids, hour__in=hours
+            )
+        }
+
+        to_update, to_create, emptied = [], [], []
+        for (room_id, hour), (seconds, revenue) in deltas.items():
+            row = existing.get((room_id, hour))
+            if row is not None:
+                row.occupied_seconds += seconds
+                row.revenue += revenue
+                if row.occupied_seconds <= 0 and not row.revenue:
+                    emptied.append(row.pk)
+                else:
+                    to_update.append(row)
+            elif seconds > 0 or revenue > 0:
+                # a removal with no row means the booking predates the
+                # rollups (or its room is being deleted): nothing to undo
+                to_create.append(
+                    RoomUsageRollup(
+                        room_id=room_id,
+                        hour=hour,
+                        occupied_seconds=max(seconds, 0),
+                        revenue=max(revenue, Decimal("0")),
+                    )
+                )
+
+        if to_update:
+            RoomUsageRollup.objects.bulk_update(to_update, ["occupied_seconds", "revenue"])
+        if to_create:
+            RoomUsageRollup.objects.bulk_create(to_create)
+        if emptied:
+            RoomUsageRollup.objects.filter(pk__in=emptied).delete()
+
+
+# =========================
+# BACKFILL
+# =========================
+
+def booking_arrays(queryset=None):
+    """
+    Load bookings as NumPy arrays: room ids, start/end epoch seconds, fees (cents).
+    By default that is every hot and archived booking.
+    """
+    import numpy as np
+
+    if queryset is not None:
+        querysets = [queryset]
+    else:
+        querysets = [RoomBooking.objects.all(), ArchivedRoomBooking.objects.all()]
+
+    room_ids, starts, ends, fees = [], [], [], []
+    for qs in querysets:
+        rows = qs.order_by().values_list("room_id", "start_time", "end_time", "fee_charged")
+        for room_id, start, end, fee in rows.iterator(chunk_size=5000):
+            room_ids.append(room_id)
+            starts.append(start.timestamp())
+            ends.append(end.timestamp())
+            fees.append(int((fee or 0) * 100))
+
+    return (
+        np.asarray(room_ids, dtype=np.int64),
+        np.asarray(starts, dtype=np.int64),
+        np.asarray(ends, dtype=np.int64),
+        np.asarray(fees, dtype=np.int64),
+    )
+
+
+def hourly_occupancy(room_ids, starts, ends, fees):
+    """
+    Vectorized interval -> hourly bin conversion.
+
+    Returns (room_ids, hour_epochs, seconds, revenue_cents), one entry per
+    (room, hour) with any usage. Every booking is expanded to the hours it
+    covers with np.repeat, clipped to each hour, then summed per key.
+    """
+    import numpy as np
+
+    keep = ends > starts
+    room_ids, starts, ends, fees = room_ids[keep], starts[keep], ends[keep], fees[keep]
+    if not len(starts):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+
+    first_hour = starts // HOUR
+    last_hour = (ends - 1) // HOUR
+    spans = last_hour - first_hour + 1
+
+    # one row per (booking, hour covered)
+    booking_idx = np.repeat(np.arange(len(starts)), spans)
+    offsets = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    hours = first_hour[booking_idx] + offsets
+
+    bin_start = hours * HOUR
+    covered = (
+        np.minimum(ends[booking_idx], bin_start + HOUR)
+        - np.maximum(starts[booking_idx], bin_start)
+    )
+
+    # revenue lands in the hour the booking starts
+    revenue = np.where(offsets == 0, fees[booking_idx], 0)
+
+    keys = np.stack([room_ids[booking_idx], hours], axis=1)
+    unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    seconds = np.bincount(inverse, weights=covered).astype(np.int64)
+    cents = np.bincount(inverse, weights=revenue).astype(np.int64)
+
+    return unique_keys[:, 0], unique_keys[:, 1] * HOUR, seconds, cents
+
+
+def rebuild(batch_size=5000):
+    """Recompute every rollup row from all bookings. Returns the row count."""
+    room_ids, hours, seconds, cents = hourly_occupancy(*booking_arrays())
+
+    with transaction.atomic():
+        RoomUsageRollup.objects.all().delete()
+        RoomUsageRollup.objects.bulk_create(
+            (
+                RoomUsageRollup(
+                    room_id=int(room_id),
+                    hour=datetime.fromtimestamp(int(hour), tz=dt_timezone.utc),
+                    occupied_seconds=int(secs),
+                    revenue=Decimal(int(cent)) / 100,
+                )
+                for room_id, hour, secs, cent in zip(room_ids, hours, seconds, cents)
+            ),
+            batch_size=batch_size,
+        )
+    return len(room_ids)
+
+
+# =========================
+# REPORT QUERIES
+# =========================
+
+def _rollups(start=None, end=None, room=None):
+    qs = RoomUsageRollup.objects.all()
+    if start:
+        qs = qs.filter(hour__gte=start)
+    if end:
+        qs = qs.filter(hour__lt=end)
+    if room:
+        qs = qs.filter(room=room)
+    return qs.order_by()
+
+
+def usage_by_hour_of_day(**filters):
+    return (
+        _rollups(**filters)
+        .annotate(bucket=ExtractHour("hour"))
+        .values("bucket")
+        .annotate(seconds=Sum("occupied_seconds"), revenue=Sum("revenue"))
+        .order_by("bucket")
+    )
+
+
+def usage_by_weekday(**filters):
+    # ExtractWeekDay: 1 = Sunday ... 7 = Saturday
+    return (
+        _rollups(**filters)
+        .annotate(bucket=ExtractWeekDay("hour"))
+        .values("bucket")
+        .annotate(seconds=Sum("occupied_seconds"), revenue=Sum("revenue"))
+        .order_by("bucket")
+    )
+
+
+def usage_by_month(**filters):
+    return (
+        _rollups(**filters)
+        .annotate(bucket=TruncMonth("hour"))
+        .values("bucket")
+        .annotate(seconds=Sum("occupied_seconds"), revenue=Sum("revenue"))
+        .order_by("bucket")
+    )
+
+
+def usage_by_room(**filters):
+    rooms = dict(Room.objects.values_list("pk", "name"))
+    rows = (
+        _rollups(**filters)
+        .values("room")
+        .annotate(seconds=Sum("occupied_seconds"), revenue=Sum("revenue"))
+        .order_by("room")
+    )
+    return [dict(row, room_name=rooms.get(row["room"], "?")) for row in rows]
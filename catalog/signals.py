@@ -0,0 +1,145 @@
+# catalog/signals.py
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import product_index
+from .models import Event, EventRegistration, Product, RoomBooking
+from .related import TEXT_FIELDS, mark_neighbours_stale, refresh_related_products
+from .tasks import enqueue
+from . import admission, pagecache, rollups, snapshot, waitlist
+
+# wait for a burst of catalog edits to settle before recomputing
+RELATED_REFRESH_DELAY = 60
+
+
+@receiver(pre_save, sender=RoomBooking)
+def remember_booking_times(sender, instance, **kwargs):
+    """On edits, keep the old row so its usage can be taken back out."""
+    instance._rollup_previous = None
+    if rollups.signals_are_paused():
+        return
+    if instance.pk and not instance._state.adding:
+        instance._rollup_previous = (
+            RoomBooking.objects.filter(pk=instance.pk)
+            .only("room_id", "start_time", "end_time", "fee_charged")
+            .first()
+        )
+
+
+@receiver(post_save, sender=RoomBooking)
+def add_booking_usage(sender, instance, created, raw=False, **kwargs):
+    if raw or rollups.signals_are_paused():
+        return
+    previous = getattr(instance, "_rollup_previous", None)
+    if previous is not None:
+        rollups.apply_bookings([previous], sign=-1)
+    rollups.apply_bookings([instance], sign=1)
+
+
+@receiver(post_delete, sender=RoomBooking)
+def remove_booking_usage(sender, instance, **kwargs):
+    if rollups.signals_are_paused():
+        return
+    rollups.apply_bookings([instance], sign=-1)
+
+
+def _queue_related_products_refresh():
+    enqueue(
+        refresh_related_products,
+        dedup_key="related-products",
+        delay=RELATED_REFRESH_DELAY,
+    )
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_text(sender, instance, raw=False, **kwargs):
+    """On edits, keep the old text so stock / price edits don't requeue related products."""
+    instance._related_previous = None
+    if raw or instance._state.adding:
+        return
+    instance._related_previous = (
+        Product.objects.filter(pk=instance.pk).values_list(*TEXT_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Product)
+def queue_related_products_refresh(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = tuple(getattr(instance, field) for field in TEXT_FIELDS)
+    if created or getattr(instance, "_related_previous", None) != current:
+        _queue_related_products_refresh()
+
+
+@receiver(pre_delete, sender=Product)
+def mark_related_lists_stale(sender, instance, **kwargs):
+    instance._related_affected = mark_neighbours_stale(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def queue_related_refill(sender, instance, **kwargs):
+    if getattr(instance, "_related_affected", None):
+        _queue_related_products_refresh()
+
+
+@receiver(post_save, sender=Product)
+def update_autocomplete(sender, instance, raw=False, **kwargs):
+    if not raw:
+        product_index.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    product_index.remove(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_catalog_snapshot(sender, raw=False, **kwargs):
+    """Stop serving the snapshot (all processes) and rebuild it shortly."""
+    if raw or not snapshot.mark_dirty():
+        return
+    snapshot.catalog_snapshot.invalidate()
+    enqueue(
+        snapshot.rebuild_catalog_snapshot,
+        dedup_key="catalog-snapshot",
+        delay=snapshot.REBUILD_DELAY,
+    )
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=EventRegistration)
+def reopen_event_admission(sender, instance, **kwargs):
+    """A freed spot or an edited capacity: stop turning sign-ups away."""
+    admission.clear_full(instance.pk if sender is Event else instance.event_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventRegistration)
+@receiver(post_delete, sender=EventRegistration)
+def invalidate_cached_pages(sender, raw=False, **kwargs):
+    """Cached anonymous pages built from this model are now out of date."""
+    if not raw:
+        pagecache.bump(sender)
+
+
+@receiver(post_delete, sender=EventRegistration)
+def promote_from_waitlist(sender, instance, origin=None, **kwargs):
+    """
+    Give the freed spot to the first waiter. post_delete runs inside the
+    delete's transaction, so the spot is never visibly free. Only for
+    registrations deleted directly: when an event or user is being deleted
+    the cascade must not create new registrations.
+    """
+    if isinstance(origin, EventRegistration) or getattr(origin, "model", None) is EventRegistration:
+        waitlist.promote(instance.event_id)
+
+
+@receiver(post_save, sender=Event)
+def fill_from_waitlist(sender, instance, created, raw=False, **kwargs):
+    """A raised (or removed) capacity lets waiters in."""
+    if not created and not raw:
+        waitlist.promote(instance.pk)
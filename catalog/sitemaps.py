@@ -0,0 +1,185 @@
+# catalog/sitemaps.py
+"""
+Sitemaps for product and event pages, so crawlers stop walking the
+(unpaginated, expensive) homepage to find them.
+
+    /sitemap.xml                  index of every shard
+    /sitemaps/products-0.xml      products with id 1..50000
+    /sitemaps/events-0.xml        ...
+
+Shards cover fixed id ranges of SHARD_SIZE, so each holds at most 50k
+URLs (the sitemap protocol limit) and a row never moves between shards.
+Files live on disk under settings.SITEMAP_ROOT and are written by
+streaming values_list("slug", "updated_at").iterator(), so memory stays
+flat however big the catalog gets; <lastmod> is the model's updated_at.
+
+refresh() asks the database for one (count, max updated_at) fingerprint
+per shard, a single GROUP BY per model, and rewrites only the shards
+whose fingerprint changed since the manifest was written (an edit moves
+the max, a delete changes the count). Files are replaced atomically.
+<loc> URLs start with settings.SITEMAP_BASE_URL, so the Host header of
+whoever asks for /sitemap.xml never ends up in (or rebuilds) the files.
+"""
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone as dt_timezone
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Count, F, Max
+from django.urls import reverse
+
+from .models import Event, Product
+
+SHARD_SIZE = 50_000
+CHUNK_SIZE = 2000
+MANIFEST = "manifest.json"
+INDEX = "sitemap.xml"
+
+# section name -> (model, detail URL name)
+SECTIONS = {
+    "products": (Product, "product_detail"),
+    "events": (Event, "event_detail"),
+}
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+XMLNS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def sitemap_root():
+    return os.fspath(getattr(settings, "SITEMAP_ROOT", None) or settings.BASE_DIR / "sitemaps")
+
+
+def default_base_url():
+    return settings.SITEMAP_BASE_URL.rstrip("/")
+
+
+def shard_name(section, shard):
+    return f"{section}-{shard}.xml"
+
+
+def _lastmod(value):
+    return value.astimezone(dt_timezone.utc).isoformat(timespec="seconds")
+
+
+def _replace(path, chunks):
+    """Write `chunks` to a temp file beside `path`, then swap it in."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".sitemap-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as out:
+            for chunk in chunks:
+                out.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+# =========================
+# FINGERPRINTS / MANIFEST
+# =========================
+
+def fingerprints(model):
+    """{shard: [row count, max updated_at ISO string]} in one GROUP BY."""
+    rows = (
+        model.objects.order_by()
+        .annotate(shard=(F("id") - 1) / SHARD_SIZE)
+        .values("shard")
+        .annotate(n=Count("id"), last=Max("updated_at"))
+    )
+    # full precision, so two edits within the same second still differ
+    return {str(row["shard"]): [row["n"], row["last"].isoformat()] for row in rows}
+
+
+def read_manifest(root=None):
+    try:
+        with open(os.path.join(root or sitemap_root(), MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+# =========================
+# WRITING
+# =========================
+
+def _shard_chunks(model, url_name, shard, base_url):
+    pattern = base_url + reverse(url_name, args=["__slug__"])
+    rows = (
+        model.objects.filter(id__gt=shard * SHARD_SIZE, id__lte=(shard + 1) * SHARD_SIZE)
+        .order_by("id")
+        .values_list("slug", "updated_at")
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    yield XML_HEADER + f"<urlset {XMLNS}>\n"
+    for slug, updated_at in rows:
+        yield (
+            f"<url><loc>{escape(pattern.replace('__slug__', slug))}</loc>"
+            f"<lastmod>{_lastmod(updated_at)}</lastmod></url>\n"
+        )
+    yield "</urlset>\n"
+
+
+def _index_chunks(sections, base_url):
+    yield XML_HEADER + f"<sitemapindex {XMLNS}>\n"
+    for section, shards in sections.items():
+        for shard in sorted(shards, key=int):
+            loc = base_url + reverse("sitemap_section", args=[section, int(shard)])
+            yield (
+                f"<sitemap><loc>{escape(loc)}</loc>"
+                f"<lastmod>{_lastmod(datetime.fromisoformat(shards[shard][1]))}</lastmod></sitemap>\n"
+            )
+    yield "</sitemapindex>\n"
+
+
+def refresh(base_url=None, force=False):
+    """
+    Bring the files under SITEMAP_ROOT up to date; `base_url` is the
+    scheme + host the <loc> URLs start with (SITEMAP_BASE_URL by default).
+    Returns the shards rewritten, e.g. ["products-0.xml"].
+    """
+    root = sitemap_root()
+    os.makedirs(root, exist_ok=True)
+    base_url = (base_url or default_base_url()).rstrip("/")
+    old = read_manifest(root)
+    if old.get("base_url") != base_url:
+        force = True
+
+    written, sections = [], {}
+    for section, (model, url_name) in SECTIONS.items():
+        current = fingerprints(model)
+        previous = old.get("sections", {}).get(section, {})
+        for shard, fingerprint in current.items():
+            path = os.path.join(root, shard_name(section, int(shard)))
+            if force or previous.get(shard) != fingerprint or not os.path.exists(path):
+                _replace(path, _shard_chunks(model, url_name, int(shard), base_url))
+                written.append(shard_name(section, int(shard)))
+        for shard in set(previous) - set(current):
+            # every row in the range is gone
+            try:
+                os.unlink(os.path.join(root, shard_name(section, int(shard))))
+            except FileNotFoundError:
+                pass
+        sections[section] = current
+
+    if written or force or sections != old.get("sections"):
+        _replace(os.path.join(root, INDEX), _index_chunks(sections, base_url))
+    manifest = {"base_url": base_url, "checked_at": time.time(), "sections": sections}
+    _replace(os.path.join(root, MANIFEST), [json.dumps(manifest)])
+    return written
+
+
+def refresh_if_stale():
+    """refresh() unless the manifest was checked within SITEMAP_REFRESH_SECONDS."""
+    manifest = read_manifest()
+    max_age = getattr(settings, "SITEMAP_REFRESH_SECONDS", 3600)
+    if (
+        manifest.get("base_url") == default_base_url()
+        and time.time() - manifest.get("checked_at", 0) < max_age
+        and os.path.exists(os.path.join(sitemap_root(), INDEX))
+    ):
+        return []
+    return refresh()
+
@@ -0,0 +1,336 @@
+# catalog/snapshot.py
+"""
+Read-only catalog snapshot shared by all worker processes.
+
+The catalog changes a few times a day but is read on every request.
+build() writes every product into one column-oriented binary file
+(settings.CATALOG_SNAPSHOT_PATH): fixed-width NumPy columns for numbers,
+one UTF-8 blob + offsets per text column, newest product first. Each
+worker mmaps the file, so the OS page cache holds one copy for all of
+them, and product_list / product_detail build small SnapshotProduct
+objects from it instead of querying SQLite and creating model instances.
+
+Layout: MAGIC, a little-endian u32 header length, a JSON header (row
+count, build time, category names, {column: [offset, dtype, length]}),
+then the 8-byte aligned column arrays. Lookups:
+
+- by id: ids are stored in descending order; one np.searchsorted.
+- by slug: a sorted array of 64-bit slug hashes with the matching rows;
+  one np.searchsorted, then the slug itself is compared.
+
+Freshness: a rebuild is written to a temporary file and os.replace()d
+over the old one, so a reader sees either snapshot, never half of one;
+readers re-stat the file at most every CHECK_SECONDS and map the new one.
+Saving or deleting a product touches a "<path>.dirty" marker and queues a
+debounced rebuild; while the marker is newer than the snapshot, every
+process falls back to the ORM, so nobody is served an edited product's
+old data. A missing or unreadable file also means "use the ORM".
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .models import Product
+from .tasks import task
+
+MAGIC = b"CATSNAP1"
+ALIGN = 8
+CHECK_SECONDS = 1.0
+# let a burst of admin edits settle before rebuilding
+REBUILD_DELAY = 5
+# give up chasing a catalog that keeps changing during the rebuild
+MAX_REBUILD_PASSES = 3
+
+TEXT_COLUMNS = ("name", "slug", "description", "image", "image_url")
+
+
+def snapshot_path():
+    path = getattr(settings, "CATALOG_SNAPSHOT_PATH", None)
+    return os.fspath(path) if path else None
+
+
+def _dirty_path(path):
+    return f"{path}.dirty"
+
+
+def slug_hash(slug):
+    return int.from_bytes(hashlib.blake2b(slug.encode(), digest_size=8).digest(), "little")
+
+
+# =========================
+# BUILD
+# =========================
+
+def build(path=None):
+    """Write a fresh snapshot of every product; returns the row count."""
+    import numpy as np
+
+    path = path or snapshot_path()
+    built_ns = time.time_ns()
+
+    ids, cents, stock, codes = [], [], [], []
+    texts = {column: [] for column in TEXT_COLUMNS}
+    categories = {}
+    rows = (
+        Product.objects.order_by("-id")
+        .values_list("id", "price", "inventory_qty", "category", *TEXT_COLUMNS)
+        .iterator(chunk_size=5000)
+    )
+    for pk, price, qty, category, *values in rows:
+        ids.append(pk)
+        cents.append(int(price * 100))
+        stock.append(qty)
+        codes.append(categories.setdefault(category, len(categories)))
+        for column, value in zip(TEXT_COLUMNS, values):
+            texts[column].append((value or "").encode())
+
+    hashes = np.array([slug_hash(s.decode()) for s in texts["slug"]], dtype=np.uint64)
+    slug_order = np.argsort(hashes, kind="stable")
+    arrays = {
+        "id": np.array(ids, dtype=np.int64),
+        "price_cents": np.array(cents, dtype=np.int64),
+        "inventory_qty": np.array(stock, dtype=np.int64),
+        "category": np.array(codes, dtype=np.int32),
+        "slug_hash": hashes[slug_order],
+        "slug_row": slug_order.astype(np.int32),
+    }
+    for column, values in texts.items():
+        arrays[f"{column}.offsets"] = np.cumsum([0, *map(len, values)], dtype=np.int64)
+        arrays[f"{column}.data"] = np.frombuffer(b"".join(values), dtype=np.uint8)
+
+    _write(path, arrays, {
+        "count": len(ids),
+        "built_ns": built_ns,
+        "categories": list(categories),
+    })
+    return len(ids)
+
+
+def _write(path, arrays, header):
+    # lay the columns out first so the header can say where they are
+    columns, offset = {}, 0
+    for name, array in arrays.items():
+        columns[name] = [offset, array.dtype.str, len(array)]
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps({**header, "columns": columns}).encode()
+    start = -(-(len(MAGIC) + 4 + len(header)) // ALIGN) * ALIGN
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".catalog-snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(MAGIC + struct.pack("<I", len(header)) + header)
+            out.write(b"\0" * (start - out.tell()))
+            for array in arrays.values():
+                out.write(array.tobytes())
+                out.write(b"\0" * (-array.nbytes % ALIGN))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def mark_dirty(path=None):
+    """Products changed: stop serving the snapshot until it is rebuilt."""
+    path = path or snapshot_path()
+    if path and os.path.exists(path):
+        with open(_dirty_path(path), "w"):
+            pass
+        return True
+    return False
+
+
+@task(max_attempts=3)
+def rebuild_catalog_snapshot():
+    """Debounced rebuild, queued when products are saved or deleted."""
+    for _ in range(MAX_REBUILD_PASSES):
+        started = time.time_ns()
+        build()
+        if _dirty_ns(snapshot_path()) < started:
+            break
+        # a product was saved while we were reading; go again
+
+
+def _dirty_ns(path):
+    try:
+        return os.stat(_dirty_path(path)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+# =========================
+# READ
+# =========================
+
+class SnapshotImage:
+    """Enough of a FieldFile for the templates: truthiness and .url."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __bool__(self):
+        return bool(self.name)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def url(self):
+        return default_storage.url(self.name)
+
+
+class SnapshotProduct:
+    """The Product fields the catalog templates read, without a model instance."""
+
+    __slots__ = (
+        "id", "name", "slug", "price", "inventory_qty", "category",
+        "description", "image", "image_url",
+    )
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.name
+
+
+class Snapshot:
+    def __init__(self, path):
+        import numpy as np
+
+        self._np = np
+        with open(path, "rb") as f:
+            self.stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        (size,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        header = json.loads(self._mm[len(MAGIC) + 4:len(MAGIC) + 4 + size])
+        start = -(-(len(MAGIC) + 4 + size) // ALIGN) * ALIGN
+
+        self.count = header["count"]
+        self.built_ns = header["built_ns"]
+        self.categories = header["categories"]
+        self.cols = {
+            name: np.frombuffer(self._mm, dtype=dtype, count=length, offset=start + offset)
+            for name, (offset, dtype, length) in header["columns"].items()
+        }
+        # ascending view of the (descending) id column, for searchsorted
+        self._ids_asc = self.cols["id"][::-1]
+
+    def _text(self, column, row):
+        offsets = self.cols[f"{column}.offsets"]
+        data = self.cols[f"{column}.data"]
+        return data[offsets[row]:offsets[row + 1]].tobytes().decode()
+
+    def product(self, row):
+        p = SnapshotProduct()
+        p.id = int(self.cols["id"][row])
+        p.price = Decimal(int(self.cols["price_cents"][row])).scaleb(-2)
+        p.inventory_qty = int(self.cols["inventory_qty"][row])
+        p.category = self.categories[self.cols["category"][row]]
+        p.name = self._text("name", row)
+        p.slug = self._text("slug", row)
+        p.description = self._text("description", row)
+        p.image = SnapshotImage(self._text("image", row))
+        p.image_url = self._text("image_url", row)
+        return p
+
+    def products(self, category=None):
+        """Every product, newest first; optionally one category."""
+        if category is None:
+            return [self.product(row) for row in range(self.count)]
+        if category not in self.categories:
+            return []
+        rows = self._np.flatnonzero(self.cols["category"] == self.categories.index(category))
+        return [self.product(row) for row in rows.tolist()]
+
+    def row_for_id(self, product_id):
+        i = int(self._np.searchsorted(self._ids_asc, product_id))
+        if i < self.count and self._ids_asc[i] == product_id:
+            return self.count - 1 - i
+        return None
+
+    def by_slug(self, slug):
+        np = self._np
+        hashes = self.cols["slug_hash"]
+        h = np.uint64(slug_hash(slug))
+        i = int(np.searchsorted(hashes, h))
+        while i < self.count and hashes[i] == h:
+            row = int(self.cols["slug_row"][i])
+            if self._text("slug", row) == slug:
+                return self.product(row)
+            i += 1
+        return None
+
+    def by_ids(self, product_ids):
+        """Products in the given order, or None if any is missing."""
+        rows = [self.row_for_id(pk) for pk in product_ids]
+        if None in rows:
+            return None
+        return [self.product(row) for row in rows]
+
+
+class SnapshotReader:
+    """Per-process handle on the current snapshot file."""
+
+    def __init__(self):
+        self._snapshot = None
+        self._path = None
+        self._dirty_ns = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The mapped snapshot, or None when the ORM should answer."""
+        path = snapshot_path()
+        if not path:
+            return None
+        if path != self._path or time.monotonic() - self._checked_at >= CHECK_SECONDS:
+            self._refresh(path)
+        snapshot = self._snapshot
+        if snapshot is None or self._dirty_ns > snapshot.built_ns:
+            return None
+        return snapshot
+
+    def _refresh(self, path):
+        with self._lock:
+            self._path = path
+            self._checked_at = time.monotonic()
+            self._dirty_ns = _dirty_ns(path)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self._snapshot = None
+                return
+            old = self._snapshot
+            if old is not None and (st.st_ino, st.st_mtime_ns) == (old.stat.st_ino, old.stat.st_mtime_ns):
+                return
+            try:
+                # one reference swap; requests still holding the old
+                # snapshot keep its mapping until they drop it
+                self._snapshot = Snapshot(path)
+            except (OSError, ValueError, KeyError):
+                self._snapshot = None
+
+    def invalidate(self):
+        """Force a re-stat on the next current() call."""
+        self._checked_at = 0.0
+
+
+catalog_snapshot = SnapshotReader()
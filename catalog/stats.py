@@ -0,0 +1,10 @@
+# catalog/stats.py
+"""Small numeric helpers shared by the benchmark / load-test commands."""
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(k, len(sorted_values) - 1)]
@@ -0,0 +1,332 @@
+# catalog/tasks.py
+"""
+Lightweight background tasks with no external broker.
+
+Define a task:
+
+    @task(max_attempts=5)
+    def send_receipt(order_id): ...
+
+Queue it from a view (returns immediately):
+
+    enqueue(send_receipt, order.id, dedup_key=f"receipt:{order.id}")
+
+Tasks are rows in the Task table; `python manage.py run_tasks` claims due
+rows and runs them on a thread pool, renewing the claim (locked_at) every
+HEARTBEAT_SECONDS while they run. Failed tasks are retried with
+exponential backoff until max_attempts. With settings.TASKS_EAGER = True
+(used in tests) enqueue() still creates, deduplicates and schedules the
+row, then claims and runs it inline if it is due now.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# name -> TaskSpec
+registry = {}
+
+RETRY_BASE_SECONDS = 10
+# a RUNNING task whose claim hasn't been renewed by then is assumed dead
+STALE_AFTER = timedelta(minutes=15)
+# workers renew the claim on their running tasks this often
+HEARTBEAT_SECONDS = STALE_AFTER.total_seconds() / 5
+
+
+class TaskSpec:
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        return enqueue(self, *args, **kwargs)
+
+
+def task(func=None, *, name=None, max_attempts=3):
+    """Register a function as a task. Usable as @task or @task(...)."""
+
+    def register(fn):
+        spec = TaskSpec(fn, name or f"{fn.__module__}.{fn.__name__}", max_attempts)
+        registry[spec.name] = spec
+        return spec
+
+    return register(func) if func is not None else register
+
+
+def enqueue(func, *args, dedup_key=None, run_at=None, delay=None, **kwargs):
+    """
+    Queue `func(*args, **kwargs)` and return its Task row.
+
+    - dedup_key: if a queued task already has this key, that task is
+      returned instead of creating another one. A running one doesn't
+      count: it may have read its inputs before the change being queued.
+    - run_at / delay: schedule for later (datetime / timedelta or seconds).
+    Args must be JSON-serializable (pass ids, not model instances).
+    """
+    spec = func if isinstance(func, TaskSpec) else registry[func]
+
+    if delay is not None:
+        if not isinstance(delay, timedelta):
+            delay = timedelta(seconds=delay)
+        run_at = timezone.now() + delay
+
+    fields = {
+        "name": spec.name,
+        "args": list(args),
+        "kwargs": kwargs,
+        "dedup_key": dedup_key,
+        "max_attempts": spec.max_attempts,
+        "run_at": run_at or timezone.now(),
+    }
+    task_row, created = _create(fields)
+    if created and getattr(settings, "TASKS_EAGER", False) and task_row.run_at <= timezone.now():
+        # the worker's path, inline: claim the row, then run it
+        claimed = Task.objects.filter(pk=task_row.pk, status=Task.QUEUED).update(
+            status=Task.RUNNING, locked_by=worker_id(), locked_at=timezone.now()
+        )
+        if claimed:
+            task_row.refresh_from_db()
+            run_task(task_row)
+    return task_row
+
+
+def _create(fields):
+    """(task row, created): the new row, or the queued one with the same dedup_key."""
+    dedup_key = fields["dedup_key"]
+    if dedup_key:
+        existing = Task.objects.filter(dedup_key=dedup_key, status=Task.QUEUED).first()
+        if existing:
+            return existing, False
+        try:
+            with transaction.atomic():
+                return Task.objects.create(**fields), True
+        except IntegrityError:
+            # lost a race with another request queuing the same key
+            return Task.objects.get(dedup_key=dedup_key, status=Task.QUEUED), False
+    return Task.objects.create(**fields), True
+
+
+# =========================
+# WORKER
+# =========================
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_due(limit, worker):
+    """
+    Atomically mark up to `limit` due tasks as RUNNING for this worker.
+    Each claim is a conditional UPDATE, so two workers never get the same row.
+    """
+    now = timezone.now()
+    _reclaim_stale(now)
+
+    candidates = list(
+        Task.objects.filter(status=Task.QUEUED, run_at__lte=now)
+        .order_by("run_at", "id")
+        .values_list("pk", flat=True)[: limit * 2]
+    )
+    claimed = []
+    for pk in candidates:
+        if len(claimed) >= limit:
+            break
+        won = Task.objects.filter(pk=pk, status=Task.QUEUED).update(
+            status=Task.RUNNING, locked_by=worker, locked_at=now
+        )
+        if won:
+            claimed.append(pk)
+    return list(Task.objects.filter(pk__in=claimed))
+
+
+def _reclaim_stale(now):
+    """
+    Give tasks from crashed workers back to the queue. The crashed run
+    counts as an attempt, so a task that kills its worker every time
+    fails for good after max_attempts instead of being retried forever.
+    """
+    stale = Task.objects.filter(status=Task.RUNNING, locked_at__lt=now - STALE_AFTER)
+    released = {"locked_by": "", "locked_at": None, "attempts": F("attempts") + 1}
+    error = "Worker stopped renewing its claim (crashed or killed)."
+
+    stale.filter(attempts__gte=F("max_attempts") - 1).update(
+        status=Task.FAILED, finished_at=now, last_error=error, **released
+    )
+    for pk in stale.values_list("pk", flat=True):
+        requeue = Task.objects.filter(pk=pk, status=Task.RUNNING)
+        try:
+            with transaction.atomic():
+                requeue.update(status=Task.QUEUED, last_error=error, **released)
+        except IntegrityError:
+            # a newer copy queued under the same key does this work
+            requeue.update(status=Task.FAILED, finished_at=now, last_error=error, **released)
+
+
+def _save_outcome(task_row):
+    fields = [
+        "status", "attempts", "last_error", "run_at",
+        "finished_at", "locked_by", "locked_at",
+    ]
+    try:
+        with transaction.atomic():
+            task_row.save(update_fields=fields)
+    except IntegrityError:
+        # a retry would clash with a newer copy queued under the same key
+        # while this one ran; that copy does the work instead
+        task_row.status = Task.FAILED
+        task_row.finished_at = timezone.now()
+        task_row.save(update_fields=fields)
+
+
+def run_task(task_row):
+    """Execute one claimed task and record the outcome."""
+    spec = registry.get(task_row.name)
+    task_row.attempts += 1
+    try:
+        if spec is None:
+            raise LookupError(f"Unknown task {task_row.name!r}")
+        spec(*task_row.args, **task_row.kwargs)
+    except Exception:
+        task_row.last_error = traceback.format_exc()
+        if task_row.attempts >= task_row.max_attempts:
+            task_row.status = Task.FAILED
+            task_row.finished_at = timezone.now()
+            logger.error("Task %s (%s) failed for good", task_row.pk, task_row.name)
+        else:
+            task_row.status = Task.QUEUED
+            backoff = RETRY_BASE_SECONDS * 2 ** (task_row.attempts - 1)
+            task_row.run_at = timezone.now() + timedelta(seconds=backoff)
+    else:
+        task_row.status = Task.DONE
+        task_row.finished_at = timezone.now()
+        task_row.last_error = ""
+    finally:
+        task_row.locked_by = ""
+        task_row.locked_at = None
+        _save_outcome(task_row)
+    return task_row.status
+
+
+class Heartbeat(threading.Thread):
+    """
+    Renews locked_at on every task this worker is running, so one that
+    legitimately runs past STALE_AFTER isn't handed to another worker.
+    """
+
+    def __init__(self, worker, interval=None):
+        super().__init__(name="task-heartbeat", daemon=True)
+        self.worker = worker
+        self.interval = HEARTBEAT_SECONDS if interval is None else interval
+        self._stop_event = threading.Event()
+
+    def beat(self):
+        return Task.objects.filter(status=Task.RUNNING, locked_by=self.worker).update(
+            locked_at=timezone.now()
+        )
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.interval):
+                try:
+                    self.beat()
+                except DatabaseError:
+                    logger.exception("Task heartbeat for %s failed", self.worker)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _run_in_pool(task_row):
+    try:
+        return run_task(task_row)
+    finally:
+        # pool threads keep their own DB connection; don't let it go stale
+        close_old_connections()
+
+
+def run_worker(concurrency=4, poll_seconds=1.0, once=False):
+    """
+    Poll for due tasks and run them on a thread pool.
+    concurrency=1 runs tasks in the calling thread (no pool).
+    With once=True, drain what is due now and return the number run.
+    """
+    worker = worker_id()
+    pool = None
+    if concurrency > 1:
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="task")
+    heartbeat = Heartbeat(worker)
+    heartbeat.start()
+    ran = 0
+    try:
+        while True:
+            batch = claim_due(concurrency, worker)
+            if batch:
+                if pool is None:
+                    for task_row in batch:
+                        run_task(task_row)
+                else:
+                    list(pool.map(_run_in_pool, batch))
+                ran += len(batch)
+                continue
+            if once:
+                return ran
+            time.sleep(poll_seconds)
+    finally:
+        heartbeat.stop()
+        if pool is not None:
+            pool.shutdown()
+
+
+# =========================
+# TASKS
+# =========================
+
+MAX_IMAGE_SIDE = 1600
+
+
+@task(max_attempts=3)
+def optimize_product_image(product_id):
+    """
+    Shrink an uploaded product image to at most MAX_IMAGE_SIDE px per side.
+    Runs after product_create / product_edit so the upload request doesn't
+    pay for the resize.
+    """
+    from PIL import Image
+
+    from .models import Product
+
+    product = Product.objects.filter(pk=product_id).first()
+    if product is None or not product.image:
+        return
+
+    with product.image.open("rb") as fh:
+        image = Image.open(fh)
+        image.load()
+
+    if max(image.size) <= MAX_IMAGE_SIDE:
+        return
+
+    fmt = image.format or "JPEG"
+    image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    with product.image.storage.open(product.image.name, "wb") as out:
+        image.save(out, format=fmt)
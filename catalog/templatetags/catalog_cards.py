@@ -0,0 +1,35 @@
+# catalog/templatetags/catalog_cards.py
+"""
+{% product_cards products %} / {% event_cards events %}: the card grids of
+product_list.html and event_list.html.
+
+With settings.FAST_CARD_RENDERING (the default) they use the compiled
+renderers in catalog/cards.py; otherwise they render the equivalent
+template loops in catalog/_product_cards.html and events/_event_cards.html.
+"""
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from catalog.cards import render_event_cards, render_product_cards
+
+register = template.Library()
+
+
+def _reference(context, template_name, **values):
+    with context.push(**values):
+        return context.template.engine.get_template(template_name).render(context)
+
+
+@register.simple_tag(takes_context=True)
+def product_cards(context, products):
+    if not getattr(settings, "FAST_CARD_RENDERING", True):
+        return _reference(context, "catalog/_product_cards.html", products=products)
+    return mark_safe(render_product_cards(products, context))
+
+
+@register.simple_tag(takes_context=True)
+def event_cards(context, events):
+    if not getattr(settings, "FAST_CARD_RENDERING", True):
+        return _reference(context, "events/_event_cards.html", events=events)
+    return mark_safe(render_event_cards(events, context))
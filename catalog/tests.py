@@ -1,3 +1,1715 @@
-from django.test import TestCase
+﻿import asyncio
+import io
+import json
+import re
+import tempfile
+import uuid
+from unittest import mock
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.template import RequestContext, Template
+from django.test import Client, LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    admission, api, archive, attendees, cards, ics, loadgen, pagecache, related, rollups, sitemaps,
+    snapshot, tasks, views, waitlist,
+)
+from .autocomplete import PrefixIndex, product_index
+from .bookings import book_series, find_conflicts
+from .counters import CounterBuffer, _apply_batch, product_counters
+from .forms import RoomBookingSeriesForm
+from .tasks import enqueue, run_worker, task
+from .models import (
+    Product,
+    Event,
+    EventRegistration,
+    EventWaitlistEntry,
+    Room,
+    RoomBooking,
+    RoomBookingSeries,
+    RoomUsageRollup,
+    Task,
+    RelatedProduct,
+    ArchivedEvent,
+    ArchivedEventRegistration,
+    ArchivedRoomBooking,
+)
+
+
+CSRF_INPUT_RE = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]+"')
+
+
+def strip_csrf(html):
+    """CSRF tokens are re-masked on every render; blank them for comparisons."""
+    return CSRF_INPUT_RE.sub(b'name="csrfmiddlewaretoken" value=""', html)
+
+
+def clear_caches():
+    """Empty the page cache and the admission cache."""
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+def app_queries(ctx):
+    """
+    Captured queries minus the ones the database cache backend made (its
+    reads and writes, and the savepoints cache.add() wraps them in).
+    """
+    tables = [f'"{c["LOCATION"]}"' for c in settings.CACHES.values()]
+    return [
+        q for q in ctx.captured_queries
+        if not any(t in q["sql"] for t in tables) and "SAVEPOINT" not in q["sql"]
+    ]
+
+
+class AsyncCatalogViewsTests(TestCase):
+    """ASGI requests use the async catalog views and render the same pages."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(name="Catan", slug="catan", price="49.99", category="Board")
+        cls.event = Event.objects.create(title="Magic Night", slug="magic-night", capacity=8)
+        cls.user = get_user_model().objects.create_user("ana", password="pw")
+        EventRegistration.objects.create(event=cls.event, user=cls.user)
+
+    async def test_asgi_requests_hit_async_views(self):
+        for path in ("/", "/?q=cat", "/product/catan/", "/events/", "/events/magic-night/"):
+            resp = await self.async_client.get(path)
+            self.assertEqual(resp.status_code, 200, path)
+            self.assertTrue(resp.resolver_match.func.__name__.endswith("_async"), path)
+
+    async def test_async_missing_slug_404s(self):
+        resp = await self.async_client.get("/product/nope/")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_sync_and_async_html_identical(self):
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        for path in ("/product/catan/", "/events/", "/events/magic-night/"):
+            sync_html = strip_csrf(self.client.get(path).content)
+            async_html = strip_csrf(async_to_sync(self.async_client.get)(path).content)
+            self.assertEqual(sync_html, async_html, path)
+
+
+class EventAdminTests(TestCase):
+    """Event changelist annotates counts; attendees are streamed, not inlined."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser("boss", "boss@example.com", "pw")
+        cls.event = Event.objects.create(title="Draft Night", slug="draft-night", capacity=4)
+        for i in range(3):
+            user = User.objects.create_user(f"player{i}", f"p{i}@example.com", "pw")
+            EventRegistration.objects.create(event=cls.event, user=user)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_shows_counts(self):
+        resp = self.client.get("/admin/catalog/event/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["cl"].result_list[0].num_registrations, 3)
+
+    def test_attendee_csv_is_streamed(self):
+        resp = self.client.get(f"/admin/catalog/event/{self.event.pk}/attendees/")
+        self.assertTrue(resp.streaming)
+        lines = b"".join(resp.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "username,email,registered_at")
+        self.assertEqual(len(lines), 4)
+
+    def test_room_booking_admin_registered(self):
+        self.assertEqual(self.client.get("/admin/catalog/roombooking/").status_code, 200)
+
+
+class HotQueryIndexTests(TestCase):
+    """Every hot query in catalog.views is answered from an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("idx", password="pw")
+        cls.room = Room.objects.create(name="Small", slug="small")
+        cls.event = Event.objects.create(title="Event", slug="event")
+
+    def query_plan(self, qs):
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, qs):
+        plan = self.query_plan(qs)
+        for step in plan:
+            self.assertNotIn("TEMP B-TREE", step, plan)
+            if step.startswith("SCAN"):
+                self.assertIn("INDEX", step, plan)
+        self.assertTrue(any("INDEX" in step for step in plan), plan)
+
+    def product_list_queryset(self, query=""):
+        request = RequestFactory().get("/products/" + query)
+        return views._product_list_queryset(request)[0]
+
+    def test_product_list_category_filter(self):
+        self.assertUsesIndex(self.product_list_queryset("?category=Board"))
+
+    def test_product_list_popular_sort(self):
+        self.assertUsesIndex(self.product_list_queryset("?sort=popular"))
+
+    def test_product_list_search_is_not_sorted_again(self):
+        # name__icontains is a LIKE '%...%' that no index can answer, but
+        # the newest-first order still comes straight off the rowid.
+        plan = self.query_plan(self.product_list_queryset("?q=cat"))
+        self.assertFalse(any("TEMP B-TREE" in step for step in plan), plan)
+
+    def test_event_list_ordering(self):
+        self.assertUsesIndex(views._event_list_queryset())
+
+    def test_event_registration_lookups(self):
+        self.assertUsesIndex(EventRegistration.objects.filter(user=self.user))
+        self.assertUsesIndex(
+            EventRegistration.objects.filter(event=self.event, user=self.user)
+        )
+        self.assertUsesIndex(EventRegistration.objects.filter(event=self.event))
+        self.assertUsesIndex(
+            EventRegistration.objects.filter(event=self.event).order_by("registered_at")
+        )
+
+    def test_room_booking_calendar_and_overlap(self):
+        now = timezone.now()
+        self.assertUsesIndex(RoomBooking.objects.order_by("start_time"))
+        self.assertUsesIndex(
+            RoomBooking.objects.filter(
+                room=self.room, start_time__lt=now, end_time__gt=now
+            )
+        )
+
+
+class CalendarFeedTests(TestCase):
+    """.ics feeds stream VEVENTs and answer 304 when nothing changed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("gm", password="pw")
+        cls.room = Room.objects.create(name="Large TTRPG", slug="large-ttrpg")
+        start = timezone.now() + timedelta(days=1)
+        RoomBooking.objects.create(
+            room=cls.room, user=cls.user, start_time=start, end_time=start + timedelta(hours=3)
+        )
+        cls.event = Event.objects.create(title="Pauper Cube; Round 1", slug="cube")
+        EventRegistration.objects.create(event=cls.event, user=cls.user)
+
+    def get_feed(self, url, **headers):
+        resp = self.client.get(url, headers=headers)
+        body = b"".join(resp.streaming_content).decode() if resp.status_code == 200 else ""
+        return resp, body
+
+    def test_events_feed(self):
+        resp, body = self.get_feed(reverse("events_calendar_feed"))
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertIn("SUMMARY:Pauper Cube\\; Round 1\r\n", body)
+        self.assertTrue(resp["ETag"])
+
+    def test_room_feed_304_until_changed(self):
+        url = reverse("room_calendar_feed", args=[self.room.slug])
+        resp, body = self.get_feed(url)
+        self.assertEqual(body.count("BEGIN:VEVENT"), 1)
+        etag = resp["ETag"]
+
+        resp, _ = self.get_feed(url, if_none_match=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        RoomBooking.objects.all().delete()
+        resp, body = self.get_feed(url, if_none_match=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("BEGIN:VEVENT", body)
+
+    def test_user_feed_requires_valid_token(self):
+        url = reverse("user_calendar_feed", args=[views.calendar_token(self.user)])
+        _, body = self.get_feed(url)
+        self.assertEqual(body.count("BEGIN:VEVENT"), 2)
+        resp = self.client.get(reverse("user_calendar_feed", args=["bogus"]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_room_feed_etag_follows_room_name(self):
+        url = reverse("room_calendar_feed", args=[self.room.slug])
+        resp, _ = self.get_feed(url)
+        Room.objects.filter(pk=self.room.pk).update(name="Big TTRPG")
+        resp, body = self.get_feed(url, if_none_match=resp["ETag"])
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("SUMMARY:Big TTRPG booking\r\n", body)
+
+    def test_user_feed_etag_follows_room_name(self):
+        url = reverse("user_calendar_feed", args=[views.calendar_token(self.user)])
+        resp, _ = self.get_feed(url)
+        Room.objects.filter(pk=self.room.pk).update(name="Big TTRPG")
+        resp, body = self.get_feed(url, if_none_match=resp["ETag"])
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("SUMMARY:Big TTRPG booking\r\n", body)
+
+    def test_reset_revokes_old_feed_link(self):
+        old_url = reverse("user_calendar_feed", args=[views.calendar_token(self.user)])
+        self.client.force_login(self.user)
+        resp = self.client.post(reverse("reset_calendar_token"))
+        self.assertRedirects(resp, reverse("room_booking_list"))
+        self.client.logout()
+
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        new_url = reverse("user_calendar_feed", args=[views.calendar_token(self.user)])
+        self.assertNotEqual(new_url, old_url)
+        _, body = self.get_feed(new_url)
+        self.assertEqual(body.count("BEGIN:VEVENT"), 2)
+
+    def test_long_lines_are_folded(self):
+        line = ics.fold("DESCRIPTION:" + "é" * 80)
+        for part in line.split("\r\n"):
+            self.assertLessEqual(len(part.encode()), 75)
+
+
+class RecurringBookingTests(TestCase):
+    """Series are conflict-checked with one range query and bulk inserted."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("dm", password="pw")
+        cls.room = Room.objects.create(name="Small TTRPG", slug="small-ttrpg")
+        cls.start = (timezone.now() + timedelta(days=1)).replace(microsecond=0)
+
+    def make_series(self, **kwargs):
+        fields = {
+            "room": self.room,
+            "user": self.user,
+            "start_time": self.start,
+            "end_time": self.start + timedelta(hours=4),
+            "occurrences": 52,
+        }
+        fields.update(kwargs)
+        return RoomBookingSeries(**fields)
+
+    def test_find_conflicts_half_open(self):
+        slots = [(1, 3), (5, 7), (9, 11)]
+        busy = [(3, 5), (6, 8), (0, 1)]
+        self.assertEqual(find_conflicts(slots, busy), [1])
+        self.assertEqual(find_conflicts(slots, [(0, 20)]), [0, 1, 2])
+
+    def test_52_week_series_books_in_one_insert(self):
+        with CaptureQueriesContext(connection) as ctx:
+            created, conflicts = book_series(self.make_series())
+        booking_sql = [
+            q["sql"] for q in ctx.captured_queries if '"catalog_roombooking"' in q["sql"]
+        ]
+        self.assertEqual(len(booking_sql), 2)  # one range SELECT, one INSERT
+        self.assertEqual(conflicts, [])
+        self.assertEqual(len(created), 52)
+        self.assertEqual(RoomBooking.objects.filter(series__isnull=False).count(), 52)
+
+    def test_exceptions_and_until(self):
+        skip = (self.start + timedelta(weeks=1)).date().isoformat()
+        series = self.make_series(
+            occurrences=None,
+            until=(self.start + timedelta(weeks=3)).date(),
+            exceptions=[skip],
+        )
+        self.assertEqual(len(list(series.occurrence_times())), 3)
+
+    def test_skipped_dates_do_not_use_up_occurrences(self):
+        skip = (self.start + timedelta(weeks=1)).date().isoformat()
+        series = self.make_series(occurrences=3, exceptions=[skip])
+        starts = [start for start, _ in series.occurrence_times()]
+        self.assertEqual(len(starts), 3)
+        self.assertNotIn(skip, [timezone.localtime(s).date().isoformat() for s in starts])
+        self.assertFalse(series.is_truncated())
+
+    def test_until_past_the_session_limit_is_rejected(self):
+        start = timezone.localtime(self.start)
+        data = {
+            "room": self.room.pk,
+            "start_time": start.strftime("%Y-%m-%dT%H:%M"),
+            "end_time": (start + timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M"),
+            "interval_weeks": 1,
+            "until": (start + timedelta(weeks=RoomBookingSeries.MAX_OCCURRENCES)).date(),
+        }
+        form = RoomBookingSeriesForm(data)
+        self.assertFalse(form.is_valid())
+        self.assertIn("until", form.errors)
+
+        # one skipped date brings it back under the limit
+        data["skip_dates"] = (start + timedelta(weeks=5)).date().isoformat()
+        form = RoomBookingSeriesForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(
+            len(list(form.save(commit=False).occurrence_times())),
+            RoomBookingSeries.MAX_OCCURRENCES,
+        )
+
+    def test_conflict_books_nothing(self):
+        clash = self.start + timedelta(weeks=10, hours=1)
+        RoomBooking.objects.create(
+            room=self.room, user=self.user, start_time=clash, end_time=clash + timedelta(hours=1)
+        )
+        created, conflicts = book_series(self.make_series())
+        self.assertEqual(created, [])
+        self.assertEqual(len(conflicts), 1)
+        self.assertFalse(RoomBookingSeries.objects.exists())
+        self.assertEqual(RoomBooking.objects.count(), 1)
+
+    def test_series_form_view(self):
+        self.client.force_login(self.user)
+        start = timezone.localtime(self.start)
+        resp = self.client.post(reverse("room_booking_list"), {
+            "kind": "series",
+            "series-room": self.room.pk,
+            "series-start_time": start.strftime("%Y-%m-%dT%H:%M"),
+            "series-end_time": (start + timedelta(hours=3)).strftime("%Y-%m-%dT%H:%M"),
+            "series-interval_weeks": 1,
+            "series-occurrences": 4,
+            "series-skip_dates": (start + timedelta(weeks=2)).date().isoformat(),
+        })
+        self.assertRedirects(resp, reverse("room_booking_list"))
+        # the skipped date doesn't count, so all 4 sessions are booked
+        self.assertEqual(RoomBooking.objects.filter(series__user=self.user).count(), 4)
+
+
+class RoomUsageRollupTests(TestCase):
+    """Rollups follow booking create/cancel and match the NumPy backfill."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("owner", password="pw")
+        cls.room = Room.objects.create(name="TV Lounge", slug="tv-lounge")
+        cls.base = datetime(2030, 3, 4, 18, 30, tzinfo=dt_timezone.utc)
+
+    def book(self, start, hours, fee="0"):
+        return RoomBooking.objects.create(
+            room=self.room,
+            user=self.user,
+            start_time=start,
+            end_time=start + timedelta(hours=hours),
+            fee_charged=Decimal(fee),
+        )
+
+    def snapshot(self):
+        return sorted(
+            RoomUsageRollup.objects.values_list("room_id", "hour", "occupied_seconds", "revenue")
+        )
+
+    def test_create_and_cancel_update_rollups(self):
+        booking = self.book(self.base, 2, fee="15.00")  # 18:30 -> 20:30
+        self.assertEqual(
+            [(r[1].hour, r[2]) for r in self.snapshot()],
+            [(18, 1800), (19, 3600), (20, 1800)],
+        )
+        self.assertEqual(self.snapshot()[0][3], Decimal("15.00"))
+
+        booking.delete()
+        self.assertEqual(self.snapshot(), [])
+
+    def test_backfill_matches_incremental(self):
+        self.book(self.base, 2, fee="15.00")
+        self.book(self.base + timedelta(hours=3), 1.25, fee="5.50")
+        self.book(self.base + timedelta(days=1, minutes=10), 0.5)
+        incremental = self.snapshot()
+
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_report_and_csv_are_staff_only(self):
+        self.book(timezone.now() - timedelta(days=2), 3, fee="20.00")
+        url = reverse("room_utilization_report")
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        staff = get_user_model().objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["by_room"][0]["revenue"], Decimal("20.00"))
+
+        csv_resp = self.client.get(reverse("room_utilization_csv"))
+        self.assertIn(b"by_room,TV Lounge,3.0", csv_resp.content)
+
+
+@override_settings(PRODUCT_COUNTER_FLUSH_SECONDS=0)
+class ProductCounterTests(TestCase):
+    """View / add-to-cart counts are buffered and flushed in batched UPDATEs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.a = Product.objects.create(name="Azul", slug="azul", price="39.00")
+        cls.b = Product.objects.create(name="Brass", slug="brass", price="99.00")
+        cls.c = Product.objects.create(name="Cascadia", slug="cascadia", price="45.00")
+
+    def setUp(self):
+        product_counters.clear()
+        self.addCleanup(product_counters.clear)
+
+    def test_views_buffer_without_writing(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("product_detail", args=["azul"]))
+        self.assertFalse(any(q["sql"].startswith("UPDATE") for q in ctx.captured_queries))
+        self.client.post(reverse("cart_add", args=[self.a.pk]))
+        self.assertEqual(
+            product_counters.pending()[self.a.pk], {"view_count": 1, "cart_add_count": 1}
+        )
+
+    def test_flush_groups_equal_increments(self):
+        buffer = CounterBuffer(flush_seconds=0)
+        for product in (self.a, self.b):
+            buffer.view(product.pk)
+        buffer.view(self.c.pk)
+        buffer.view(self.c.pk)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(buffer.flush(), 3)
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)  # (a, b) +1 together, c +2
+        self.assertEqual(
+            list(Product.objects.order_by("slug").values_list("view_count", flat=True)),
+            [1, 1, 2],
+        )
+
+    def test_saving_a_stale_instance_keeps_flushed_counts(self):
+        stale = Product.objects.get(pk=self.a.pk)
+        buffer = CounterBuffer(flush_seconds=0)
+        buffer.view(self.a.pk)
+        buffer.cart_add(self.a.pk)
+        buffer.flush()
+
+        stale.inventory_qty = 7
+        stale.save()
+        # the edit form and the admin save the same way
+        staff = get_user_model().objects.create_user("staff", password="pw", is_staff=True, is_superuser=True)
+        self.client.force_login(staff)
+        self.client.post(
+            reverse("product_edit", args=["azul"]),
+            {"name": "Azul", "slug": "azul", "price": "39.00", "inventory_qty": 8},
+        )
+        fresh = Product.objects.get(pk=self.a.pk)
+        self.assertEqual((fresh.view_count, fresh.cart_add_count, fresh.inventory_qty), (1, 1, 8))
+
+    def test_saving_a_deleted_product_inserts_it_again(self):
+        stale = Product.objects.get(pk=self.a.pk)
+        Product.objects.filter(pk=self.a.pk).delete()
+        stale.inventory_qty = 3
+        stale.save()
+        self.assertEqual(Product.objects.get(pk=self.a.pk).inventory_qty, 3)
+
+    def test_explicit_update_fields_none_is_a_full_save(self):
+        stale = Product.objects.get(pk=self.a.pk)
+        Product.objects.filter(pk=self.a.pk).update(view_count=5)
+        stale.save(update_fields=None)
+        self.assertEqual(Product.objects.get(pk=self.a.pk).view_count, 0)
+
+    def test_retried_flush_is_not_applied_twice(self):
+        flush_id = uuid.uuid4()
+        batch = {self.a.pk: {"view_count": 3, "cart_add_count": 1}}
+        _apply_batch(flush_id, batch)
+        _apply_batch(flush_id, batch)
+        self.a.refresh_from_db()
+        self.assertEqual((self.a.view_count, self.a.cart_add_count), (3, 1))
+
+    def test_popular_sort(self):
+        Product.objects.filter(pk=self.b.pk).update(cart_add_count=5)
+        Product.objects.filter(pk=self.c.pk).update(view_count=50)
+        resp = self.client.get(reverse("product_list") + "?sort=popular")
+        self.assertEqual([p.slug for p in resp.context["products"]], ["brass", "cascadia", "azul"])
+
+
+TASK_CALLS = []
+
+
+@task(name="tests.record", max_attempts=2)
+def record_task(value):
+    TASK_CALLS.append(value)
+    if value == "boom":
+        raise ValueError("boom")
+
+
+class TaskRunnerTests(TestCase):
+    """Tasks are queued as rows, deduplicated, scheduled and retried."""
+
+    def setUp(self):
+        TASK_CALLS.clear()
+
+    def test_enqueue_dedup_and_run(self):
+        first = enqueue(record_task, "a", dedup_key="k")
+        second = enqueue(record_task, "a", dedup_key="k")
+        self.assertEqual(first.pk, second.pk)
+        later = enqueue(record_task, "later", delay=3600)
+
+        self.assertEqual(run_worker(concurrency=1, once=True), 1)
+        self.assertEqual(TASK_CALLS, ["a"])
+        first.refresh_from_db()
+        later.refresh_from_db()
+        self.assertEqual(first.status, Task.DONE)
+        self.assertEqual(later.status, Task.QUEUED)
+
+        # a finished task frees its dedup key
+        self.assertNotEqual(enqueue(record_task, "a", dedup_key="k").pk, first.pk)
+
+    def test_failures_retry_then_fail(self):
+        row = enqueue(record_task, "boom")
+        run_worker(concurrency=1, once=True)
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (Task.QUEUED, 1))
+        self.assertGreater(row.run_at, timezone.now())
+
+        Task.objects.filter(pk=row.pk).update(run_at=timezone.now())
+        with self.assertLogs("catalog.tasks", "ERROR") as logs:
+            run_worker(concurrency=1, once=True)
+        self.assertIn("failed for good", logs.output[0])
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), (Task.FAILED, 2))
+        self.assertIn("ValueError", row.last_error)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        row = enqueue(record_task, "now", dedup_key="k")
+        self.assertEqual(TASK_CALLS, ["now"])
+        self.assertEqual((row.status, row.attempts), (Task.DONE, 1))
+
+        # scheduling and dedup keys behave as they do with a worker
+        later = enqueue(record_task, "later", dedup_key="later", delay=3600)
+        self.assertEqual(enqueue(record_task, "again", dedup_key="later").pk, later.pk)
+        self.assertEqual(TASK_CALLS, ["now"])
+        self.assertEqual(Task.objects.get(pk=later.pk).status, Task.QUEUED)
+
+    def test_heartbeat_keeps_long_tasks_claimed(self):
+        mine = enqueue(record_task, "long")
+        dead = enqueue(record_task, "orphan")
+        long_ago = timezone.now() - tasks.STALE_AFTER - timedelta(minutes=1)
+        Task.objects.filter(pk=mine.pk).update(status=Task.RUNNING, locked_by="me", locked_at=long_ago)
+        Task.objects.filter(pk=dead.pk).update(status=Task.RUNNING, locked_by="gone", locked_at=long_ago)
+
+        self.assertEqual(tasks.Heartbeat("me").beat(), 1)
+        tasks.claim_due(10, "other")
+        self.assertEqual(Task.objects.get(pk=mine.pk).locked_by, "me")
+        # the crashed worker's task was taken over
+        self.assertEqual(Task.objects.get(pk=dead.pk).locked_by, "other")
+
+    def test_work_queued_during_a_run_is_kept(self):
+        first = enqueue(record_task, "boom", dedup_key="img")
+        Task.objects.filter(pk=first.pk).update(status=Task.RUNNING, locked_by="me")
+        second = enqueue(record_task, "a", dedup_key="img")
+        self.assertNotEqual(second.pk, first.pk)
+
+        # the running copy fails; its retry would duplicate the queued one
+        tasks.run_task(Task.objects.get(pk=first.pk))
+        self.assertEqual(Task.objects.get(pk=first.pk).status, Task.FAILED)
+        self.assertEqual(Task.objects.get(pk=second.pk).status, Task.QUEUED)
+
+    def test_reclaimed_crashes_count_as_attempts(self):
+        row = enqueue(record_task, "crash")
+        long_ago = timezone.now() - tasks.STALE_AFTER - timedelta(minutes=1)
+        for attempts, status in ((1, Task.QUEUED), (2, Task.FAILED)):
+            Task.objects.filter(pk=row.pk).update(
+                status=Task.RUNNING, locked_by="gone", locked_at=long_ago
+            )
+            tasks.claim_due(0, "other")
+            row.refresh_from_db()
+            self.assertEqual((row.attempts, row.status), (attempts, status))
+
+    @override_settings(TASKS_EAGER=True)
+    def test_product_upload_queues_image_resize(self):
+        from PIL import Image
+
+        staff = get_user_model().objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        buf = io.BytesIO()
+        Image.new("RGB", (2400, 1200), "red").save(buf, format="PNG")
+        upload = SimpleUploadedFile("big.png", buf.getvalue(), content_type="image/png")
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            self.client.post(reverse("product_create"), {
+                "name": "Big Box", "slug": "big-box", "price": "10.00",
+                "inventory_qty": 1, "image": upload,
+            })
+            product = Product.objects.get(slug="big-box")
+            with product.image.open("rb") as fh:
+                self.assertEqual(Image.open(fh).size, (1600, 800))
+
+
+class RelatedProductsTests(TestCase):
+    """TF-IDF neighbours are precomputed and shown with one query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        def make(slug, name, category, description=""):
+            return Product.objects.create(
+                name=name, slug=slug, price="10.00", category=category, description=description
+            )
+
+        cls.catan = make("catan", "Catan", "Board", "Trade and build settlements on an island")
+        cls.seafarers = make("seafarers", "Catan Seafarers", "Board", "Expansion: sail to new islands")
+        cls.dice = make("dice", "Metal Dice Set", "Accessories", "Seven polyhedral dice for RPGs")
+        cls.sleeves = make("sleeves", "Card Sleeves", "Accessories", "Protect your trading cards")
+
+    def test_full_rebuild_links_similar_products(self):
+        related.rebuild(full=True)
+        self.assertEqual(
+            RelatedProduct.objects.filter(product=self.catan).first().related, self.seafarers
+        )
+        self.assertEqual(
+            RelatedProduct.objects.filter(product=self.dice).first().related, self.sleeves
+        )
+
+    def test_incremental_rebuild_merges_new_product(self):
+        related.rebuild(full=True)
+        cities = Product.objects.create(
+            name="Catan Cities and Knights", slug="cities", price="50.00", category="Board"
+        )
+        related.rebuild()
+        self.assertTrue(RelatedProduct.objects.filter(product=cities).exists())
+        self.assertIn(
+            cities.pk,
+            RelatedProduct.objects.filter(product=self.catan).values_list("related_id", flat=True),
+        )
+
+    def test_delete_refills_lists_that_pointed_at_it(self):
+        Product.objects.create(name="Ticket to Ride", slug="ticket", price="40.00", category="Board")
+        Product.objects.create(
+            name="Forbidden Island", slug="island", price="20.00", category="Co-op",
+            description="Rescue treasures from a sinking island",
+        )
+        related.rebuild(full=True, k=2)
+        catan_list = RelatedProduct.objects.filter(product=self.catan)
+        self.assertEqual(catan_list.first().related, self.seafarers)
+
+        self.seafarers.delete()
+        self.assertEqual(catan_list.count(), 1)
+        # the list that pointed at it is queued for a refill
+        self.assertTrue(Task.objects.filter(dedup_key="related-products").exists())
+        related.rebuild(k=2)
+        self.assertEqual(set(catan_list.values_list("related__slug", flat=True)), {"ticket", "island"})
+
+    def test_only_text_edits_queue_a_refresh(self):
+        Task.objects.all().delete()
+        self.dice.inventory_qty = 12
+        self.dice.save()
+        self.assertFalse(Task.objects.exists())
+        self.dice.description = "Twenty-sided dice"
+        self.dice.save()
+        self.assertTrue(Task.objects.filter(dedup_key="related-products").exists())
+
+    def test_old_lists_force_a_full_rebuild(self):
+        related.rebuild(full=True)
+        self.assertEqual(related.rebuild(), 0)
+        RelatedProduct.objects.update(computed_at=timezone.now() - timedelta(days=2))
+        # IDF weights may have drifted: every product is rescored
+        self.assertEqual(related.rebuild(), 4)
+
+    def test_matches_brute_force_cosine(self):
+        index = related.TfidfIndex.build(
+            Product.objects.order_by("pk").values_list("pk", "name", "category", "description")
+        )
+        rows = np.arange(len(index.ids))
+        dense = np.zeros((len(rows), int(index.indices.max()) + 1))
+        for r in rows:
+            cols = slice(index.indptr[r], index.indptr[r + 1])
+            dense[r, index.indices[cols]] = index.data[cols]
+        np.testing.assert_allclose(index.similarities(rows), dense @ dense.T)
+
+    def test_detail_page_reads_related_in_one_query(self):
+        related.rebuild(full=True)
+        url = reverse("product_detail", args=["catan"])
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        related_sql = [q for q in ctx.captured_queries if "catalog_relatedproduct" in q["sql"]]
+        self.assertEqual(len(related_sql), 1)
+        self.assertContains(resp, "Catan Seafarers")
+
+
+class AutocompleteTests(TestCase):
+    """Search suggestions come from the in-memory prefix index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for slug, name, category in (
+            ("catan", "Catan", "Board Games"),
+            ("seafarers", "Catan: Seafarers", "Board Games"),
+            ("ticket", "Ticket to Ride", "Board Games"),
+            ("sleeves", "Card Sleeves", "Accessories"),
+            ("pokemon", "Pokémon Booster", "Cards"),
+        ):
+            Product.objects.create(name=name, slug=slug, price="10.00", category=category)
+
+    def setUp(self):
+        product_index.build()
+
+    def names(self, query, index=product_index):
+        by_id = dict(Product.objects.values_list("pk", "name"))
+        return [by_id[pk] for pk in index.product_ids(query)]
+
+    def test_sync_catches_delete_plus_add_elsewhere(self):
+        index = PrefixIndex()
+        index.build()
+        # another process: same product count, different products
+        Product.objects.filter(slug="ticket").delete()
+        azul = Product.objects.create(name="Azul", slug="azul", price="10.00")
+        self.assertEqual(index.product_ids("azul"), [])
+
+        index.sync()
+        self.assertEqual(index.product_ids("ticket"), [])
+        self.assertEqual(index.product_ids("azul"), [azul.pk])
+
+    def test_periodic_check_runs_off_the_request(self):
+        index = PrefixIndex()
+        index.build()
+        index._checked_at = 0.0
+        with mock.patch("catalog.autocomplete.threading.Thread") as thread:
+            with self.assertNumQueries(0):
+                index.ensure_fresh()
+        thread.assert_called_once()
+
+    def test_prefix_and_word_start_matches(self):
+        self.assertEqual(self.names("cat"), ["Catan", "Catan: Seafarers"])
+        self.assertEqual(self.names("ride"), ["Ticket to Ride"])
+        self.assertEqual(self.names("SEA"), ["Catan: Seafarers"])
+        self.assertEqual(self.names("pokemon"), ["Pokémon Booster"])
+        self.assertEqual(self.names("zzz"), [])
+
+    def test_signals_keep_index_current(self):
+        product = Product.objects.create(name="Carcassonne", slug="carcassonne", price="35.00")
+        self.assertEqual(self.names("carc"), ["Carcassonne"])
+        product.name = "Azul"
+        product.save()
+        self.assertEqual(self.names("carc"), [])
+        self.assertEqual(self.names("az"), ["Azul"])
+        product.delete()
+        self.assertEqual(self.names("az"), [])
+
+    def test_categories(self):
+        self.assertEqual(product_index.categories("board"), ["Board Games"])
+        self.assertEqual(product_index.categories("c"), ["Cards"])
+
+    def test_saves_are_merged_in_one_batch(self):
+        before = product_index._snapshot
+        products = [
+            Product.objects.create(name=f"Gloomhaven {i}", slug=f"gloom-{i}", price="1.00", category="RPG")
+            for i in range(3)
+        ]
+        # recorded only: no copy of the index per save
+        self.assertIs(product_index._snapshot, before)
+        with mock.patch.object(product_index, "_merge", wraps=product_index._merge) as merge:
+            self.assertEqual(len(self.names("gloom")), 3)
+            self.assertEqual(product_index.categories("rp"), ["RPG"])
+        merge.assert_called_once()
+        products[0].delete()
+        self.assertEqual(len(self.names("gloom")), 2)
+
+    def test_build_keeps_changes_recorded_while_reading(self):
+        index = PrefixIndex()
+        index.build()
+        catan = Product.objects.get(slug="catan")
+        catan.name = "Brass"
+        read_state = index._catalog_state
+
+        def save_during_build():
+            # a save lands between the build's start and its swap
+            index.update(catan)
+            return read_state()
+
+        with mock.patch.object(index, "_catalog_state", save_during_build):
+            index.build()
+        self.assertEqual(index.product_ids("brass"), [catan.pk])
+        self.assertNotIn(catan.pk, index.product_ids("catan"))
+
+    def test_unbuilt_index_ignores_updates(self):
+        index = PrefixIndex()
+        index.update(Product.objects.first())
+        self.assertEqual(len(index), 0)
+
+    def test_suggest_endpoint(self):
+        resp = self.client.get(reverse("search_suggest"), {"q": "card"})
+        self.assertEqual(resp["Cache-Control"], "public, max-age=60")
+        data = resp.json()
+        self.assertEqual(
+            data["products"], [{"name": "Card Sleeves", "url": reverse("product_detail", args=["sleeves"])}]
+        )
+        self.assertEqual([c["name"] for c in data["categories"]], ["Cards"])
+        resp = self.client.get(data["categories"][0]["url"])
+        self.assertContains(resp, "Pokémon Booster")
+        self.assertNotContains(resp, "Card Sleeves")
+
+    def test_suggest_endpoint_queries(self):
+        with self.assertNumQueries(1):
+            self.client.get(reverse("search_suggest"), {"q": "cat"})
+        with self.assertNumQueries(0):
+            self.client.get(reverse("search_suggest"), {"q": ""})
+
+
+class ArchiveTests(TestCase):
+    """Past events and old bookings move to the archive tables in batches."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("ana", password="pw")
+        today = timezone.localdate()
+        cls.old_event = Event.objects.create(
+            title="Old Draft", slug="old-draft", date=today - timedelta(days=30)
+        )
+        cls.new_event = Event.objects.create(title="Next Draft", slug="next-draft", date=today)
+        EventRegistration.objects.create(event=cls.old_event, user=cls.user)
+        EventRegistration.objects.create(event=cls.new_event, user=cls.user)
+
+        cls.room = Room.objects.create(name="Large", slug="large")
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+        cls.old_bookings = [
+            RoomBooking.objects.create(
+                room=cls.room, user=cls.user, fee_charged="10.00",
+                start_time=start - timedelta(days=200 + i),
+                end_time=start - timedelta(days=200 + i) + timedelta(hours=2),
+            )
+            for i in range(3)
+        ]
+        cls.recent = RoomBooking.objects.create(
+            room=cls.room, user=cls.user,
+            start_time=start - timedelta(days=1), end_time=start - timedelta(days=1, hours=-1),
+        )
+
+    def test_events_move_with_registrations(self):
+        self.assertEqual(archive.archive_events(days=7, batch_size=1), (1, 1))
+        self.assertEqual(list(Event.objects.values_list("slug", flat=True)), ["next-draft"])
+        archived = ArchivedEvent.objects.get()
+        self.assertEqual((archived.pk, archived.slug), (self.old_event.pk, "old-draft"))
+        self.assertEqual(
+            list(ArchivedEventRegistration.objects.values_list("event_id", "user_id")),
+            [(self.old_event.pk, self.user.pk)],
+        )
+        self.assertEqual(EventRegistration.objects.count(), 1)
+
+    def test_bookings_move_without_touching_rollups(self):
+        before = list(RoomUsageRollup.objects.order_by("hour").values_list("hour", "occupied_seconds", "revenue"))
+        self.assertEqual(archive.archive_bookings(days=90, batch_size=2), 3)
+        self.assertEqual(list(RoomBooking.objects.all()), [self.recent])
+        self.assertEqual(
+            sorted(ArchivedRoomBooking.objects.values_list("pk", flat=True)),
+            sorted(b.pk for b in self.old_bookings),
+        )
+        after = list(RoomUsageRollup.objects.order_by("hour").values_list("hour", "occupied_seconds", "revenue"))
+        self.assertEqual(after, before)
+        # a rebuild counts archived bookings too
+        rollups.rebuild()
+        self.assertEqual(
+            list(RoomUsageRollup.objects.order_by("hour").values_list("hour", "occupied_seconds", "revenue")),
+            before,
+        )
+
+    def test_default_pages_read_hot_tables_only(self):
+        archive.archive_events(days=7)
+        resp = self.client.get(reverse("event_list"))
+        self.assertContains(resp, "Next Draft")
+        self.assertNotContains(resp, "Old Draft")
+
+        resp = self.client.get(reverse("past_event_list"))
+        self.assertContains(resp, "Old Draft")
+        self.assertNotContains(resp, "Next Draft")
+
+        resp = self.client.get(reverse("event_detail", args=["old-draft"]))
+        self.assertRedirects(resp, reverse("past_event_detail", args=[self.old_event.pk]))
+
+    def test_booking_history(self):
+        archive.archive_bookings(days=90)
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse("booking_history"))
+        self.assertEqual(len(resp.context["page"].object_list), 3)
+        resp = self.client.get(reverse("room_booking_list"))
+        self.assertEqual(list(resp.context["bookings"]), [self.recent])
+
+
+class AttendeeImportTests(TestCase):
+    """Staff can register a CSV of usernames / emails in one go."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        cls.users = [
+            User.objects.create_user(f"player{i}", email=f"Player{i}@example.com", password="pw")
+            for i in range(5)
+        ]
+        User.objects.create_user("twin-a", email="twin@example.com")
+        User.objects.create_user("twin-b", email="twin@example.com")
+        cls.event = Event.objects.create(title="Regional Qualifier", slug="regional", capacity=4)
+        EventRegistration.objects.create(event=cls.event, user=cls.users[0])
+
+    def test_statuses(self):
+        rows = attendees.read_identifiers(
+            "username\nplayer0\nplayer1@EXAMPLE.com\nplayer1\nnobody\ntwin@example.com\n"
+            "player2\nplayer3\nplayer4\n"
+        )
+        report = attendees.import_attendees(self.event, rows)
+        self.assertEqual(
+            [(r["line"], r["status"]) for r in report],
+            [
+                (2, attendees.ALREADY_REGISTERED),
+                (3, attendees.REGISTERED),
+                (4, attendees.DUPLICATE),
+                (5, attendees.NOT_FOUND),
+                (6, attendees.AMBIGUOUS),
+                (7, attendees.REGISTERED),
+                (8, attendees.REGISTERED),
+                (9, attendees.FULL),
+            ],
+        )
+        self.assertEqual(self.event.registrations.count(), 4)
+
+    def test_usernames_with_at_sign(self):
+        User = get_user_model()
+        ann = User.objects.create_user("ann@x.com", email="Ann@X.com")
+        club = User.objects.create_user("bob@club", email="bob@example.org")
+        User.objects.create_user("carol", email="eve@x.com")
+        User.objects.create_user("eve@x.com")
+        event = Event.objects.create(title="Open Play", slug="open-play")
+
+        report = attendees.import_attendees(
+            event, [(1, "ann@x.com"), (2, "ANN@x.com"), (3, "bob@club"), (4, "eve@x.com")]
+        )
+        self.assertEqual(
+            [(r["username"], r["status"]) for r in report],
+            [
+                ("ann@x.com", attendees.REGISTERED),
+                ("ann@x.com", attendees.DUPLICATE),
+                ("bob@club", attendees.REGISTERED),
+                # one account's username, another's email
+                ("", attendees.AMBIGUOUS),
+            ],
+        )
+        self.assertEqual(
+            set(event.registrations.values_list("user_id", flat=True)), {ann.pk, club.pk}
+        )
+
+    def test_imported_users_leave_waitlist_and_fill_event(self):
+        EventWaitlistEntry.objects.create(event=self.event, user=self.users[1])
+        report = attendees.import_attendees(
+            self.event, [(1, "player1"), (2, "player2"), (3, "player3")]
+        )
+        self.assertEqual(attendees.summarize(report), {attendees.REGISTERED: 3})
+        self.assertFalse(self.event.waitlist.exists())
+        self.assertTrue(admission.is_full("regional"))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        User = get_user_model()
+        User.objects.bulk_create(User(username=f"walkin{i}") for i in range(1500))
+        event = Event.objects.create(title="Open Play", slug="open-play")
+        rows = [(i, f"walkin{i}") for i in range(1500)]
+        with CaptureQueriesContext(connection) as ctx:
+            report = attendees.import_attendees(event, rows)
+        # resolve users, lock event, read registrations; the rest are INSERT batches
+        queries = app_queries(ctx)
+        selects = [q for q in queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 3)
+        self.assertLess(len(queries), 15)
+        self.assertEqual(attendees.summarize(report), {attendees.REGISTERED: 1500})
+
+    def test_staff_view_and_csv_report(self):
+        url = reverse("event_import_attendees", args=["regional"])
+        self.client.force_login(self.users[1])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.force_login(self.staff)
+        upload = SimpleUploadedFile("walkins.csv", b"\xef\xbb\xbfemail\nplayer3@example.com\n")
+        resp = self.client.post(url, {"csv_file": upload, "attendees": "player4", "format": "csv"})
+        self.assertEqual(resp["Content-Type"], "text/csv")
+        self.assertEqual(
+            resp.content.decode().splitlines(),
+            [
+                "line,identifier,username,status",
+                "2,player3@example.com,player3,registered",
+                "3,player4,player4,registered",
+            ],
+        )
+
+        resp = self.client.post(url, {"attendees": ""})
+        self.assertFalse(resp.context["form"].is_valid())
+
+
+class AdmissionControlTests(TestCase):
+    """Sign-up rushes are shed from the cache before they reach the database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = [User.objects.create_user(f"fan{i}", password="pw") for i in range(3)]
+        cls.event = Event.objects.create(title="Prerelease", slug="prerelease", capacity=1)
+
+    def setUp(self):
+        clear_caches()
+        self.url = reverse("event_register", args=["prerelease"])
+
+    def test_full_event_skips_capacity_count(self):
+        self.client.force_login(self.users[0])
+        self.client.post(self.url)
+        self.assertTrue(admission.is_full("prerelease"))
+
+        self.client.force_login(self.users[1])
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(self.url)
+        self.assertRedirects(resp, reverse("event_detail", args=["prerelease"]))
+        self.assertFalse([q for q in ctx.captured_queries if "COUNT" in q["sql"] and "registration" in q["sql"]])
+        self.assertEqual(self.event.registrations.count(), 1)
+        self.assertTrue(self.event.waitlist.filter(user=self.users[1]).exists())
+        # waitlisted, not shed
+        self.assertEqual(admission.metrics()["full"], 1)
+        self.assertEqual(admission.metrics()["shed"], 0)
+
+        # a freed spot reopens sign-ups
+        self.client.force_login(self.users[0])
+        self.client.post(reverse("event_unregister", args=["prerelease"]))
+        self.assertFalse(admission.is_full("prerelease"))
+
+    def test_stale_full_flag_registers_into_free_spot(self):
+        # flagged full by another process, but the spot is free
+        admission.mark_full(self.event)
+        self.client.force_login(self.users[0])
+        self.client.post(self.url)
+        self.assertTrue(self.event.registrations.filter(user=self.users[0]).exists())
+        self.assertFalse(self.event.waitlist.exists())
+        self.assertFalse(admission.is_full("prerelease"))
+
+    @override_settings(ADMISSION_EVENT_RATE=1)
+    def test_full_event_is_still_rate_limited(self):
+        admission.mark_full(self.event)
+        with mock.patch.object(admission, "time") as fake_time:
+            fake_time.time.return_value = 1_000_000.0
+            decisions = [admission.admit("prerelease", user.pk) for user in self.users[:2]]
+        self.assertEqual(decisions, [admission.FULL, admission.EVENT_RATE])
+
+    @override_settings(ADMISSION_USER_LIMIT=2)
+    def test_per_user_rate_limit(self):
+        Event.objects.filter(pk=self.event.pk).update(capacity=0)
+        self.client.force_login(self.users[0])
+        codes = [self.client.post(self.url).status_code for _ in range(3)]
+        self.assertEqual(codes, [302, 302, 429])
+
+    @override_settings(ADMISSION_EVENT_RATE=2)
+    def test_per_event_rate_and_metrics(self):
+        Event.objects.filter(pk=self.event.pk).update(capacity=0)
+        with mock.patch.object(admission, "time") as fake_time:
+            fake_time.time.return_value = 1_000_000.0
+            codes = []
+            for user in self.users:
+                self.client.force_login(user)
+                codes.append(self.client.post(self.url).status_code)
+            self.assertEqual(codes, [302, 302, 429])
+
+            fake_time.time.return_value += 1
+            self.assertEqual(self.client.post(self.url).status_code, 302)
+
+        staff = get_user_model().objects.create_user("boss", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        stats = self.client.get(reverse("admission_metrics")).json()
+        self.assertEqual(stats["admitted"], 3)
+        self.assertEqual(stats["event_rate"], 1)
+        self.assertEqual(stats["shed"], 1)
+
+
+class PageCacheTests(TestCase):
+    """Anonymous product / event pages come from the versioned page cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catan = Product.objects.create(name="Catan", slug="catan", price="49.99")
+        Event.objects.create(title="Magic Night", slug="magic-night", capacity=8)
+
+    def setUp(self):
+        clear_caches()
+        product_counters.clear()
+
+    def test_second_anonymous_request_is_a_hit(self):
+        for path in ("/", "/?sort=popular", "/product/catan/", "/events/", "/events/magic-night/"):
+            self.assertEqual(self.client.get(path)["X-Page-Cache"], "miss", path)
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(path)
+            self.assertEqual(app_queries(ctx), [], path)
+            self.assertEqual(resp["X-Page-Cache"], "hit", path)
+        # the cached product page still counted both views
+        self.assertEqual(product_counters.pending()[self.catan.pk]["view_count"], 2)
+
+    async def test_async_views_share_the_cache(self):
+        await sync_to_async(self.client.get)("/product/catan/")
+        resp = await self.async_client.get("/product/catan/")
+        self.assertEqual(resp["X-Page-Cache"], "hit")
+        self.assertTrue(resp.resolver_match.func.__name__.endswith("_async"))
+
+    def test_model_save_invalidates(self):
+        self.client.get("/")
+        self.catan.name = "Catan (5th ed.)"
+        self.catan.save()
+        resp = self.client.get("/")
+        self.assertEqual(resp["X-Page-Cache"], "miss")
+        self.assertContains(resp, "Catan (5th ed.)")
+
+        self.client.get("/events/magic-night/")
+        user = get_user_model().objects.create_user("ana")
+        EventRegistration.objects.create(event=Event.objects.get(), user=user)
+        self.assertEqual(self.client.get("/events/magic-night/")["X-Page-Cache"], "miss")
+
+    def test_logged_in_and_cart_sessions_bypass(self):
+        self.client.get("/")
+        self.client.force_login(get_user_model().objects.create_user("ana"))
+        self.assertNotIn("X-Page-Cache", self.client.get("/"))
+
+        guest = Client()
+        guest.post(reverse("cart_add", args=[self.catan.pk]))
+        self.assertNotIn("X-Page-Cache", guest.get("/"))
+
+    def test_cached_page_carries_visitors_own_csrf_token(self):
+        Client().get("/")
+        visitor = Client(enforce_csrf_checks=True)
+        resp = visitor.get("/")
+        self.assertEqual(resp["X-Page-Cache"], "hit")
+        self.assertNotIn(pagecache.CSRF_PLACEHOLDER, resp.content)
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', resp.content).group(1)
+        resp = visitor.post(
+            reverse("cart_add", args=[self.catan.pk]), {"csrfmiddlewaretoken": token.decode()}
+        )
+        self.assertEqual(resp.status_code, 302)
+
+    def test_dogpile_serves_last_copy_while_locked(self):
+        self.client.get("/")
+        Product.objects.create(name="Azul", slug="azul", price="39.99")
+
+        # another worker is regenerating the new version of the page
+        page = pagecache.PageLookup(RequestFactory().get("/"), (Product,))
+        self.assertEqual(page.lookup(), (None, pagecache.MISS))
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/")
+        self.assertEqual(app_queries(ctx), [])
+        self.assertEqual(resp["X-Page-Cache"], "stale")
+        self.assertNotContains(resp, "Azul")
+
+        page.release()
+        resp = self.client.get("/")
+        self.assertEqual(resp["X-Page-Cache"], "miss")
+        self.assertContains(resp, "Azul")
+
+    def test_version_bumped_by_another_process_invalidates(self):
+        self.client.get("/")
+        # a separate cache handle stands in for run_tasks or another worker
+        other = caches.create_connection("default")
+        with mock.patch.object(pagecache, "_cache", return_value=other):
+            pagecache.bump(Product)
+        self.assertEqual(self.client.get("/")["X-Page-Cache"], "miss")
+
+    @mock.patch.object(pagecache, "WAIT_SECONDS", 0.1)
+    def test_waits_then_renders_without_any_copy(self):
+        page = pagecache.PageLookup(RequestFactory().get("/events/"), (Event, EventRegistration))
+        page.lookup()
+        resp = self.client.get("/events/")
+        self.assertEqual(resp["X-Page-Cache"], "miss")
+        self.assertContains(resp, "Magic Night")
+
+
+class WaitlistTests(TestCase):
+    """Full events queue sign-ups; a freed spot goes to the head of the queue."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = [User.objects.create_user(f"waiter{i}", password="pw") for i in range(4)]
+        cls.event = Event.objects.create(title="Draft night", slug="draft-night", capacity=1)
+
+    def setUp(self):
+        clear_caches()
+
+    def register(self, user):
+        self.client.force_login(user)
+        return self.client.post(reverse("event_register", args=[self.event.slug]))
+
+    def test_full_event_queues_in_order(self):
+        for user in self.users[:3]:
+            self.register(user)
+        self.assertEqual(self.event.registrations.get().user, self.users[0])
+        self.assertEqual(waitlist.position(self.event, self.users[1]), 1)
+        self.assertEqual(waitlist.position(self.event, self.users[2]), 2)
+        self.assertIsNone(waitlist.position(self.event, self.users[3]))
+
+        # asking again doesn't lose your place
+        self.register(self.users[1])
+        self.assertEqual(waitlist.position(self.event, self.users[1]), 1)
+
+    def test_unregister_promotes_head_in_same_transaction(self):
+        for user in self.users[:3]:
+            self.register(user)
+        self.client.force_login(self.users[0])
+        self.client.post(reverse("event_unregister", args=[self.event.slug]))
+
+        self.assertEqual(self.event.registrations.get().user, self.users[1])
+        self.assertIsNone(waitlist.position(self.event, self.users[1]))
+        self.assertEqual(waitlist.position(self.event, self.users[2]), 1)
+
+    def test_failed_promotion_rolls_back_unregister(self):
+        for user in self.users[:2]:
+            self.register(user)
+        self.client.force_login(self.users[0])
+        self.client.raise_request_exception = True
+        with mock.patch.object(waitlist.EventRegistration.objects, "bulk_create", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.client.post(reverse("event_unregister", args=[self.event.slug]))
+        # same transaction: the spot was never freed
+        self.assertEqual(self.event.registrations.get().user, self.users[0])
+        self.assertEqual(waitlist.position(self.event, self.users[1]), 1)
+
+    def test_detail_page_shows_position_with_one_query(self):
+        for user in self.users[:3]:
+            self.register(user)
+        self.client.force_login(self.users[2])
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(reverse("event_detail", args=[self.event.slug]))
+        self.assertEqual(resp.context["waitlist_position"], 2)
+        self.assertContains(resp, "#2 on the waitlist")
+        self.assertEqual(len([q for q in ctx.captured_queries if "waitlist" in q["sql"]]), 1)
+
+    def test_leave_waitlist(self):
+        for user in self.users[:3]:
+            self.register(user)
+        self.client.force_login(self.users[1])
+        self.client.post(reverse("event_waitlist_leave", args=[self.event.slug]))
+        self.assertIsNone(waitlist.position(self.event, self.users[1]))
+        self.assertEqual(waitlist.position(self.event, self.users[2]), 1)
+
+    def test_raised_capacity_promotes(self):
+        for user in self.users[:3]:
+            self.register(user)
+        self.event.capacity = 2
+        self.event.save()
+        self.assertEqual(
+            set(self.event.registrations.values_list("user", flat=True)),
+            {self.users[0].pk, self.users[1].pk},
+        )
+        self.assertEqual(self.event.waitlist.count(), 1)
+
+    def test_deleting_event_or_user_does_not_promote(self):
+        for user in self.users[:2]:
+            self.register(user)
+        self.users[0].delete()
+        self.assertFalse(self.event.registrations.exists())
+        self.assertEqual(self.event.waitlist.count(), 1)
+
+        self.event.delete()
+        self.assertFalse(EventRegistration.objects.exists())
+
+
+class JsonApiTests(TestCase):
+    """/api/v1/: sparse fields, keyset pages, batched relations."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user("kiosk", password="pw")
+        other = User.objects.create_user("other", password="pw")
+        start = timezone.now() + timedelta(days=1)
+        cls.events = [
+            Event.objects.create(
+                title=f"Night {i}", slug=f"night-{i}", capacity=10,
+                date=start.date(), start_time=start + timedelta(hours=i % 5),
+            )
+            for i in range(30)
+        ]
+        for event in cls.events[::2]:
+            EventRegistration.objects.create(event=event, user=cls.user)
+            EventRegistration.objects.create(event=event, user=other)
+        rooms = [Room.objects.create(name=f"Room {i}", slug=f"room-{i}") for i in range(3)]
+        for i in range(30):
+            RoomBooking.objects.create(
+                room=rooms[i % 3], user=cls.user if i % 2 else other,
+                start_time=start + timedelta(hours=i), end_time=start + timedelta(hours=i, minutes=30),
+            )
+
+    def get(self, name, **params):
+        resp = self.client.get(reverse(name), params)
+        return resp, json.loads(resp.content)
+
+    def test_sparse_fields(self):
+        Product.objects.create(name="Catan", slug="catan", price="45.00", image_url="http://x/c.png")
+        resp, body = self.get("api_products", fields="name,price,image")
+        self.assertEqual(body["data"], [{"id": body["data"][0]["id"], "name": "Catan", "price": "45.00", "image": "http://x/c.png"}])
+        self.assertNotIn(b" ", resp.content.replace(b"Catan", b""))
+
+        resp, body = self.get("api_products", fields="name,secret")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("secret", body["error"])
+
+    def test_keyset_pages_cover_everything_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {"fields": "start_time", "limit": 7}
+            if cursor:
+                params["cursor"] = cursor
+            _, body = self.get("api_events", **params)
+            seen.extend(row["id"] for row in body["data"])
+            cursor = body["next"]
+            if not cursor:
+                break
+        expected = list(
+            Event.objects.order_by("date", "start_time", "id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+        resp, _ = self.get("api_events", cursor="not-a-cursor")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_tampered_cursor_is_a_bad_request(self):
+        self.client.force_login(self.user)
+        bad = {
+            "api_products": [["x"], [None], [[1]]],
+            "api_events": [["2026-01-01", "soon", 1], ["x", "2026-01-01T10:00:00+00:00", 1],
+                           ["2026-01-01", "2026-01-01T10:00:00+00:00", "one"]],
+            "api_rooms": [["one"]],
+            "api_bookings": [["not a date", 1], ["2026-01-01T10:00:00+00:00", {}]],
+        }
+        for name, cursors in bad.items():
+            for values in cursors:
+                resp, body = self.get(name, cursor=api.encode_cursor(values))
+                self.assertEqual(resp.status_code, 400, (name, values))
+                self.assertEqual(body["error"], "invalid cursor")
+
+    def test_bookings_need_a_login(self):
+        resp, body = self.get("api_bookings")
+        self.assertEqual(resp.status_code, 401)
+        self.assertNotIn("data", body)
+        # the public resources stay public
+        self.assertEqual(self.get("api_events")[0].status_code, 200)
+
+    def test_event_relations(self):
+        self.client.force_login(self.user)
+        _, body = self.get("api_events", fields="registrations,registered", limit=200)
+        by_id = {row["id"]: row for row in body["data"]}
+        for i, event in enumerate(self.events):
+            self.assertEqual(by_id[event.pk]["registrations"], 0 if i % 2 else 2)
+            self.assertEqual(by_id[event.pk]["registered"], not i % 2)
+
+    def test_booking_rooms(self):
+        self.client.force_login(self.user)
+        _, body = self.get("api_bookings", room="room-1", limit=200)
+        self.assertEqual(len(body["data"]), 10)
+        self.assertEqual({row["room"]["slug"] for row in body["data"]}, {"room-1"})
+        mine = set(RoomBooking.objects.filter(user=self.user).values_list("id", flat=True))
+        self.assertEqual({row["id"] for row in body["data"] if row["mine"]}, mine & {row["id"] for row in body["data"]})
+
+    def test_query_count_independent_of_page_size(self):
+        self.client.force_login(self.user)
+        # session + user, the page, then one IN query per relation
+        for name, fields, expected in (
+            ("api_events", "title,registrations,registered,url", 5),
+            ("api_bookings", "room,mine,start_time", 4),
+        ):
+            for limit in (2, 25):
+                with self.assertNumQueries(expected):
+                    _, body = self.get(name, fields=fields, limit=limit)
+                self.assertEqual(len(body["data"]), limit)
+
+
+class CatalogSnapshotTests(TestCase):
+    """product_list / product_detail served from the mmapped snapshot."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.catan = Product.objects.create(
+            name="Catan", slug="catan", price="45.00", category="Board Games",
+            inventory_qty=3, description="Trade sheep.", image_url="http://x/catan.png",
+        )
+        cls.azul = Product.objects.create(
+            name="Azul", slug="azul", price="39.99", category="Board Games", image="product_images/azul.png",
+        )
+        cls.dice = Product.objects.create(name="Dice Set", slug="dice", price="9.50", category="Accessories")
+        RelatedProduct.objects.create(product=cls.catan, related=cls.azul, rank=1, score=0.5)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = f"{tmp.name}/catalog.snapshot"
+        settings_override = override_settings(CATALOG_SNAPSHOT_PATH=self.path, PAGE_CACHE_SECONDS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(snapshot.catalog_snapshot.invalidate)
+        snapshot.catalog_snapshot.invalidate()
+
+    def test_lookups(self):
+        self.assertEqual(snapshot.build(self.path), 3)
+        snap = snapshot.Snapshot(self.path)
+
+        catan = snap.by_slug("catan")
+        self.assertEqual((catan.id, catan.name, catan.price, catan.inventory_qty),
+                         (self.catan.pk, "Catan", Decimal("45.00"), 3))
+        self.assertEqual(catan.category, "Board Games")
+        self.assertFalse(catan.image)
+        self.assertEqual(snap.by_slug("azul").image.url, self.azul.image.url)
+        self.assertIsNone(snap.by_slug("nope"))
+
+        self.assertEqual([p.slug for p in snap.products()], ["dice", "azul", "catan"])
+        self.assertEqual([p.slug for p in snap.products("Board Games")], ["azul", "catan"])
+        self.assertEqual([p.slug for p in snap.by_ids([self.catan.pk, self.dice.pk])], ["catan", "dice"])
+        self.assertIsNone(snap.by_ids([self.catan.pk, 10_000]))
+
+    def test_pages_match_orm_and_skip_product_queries(self):
+        pages = [
+            reverse("product_list"),
+            reverse("product_list") + "?category=Board+Games",
+            reverse("product_detail", args=["catan"]),
+        ]
+        from_orm = [strip_csrf(self.client.get(url).content) for url in pages]
+
+        snapshot.build(self.path)
+        snapshot.catalog_snapshot.invalidate()
+        for url, expected in zip(pages, from_orm):
+            with CaptureQueriesContext(connection) as ctx:
+                resp = self.client.get(url)
+            self.assertEqual(strip_csrf(resp.content), expected, url)
+            self.assertFalse([q for q in ctx.captured_queries if '"catalog_product"' in q["sql"]], url)
+
+    def test_edit_falls_back_until_rebuilt(self):
+        snapshot.build(self.path)
+        old = snapshot.Snapshot(self.path)
+
+        Product.objects.get(pk=self.catan.pk).save()
+        self.assertIsNone(snapshot.catalog_snapshot.current())
+        self.assertTrue(Task.objects.filter(dedup_key="catalog-snapshot").exists())
+
+        Product.objects.filter(pk=self.catan.pk).update(name="Catan 5th Ed")
+        snapshot.rebuild_catalog_snapshot()
+        snapshot.catalog_snapshot.invalidate()
+        self.assertEqual(snapshot.catalog_snapshot.current().by_slug("catan").name, "Catan 5th Ed")
+        # a reader that mapped the old file keeps a consistent view of it
+        self.assertEqual(old.by_slug("catan").name, "Catan")
+
+    def test_missing_or_new_products_use_the_orm(self):
+        self.assertIsNone(snapshot.catalog_snapshot.current())
+        snapshot.build(self.path)
+        Product.objects.bulk_create([Product(name="Wingspan", slug="wingspan", price="60.00")])
+        snapshot.catalog_snapshot.invalidate()
+        self.assertIsNotNone(snapshot.catalog_snapshot.current())
+        self.assertContains(self.client.get(reverse("product_detail", args=["wingspan"])), "Wingspan")
+
+
+class SitemapTests(TestCase):
+    """Sharded sitemap files, cached on disk and rebuilt only where rows changed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(name=f"Game {i}", slug=f"game-{i}", price="10.00") for i in range(5)
+        ]
+        cls.event = Event.objects.create(title="Launch", slug="launch")
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        settings_override = override_settings(
+            SITEMAP_ROOT=self.root, SITEMAP_BASE_URL="https://shop.example.com/"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def read(self, name):
+        with open(f"{self.root}/{name}") as f:
+            return f.read()
+
+    @mock.patch.object(sitemaps, "SHARD_SIZE", 2)
+    def test_shards_and_index(self):
+        written = sitemaps.refresh("http://testserver/")
+        self.assertEqual(
+            sorted(written), ["events-0.xml", "products-0.xml", "products-1.xml", "products-2.xml"]
+        )
+        first = self.products[0]
+        shard = self.read(f"products-{(first.pk - 1) // 2}.xml")
+        self.assertIn(f"<loc>http://testserver/product/{first.slug}/</loc>", shard)
+        self.assertIn(f"<lastmod>{first.updated_at.isoformat(timespec='seconds')}</lastmod>", shard)
+        self.assertEqual(self.read("sitemap.xml").count("<sitemap>"), 4)
+
+        # nothing changed: nothing rewritten
+        self.assertEqual(sitemaps.refresh("http://testserver"), [])
+
+        # one edit and one delete touch one shard each
+        edited, deleted = self.products[4], self.products[1]
+        shard_of = {p.slug: f"products-{(p.pk - 1) // 2}.xml" for p in (edited, deleted)}
+        edited.save()
+        deleted.delete()
+        self.assertEqual(sorted(sitemaps.refresh("http://testserver")), sorted(set(shard_of.values())))
+        self.assertNotIn("/game-1/", self.read(shard_of["game-1"]))
+
+    def test_views_serve_cached_files(self):
+        resp = self.client.get(reverse("sitemap_index"))
+        self.assertEqual(resp["Content-Type"], "application/xml")
+        body = b"".join(resp.streaming_content).decode()
+        self.assertIn("/sitemaps/events-0.xml", body)
+
+        # within SITEMAP_REFRESH_SECONDS the index is served without querying
+        with self.assertNumQueries(0):
+            resp = self.client.get(reverse("sitemap_index"))
+            b"".join(resp.streaming_content)
+
+        resp = self.client.get(reverse("sitemap_section", args=["events", 0]))
+        self.assertIn(b"<loc>https://shop.example.com/events/launch/</loc>", b"".join(resp.streaming_content))
+        self.assertEqual(self.client.get("/sitemaps/users-0.xml").status_code, 404)
+        self.assertEqual(self.client.get("/sitemaps/events-9.xml").status_code, 404)
+
+    @override_settings(ALLOWED_HOSTS=["shop.example.com", "internal"])
+    def test_request_host_is_ignored(self):
+        self.client.get(reverse("sitemap_index"), HTTP_HOST="shop.example.com")
+        with mock.patch.object(sitemaps, "refresh") as refresh:
+            resp = self.client.get(reverse("sitemap_index"), HTTP_HOST="internal")
+            self.assertNotIn(b"internal", b"".join(resp.streaming_content))
+        refresh.assert_not_called()
+        self.assertEqual(sitemaps.read_manifest()["base_url"], "https://shop.example.com")
+
+
+class LoadJourneyTests(LiveServerTestCase):
+    """Scripted journeys against a live server, plus the overbooking check."""
+
+    def setUp(self):
+        clear_caches()
+        self.product = Product.objects.create(name="Gloomhaven", slug="gloomhaven", price="99.00")
+        self.event = Event.objects.create(
+            title="Campaign day", slug="campaign-day", capacity=2,
+            start_time=timezone.now() + timedelta(days=2),
+        )
+        self.room = Room.objects.create(name="Back room", slug="back-room")
+
+    def test_parse_journey(self):
+        steps = loadgen.parse_journey(loadgen.DEFAULT_JOURNEY)
+        self.assertEqual(steps[0].name, "browse")
+        signup = next(s for s in steps if s.name == "signup")
+        self.assertEqual((signup.method, signup.expect), ("POST", {302}))
+        self.assertEqual(signup.fields["password1"], "{password}")
+        self.assertTrue(steps[0].ok(200) and not steps[0].ok(404))
+
+        for bad in ("browse GET", "x PUT /", "x POST / novalue", "x GET / -> abc", "# only comments"):
+            with self.assertRaises(loadgen.JourneyError, msg=bad):
+                loadgen.parse_journey(bad)
+
+    def test_default_journey_runs_clean(self):
+        steps = loadgen.parse_journey(loadgen.DEFAULT_JOURNEY)
+        report, run_id = asyncio.run(loadgen.run(
+            self.live_server_url, steps, users=3, concurrency=1,
+            fixtures=loadgen.load_fixtures(), seed=1,
+        ))
+        self.assertEqual(report.error_samples, [])
+        rows = {row["step"]: row for row in report.rows()}
+        self.assertEqual(list(rows), [s.name for s in steps])
+        self.assertTrue(all(row["requests"] == 3 for row in rows.values()))
+        self.assertTrue(all(row["p50"] <= row["p95"] <= row["p99"] for row in rows.values()))
+
+        # sessions + CSRF carried through: the users signed up and registered
+        users = get_user_model().objects.filter(username__startswith=f"load-{run_id}-")
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(self.event.registrations.count(), 2)
+        self.assertEqual(loadgen.check_integrity(), [])
+
+        out = io.StringIO()
+        call_command("load_journeys", base_url=self.live_server_url, users=1, cleanup=True, stdout=out)
+        self.assertIn("p95 ms", out.getvalue())
+        self.assertIn("no overfull events or overlapping bookings", out.getvalue())
+
+    def test_integrity_finds_overbooking(self):
+        user = get_user_model().objects.create_user("racer", password="pw")
+        others = [get_user_model().objects.create_user(f"racer{i}", password="pw") for i in range(2)]
+        start = timezone.now() + timedelta(days=1)
+        # bulk_create skips the views' checks, as a race between two requests would
+        RoomBooking.objects.bulk_create([
+            RoomBooking(room=self.room, user=user, start_time=start, end_time=start + timedelta(hours=2)),
+            RoomBooking(room=self.room, user=user, start_time=start + timedelta(hours=1),
+                        end_time=start + timedelta(hours=3)),
+        ])
+        EventRegistration.objects.bulk_create(
+            [EventRegistration(event=self.event, user=u) for u in (user, *others)]
+        )
+        findings = loadgen.check_integrity()
+        self.assertEqual(len(findings), 3)
+        self.assertIn("campaign-day: 3 registrations for 2 places", findings[0])
+
+
+@override_settings(PAGE_CACHE_SECONDS=0, CATALOG_SNAPSHOT_PATH=None)
+class CardParityTests(TestCase):
+    """The compiled card renderers produce exactly what the template loops do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        long_text = " ".join(f"word{i}" for i in range(40))
+        Product.objects.create(
+            name="Catan", slug="catan", price="45.00", category="Board Games", inventory_qty=3,
+            description="Trade sheep.", image="product_images/catan.png",
+        )
+        Product.objects.create(
+            name='Tom & Jerry\'s "<Chase>"', slug="tom-jerry", price="1234.50", category="",
+            description=f"<b>Bold</b> & {long_text}", image_url="https://cdn.example.com/a.png?x=1&y=2",
+        )
+        Product.objects.create(name="Über Würfel – ☃", slug="uber_wurfel", price="0.99", category="Zubehör")
+        start = datetime(2026, 3, 29, 0, 30, 45, tzinfo=dt_timezone.utc)
+        Event.objects.create(title="Draft <night>", slug="draft", capacity=8, start_time=start, description=long_text)
+        Event.objects.create(title="Open play", slug="open-play", capacity=0, start_time=start + timedelta(days=200))
+        full = Event.objects.create(title="Finals & co", slug="finals", capacity=1, start_time=start, description="Ç'est ça")
+        EventRegistration.objects.create(event=full, user=get_user_model().objects.create_user("ana"))
+
+    def _pages(self, path):
+        pages = []
+        for fast in (True, False):
+            with override_settings(FAST_CARD_RENDERING=fast):
+                resp = self.client.get(path)
+                self.assertEqual(resp.status_code, 200)
+                pages.append(strip_csrf(resp.content))
+        return pages
+
+    def test_list_pages_are_identical(self):
+        for path in ("/", "/?sort=popular", "/?q=zzz", "/events/"):
+            fast, reference = self._pages(path)
+            self.assertEqual(fast, reference, path)
+        home = self._pages("/")[0]
+        self.assertIn(b'alt="Tom &amp; Jerry&#x27;s &quot;&lt;Chase&gt;&quot;"', home)
+        self.assertIn(b'action="/cart/add/', home)
+
+    @override_settings(TIME_ZONE="America/New_York", LANGUAGE_CODE="de", USE_THOUSAND_SEPARATOR=True)
+    def test_identical_with_other_time_zone_and_locale(self):
+        for path in ("/", "/events/"):
+            fast, reference = self._pages(path)
+            self.assertEqual(fast, reference, path)
+        self.assertIn("Mär 28, 2026 20:30".encode(), fast)
+
+    def test_renderers_match_reference_templates(self):
+        from .management.commands.bench_templates import sample_events, sample_products
+
+        request = RequestFactory().get("/")
+        request.user = get_user_model()(username="x")
+        for tag, items in (("product_cards products", sample_products(60)), ("event_cards events", sample_events(60))):
+            name = tag.split()[1]
+            html = []
+            for fast in (True, False):
+                with override_settings(FAST_CARD_RENDERING=fast):
+                    page = Template("{% load catalog_cards %}{% " + tag + " %}").render(
+                        RequestContext(request, {name: items})
+                    )
+                html.append(strip_csrf(page.encode()))
+            self.assertEqual(html[0], html[1], tag)
+            self.assertGreater(html[0].count(b"<article"), 59)
+
+    def test_toggle_off_renders_template_loop(self):
+        with override_settings(FAST_CARD_RENDERING=False), \
+                mock.patch("catalog.templatetags.catalog_cards.render_event_cards") as fast:
+            self.assertContains(self.client.get("/events/"), "Draft &lt;night&gt;")
+        fast.assert_not_called()
+
+    def test_memoized_filters(self):
+        cards._truncated.cache_clear()
+        text = " ".join(["many"] * 30)
+        self.assertEqual(cards.truncated(text, "en"), cards.truncated(text, "en"))
+        self.assertEqual(cards._truncated.cache_info().hits, 1)
+        self.assertEqual(cards.truncated(text, "en"), "many " * 24 + "many …")
+
+    def test_bench_command(self):
+        out = io.StringIO()
+        call_command("bench_templates", cards=20, repeat=1, stdout=out)
+        self.assertIn("event_list", out.getvalue())
+        self.assertIn("faster", out.getvalue())
@@ -12,6 +12,7 @@ urlpatterns = [
     path("product/create/", views.product_create, name="product_create"),
     path("product/<slug:slug>/edit/", views.product_edit, name="product_edit"),
     path("product/<slug:slug>/", views.product_detail, name="product_detail"),
+    path("search/suggest/", views.search_suggest, name="search_suggest"),
 
     # =========================
     # CART
@@ -30,14 +31,28 @@ urlpatterns = [
     # EVENTS
     # =========================
     path("events/", views.event_list, name="event_list"),
+    path("events/calendar.ics", views.events_calendar_feed, name="events_calendar_feed"),
     path("events/create/", views.event_create, name="event_create"),
+    path("events/past/", views.past_event_list, name="past_event_list"),
+    path("events/past/<int:pk>/", views.past_event_detail, name="past_event_detail"),
+    path("events/admission/metrics/", views.admission_metrics, name="admission_metrics"),
     path("events/<slug:slug>/", views.event_detail, name="event_detail"),
     path("events/<slug:slug>/register/", views.event_register, name="event_register"),
+    path(
+        "events/<slug:slug>/import/",
+        views.event_import_attendees,
+        name="event_import_attendees",
+    ),
     path(
         "events/<slug:slug>/unregister/",
         views.event_unregister,
         name="event_unregister",
     ),
+    path(
+        "events/<slug:slug>/waitlist/leave/",
+        views.event_waitlist_leave,
+        name="event_waitlist_leave",
+    ),
 
     # =========================
     # ROOMS / ROOM BOOKINGS
@@ -45,5 +60,38 @@ urlpatterns = [
     # List rooms + create bookings (POST) + show calendar
     path("rooms/", views.room_booking_list, name="room_booking_list"),
     path("rooms/cancel/<int:booking_id>/", views.room_booking_cancel, name="room_booking_cancel"),
+    path("rooms/history/", views.booking_history, name="booking_history"),
+    path(
+        "rooms/series/<int:series_id>/cancel/",
+        views.room_booking_series_cancel,
+        name="room_booking_series_cancel",
+    ),
+    path("rooms/utilization/", views.room_utilization_report, name="room_utilization_report"),
+    path("rooms/utilization.csv", views.room_utilization_csv, name="room_utilization_csv"),
+
+    # =========================
+    # CALENDAR FEEDS (.ics)
+    # =========================
+    path("rooms/<slug:slug>/calendar.ics", views.room_calendar_feed, name="room_calendar_feed"),
+    path("calendar/<str:token>.ics", views.user_calendar_feed, name="user_calendar_feed"),
+    path("calendar/reset/", views.reset_calendar_token, name="reset_calendar_token"),
+
+    # =========================
+    # SITEMAPS
+    # =========================
+    path("sitemap.xml", views.sitemap_index, name="sitemap_index"),
+    path(
+        "sitemaps/<slug:section>-<int:shard>.xml",
+        views.sitemap_section,
+        name="sitemap_section",
+    ),
+
+    # =========================
+    # JSON API (v1, read-only)
+    # =========================
+    path("api/v1/products/", views.api_list, {"resource": "products"}, name="api_products"),
+    path("api/v1/events/", views.api_list, {"resource": "events"}, name="api_events"),
+    path("api/v1/rooms/", views.api_list, {"resource": "rooms"}, name="api_rooms"),
+    path("api/v1/bookings/", views.api_list, {"resource": "bookings"}, name="api_bookings"),
 
 ]
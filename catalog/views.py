@@ -1,9 +1,24 @@
 ﻿# catalog/views.py
-from django.shortcuts import render, get_object_or_404, redirect
-from django.contrib.auth import login, logout
+import csv
+import hashlib
+import os
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.shortcuts import render, get_object_or_404, redirect, aget_object_or_404
+from django.contrib.auth import login, logout, get_user_model
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.contrib import messages
+from django.core import signing
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import condition, require_safe
 
 from .models import (
     Product,
@@ -11,9 +26,27 @@ from .models import (
     EventRegistration,
     Room,
     RoomBooking,
+    RoomBookingSeries,
+    CalendarFeed,
+    RelatedProduct,
+    ArchivedEvent,
+    ArchivedRoomBooking,
+)
+from .forms import (
+    ProductForm,
+    EventForm,
+    RoomBookingForm,
+    RoomBookingSeriesForm,
+    AttendeeImportForm,
 )
-from .forms import ProductForm, EventForm, RoomBookingForm
 from .cart import Cart
+from .autocomplete import product_index
+from .bookings import book_series
+from .counters import product_counters
+from .pagecache import cache_anonymous_page
+from .snapshot import catalog_snapshot
+from .tasks import enqueue, optimize_product_image
+from . import admission, api, attendees, ics, rollups, sitemaps, waitlist
 
 
 # =========================
@@ -29,24 +62,201 @@ def is_staff_user(user):
 # PRODUCT VIEWS
 # =========================
 
+# ?sort= options for product_list
+PRODUCT_SORTS = {
+    "newest": ("-id",),
+    "popular": ("-cart_add_count", "-view_count", "-id"),
+}
+
+
+def _product_list_queryset(request):
+    """Shared by product_list / product_list_async: ?q=, ?category=, ?sort=."""
+    sort = request.GET.get("sort")
+    if sort not in PRODUCT_SORTS:
+        sort = "newest"
+    products = Product.objects.all().order_by(*PRODUCT_SORTS[sort])
+
+    query = request.GET.get("q")
+    if query:
+        products = products.filter(name__icontains=query)
+
+    category = request.GET.get("category")
+    if category:
+        products = products.filter(category=category)
+
+    return products, sort
+
+
+def _product_list_snapshot(request):
+    """
+    product_list's products from the catalog snapshot (catalog/snapshot.py),
+    or None when the ORM has to answer: no current snapshot, a ?q= search,
+    or ?sort=popular (the counters aren't in the snapshot).
+    """
+    snapshot = catalog_snapshot.current()
+    if snapshot is None or request.GET.get("q") or request.GET.get("sort") == "popular":
+        return None
+    return snapshot.products(category=request.GET.get("category") or None)
+
+
+@cache_anonymous_page(Product)
 def product_list(request):
     """
     Show all products on the homepage.
-    Optional search by ?q=.
+    Optional search by ?q=, ?sort=popular for most popular first.
     """
-    products = Product.objects.all().order_by("-id")
+    products = _product_list_snapshot(request)
+    if products is not None:
+        sort = "newest"
+    else:
+        products, sort = _product_list_queryset(request)
+    return render(
+        request,
+        "catalog/product_list.html",
+        {"products": products, "sort": sort},
+    )
 
-    query = request.GET.get("q")
-    if query:
-        products = products.filter(name__icontains=query)
 
-    return render(request, "catalog/product_list.html", {"products": products})
+RELATED_PRODUCTS_SHOWN = 4
+
+
+def _count_cached_view(request, product_id):
+    """A product page served from the page cache still counts as a view."""
+    product_counters.view(product_id)
+
+
+def _related_links(product):
+    """Precomputed neighbours (catalog/related.py): one query on (product, rank)."""
+    return (
+        RelatedProduct.objects
+        .filter(product_id=product.id)
+        .select_related("related")
+        .order_by("rank")[:RELATED_PRODUCTS_SHOWN]
+    )
+
+
+def _related_ids(product):
+    """Same neighbours as ids only, for resolving against the snapshot."""
+    return (
+        RelatedProduct.objects
+        .filter(product_id=product.id)
+        .order_by("rank")
+        .values_list("related_id", flat=True)[:RELATED_PRODUCTS_SHOWN]
+    )
 
 
+@cache_anonymous_page(Product, RelatedProduct, on_hit=_count_cached_view)
 def product_detail(request, slug):
-    """Show a single product detail page by slug."""
-    product = get_object_or_404(Product, slug=slug)
-    return render(request, "catalog/product_detail.html", {"product": product})
+    """
+    Show a single product detail page by slug. Served from the catalog
+    snapshot when there is a current one; products added since it was
+    built fall back to the ORM.
+    """
+    snapshot = catalog_snapshot.current()
+    product = snapshot.by_slug(slug) if snapshot else None
+    related_products = None
+    if product is not None:
+        related_products = snapshot.by_ids(list(_related_ids(product)))
+    else:
+        product = get_object_or_404(Product, slug=slug)
+    if related_products is None:
+        related_products = [link.related for link in _related_links(product)]
+    product_counters.view(product.id)
+    response = render(
+        request,
+        "catalog/product_detail.html",
+        {"product": product, "related_products": related_products},
+    )
+    response.page_cache_meta = product.id
+    return response
+
+
+def _queue_image_optimize(product):
+    """Resize a freshly uploaded image in the background, not in this request."""
+    enqueue(
+        optimize_product_image,
+        product.id,
+        dedup_key=f"product-image:{product.id}",
+    )
+
+
+SUGGESTIONS_LIMIT = 8
+
+
+def search_suggest(request):
+    """
+    JSON autocomplete for the header search box: ?q=<prefix>.
+    Matches come from the in-memory prefix index (catalog/autocomplete.py);
+    the only DB work is one primary-key lookup for the winners.
+    """
+    query = (request.GET.get("q") or "").strip()[:100]
+    if not query:
+        return JsonResponse({"q": query, "products": [], "categories": []})
+
+    product_index.ensure_fresh()
+    ids = product_index.product_ids(query, limit=SUGGESTIONS_LIMIT)
+    by_id = {
+        p["pk"]: p
+        for p in Product.objects.filter(pk__in=ids).values("pk", "name", "slug")
+    }
+    product_url = reverse("product_detail", args=["__slug__"])
+    list_url = reverse("product_list")
+
+    response = JsonResponse({
+        "q": query,
+        "products": [
+            {
+                "name": by_id[pk]["name"],
+                "url": product_url.replace("__slug__", by_id[pk]["slug"]),
+            }
+            for pk in ids
+            if pk in by_id
+        ],
+        "categories": [
+            {"name": c, "url": f"{list_url}?{urlencode({'category': c})}"}
+            for c in product_index.categories(query)
+        ],
+    })
+    response["Cache-Control"] = "public, max-age=60"
+    return response
+
+
+def _sitemap_file(name):
+    path = os.path.join(sitemaps.sitemap_root(), name)
+    try:
+        response = FileResponse(open(path, "rb"), content_type="application/xml")
+    except FileNotFoundError:
+        raise Http404("No such sitemap.")
+    response["Cache-Control"] = "public, max-age=3600"
+    return response
+
+
+@require_safe
+def sitemap_index(request):
+    """
+    /sitemap.xml for crawlers. The shard files are cached on disk and only
+    the ones whose rows changed are rewritten (catalog/sitemaps.py), at
+    most once per SITEMAP_REFRESH_SECONDS. URLs use SITEMAP_BASE_URL, not
+    this request's Host.
+    """
+    sitemaps.refresh_if_stale()
+    return _sitemap_file(sitemaps.INDEX)
+
+
+@require_safe
+def sitemap_section(request, section, shard):
+    if section not in sitemaps.SECTIONS:
+        raise Http404("No such sitemap.")
+    return _sitemap_file(sitemaps.shard_name(section, shard))
+
+
+@require_safe
+def api_list(request, resource):
+    """
+    Read-only JSON list for the kiosk / mobile clients: /api/v1/<resource>/
+    with ?fields=, ?limit= and ?cursor= (see catalog/api.py).
+    """
+    return api.respond(request, resource)
 
 
 @user_passes_test(is_staff_user)
@@ -60,6 +270,8 @@ def product_create(request):
         form = ProductForm(request.POST, request.FILES)
         if form.is_valid():
             product = form.save()
+            if "image" in request.FILES:
+                _queue_image_optimize(product)
             messages.success(request, "Product created successfully.")
             return redirect("product_detail", slug=product.slug)
     else:
@@ -77,6 +289,8 @@ def product_edit(request, slug):
         form = ProductForm(request.POST, request.FILES, instance=product)
         if form.is_valid():
             product = form.save()
+            if "image" in request.FILES:
+                _queue_image_optimize(product)
             messages.success(request, "Product updated successfully.")
             return redirect("product_detail", slug=product.slug)
     else:
@@ -142,6 +356,7 @@ def cart_add(request, product_id):
     cart = Cart(request)
     product = get_object_or_404(Product, id=product_id)
     cart.add(product, quantity=1)
+    product_counters.cart_add(product.id)
     messages.success(request, f"Added {product.name} to your cart.")
     return redirect("cart_detail")
 
@@ -190,27 +405,58 @@ def cart_clear(request):
 # EVENT VIEWS
 # =========================
 
+def _event_list_queryset():
+    """
+    Events in date order with num_registrations. The count is a correlated
+    subquery rather than Count("registrations"): the GROUP BY that a join
+    needs makes SQLite sort the result again instead of walking
+    event_date_start_idx.
+    """
+    registrations = (
+        EventRegistration.objects.filter(event=OuterRef("pk"))
+        .order_by()
+        .values("event")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Event.objects.annotate(
+        num_registrations=Coalesce(Subquery(registrations), 0)
+    ).order_by("date", "start_time")
+
+
+@cache_anonymous_page(Event, EventRegistration)
 def event_list(request):
     """List all upcoming events that customers can register for."""
-    events = Event.objects.all().order_by("date", "start_time")
+    events = _event_list_queryset()
     return render(request, "events/event_list.html", {"events": events})
 
 
+@cache_anonymous_page(Event, EventRegistration)
 def event_detail(request, slug):
     """Show a single event with registration info."""
-    event = get_object_or_404(Event, slug=slug)
+    event = Event.objects.filter(slug=slug).first()
+    if event is None:
+        return _past_event_redirect(
+            ArchivedEvent.objects.filter(slug=slug).values_list("pk", flat=True).first()
+        )
     is_registered = False
+    waitlist_position = None
 
     if request.user.is_authenticated:
         is_registered = EventRegistration.objects.filter(
             event=event, user=request.user
         ).exists()
+        if not is_registered:
+            waitlist_position = waitlist.position(event, request.user)
 
     current_count = EventRegistration.objects.filter(event=event).count()
+    # the template reads event.registrations_count; hand it the count we have
+    event.num_registrations = current_count
 
     context = {
         "event": event,
         "is_registered": is_registered,
+        "waitlist_position": waitlist_position,
         "current_count": current_count,
     }
     return render(request, "events/event_detail.html", context)
@@ -231,13 +477,53 @@ def event_create(request):
     return render(request, "events/event_form.html", {"form": form})
 
 
+@user_passes_test(is_staff_user)
+def event_import_attendees(request, slug):
+    """
+    Staff-only: register a CSV / pasted list of usernames or emails in bulk
+    (see catalog/attendees.py) and show what happened to every row.
+    """
+    event = get_object_or_404(Event, slug=slug)
+    report = None
+
+    if request.method == "POST":
+        form = AttendeeImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            report = attendees.import_attendees(event, form.cleaned_data["rows"])
+            if request.POST.get("format") == "csv":
+                response = HttpResponse(content_type="text/csv")
+                response["Content-Disposition"] = (
+                    f'attachment; filename="{event.slug}-import-report.csv"'
+                )
+                attendees.write_report(report, response)
+                return response
+            registered = sum(1 for row in report if row["status"] == attendees.REGISTERED)
+            messages.success(request, f"Registered {registered} of {len(report)} attendee(s).")
+    else:
+        form = AttendeeImportForm()
+
+    context = {
+        "event": event,
+        "form": form,
+        "report": report,
+        "summary": attendees.summarize(report) if report else None,
+    }
+    return render(request, "events/event_import.html", context)
+
+
 @login_required
 def event_register(request, slug):
     """
     Customer: register for an event if:
       - capacity not full
       - not already registered
+    A full event puts the user on its waitlist instead (catalog/waitlist.py).
+    Sign-up rushes are throttled by catalog/admission.py before any query.
     """
+    decision = admission.admit(slug, request.user.pk)
+    if decision not in (admission.ADMITTED, admission.FULL):
+        return admission.shed_response(decision)
+
     event = get_object_or_404(Event, slug=slug)
 
     # already registered?
@@ -245,27 +531,70 @@ def event_register(request, slug):
         messages.info(request, "You are already registered for this event.")
         return redirect("event_detail", slug=event.slug)
 
-    # capacity check
-    current_count = EventRegistration.objects.filter(event=event).count()
-    if event.capacity and current_count >= event.capacity:
-        messages.error(request, "This event is full.")
+    # capacity check (skipped when admission control already knows it's full)
+    full = decision == admission.FULL
+    if not full:
+        current_count = EventRegistration.objects.filter(event=event).count()
+        full = bool(event.capacity and current_count >= event.capacity)
+        if full:
+            admission.mark_full(event)
+
+    if full:
+        place = waitlist.join(event, request.user)
+        if decision == admission.FULL:
+            # the cached flag may be stale (a spot freed in another process,
+            # or the capacity raised); promote() checks the real count
+            promoted = waitlist.promote(event.pk)
+            if promoted:
+                admission.clear_full(event.pk)
+                if request.user.pk in promoted:
+                    messages.success(request, "You are registered for this event!")
+                    return redirect("event_detail", slug=event.slug)
+                place = waitlist.position(event, request.user)
+        messages.info(
+            request,
+            f"This event is full. You are #{place} on the waitlist and will be "
+            "registered automatically when a spot opens.",
+        )
         return redirect("event_detail", slug=event.slug)
 
     # create registration
-    EventRegistration.objects.create(event=event, user=request.user)
+    with transaction.atomic():
+        EventRegistration.objects.create(event=event, user=request.user)
+        waitlist.leave(event, request.user)
+    if event.capacity and current_count + 1 >= event.capacity:
+        admission.mark_full(event)
     messages.success(request, "You are registered for this event!")
     return redirect("event_detail", slug=event.slug)
 
 
+@user_passes_test(is_staff_user)
+def admission_metrics(request):
+    """Staff-only: how many sign-up attempts admission control let through or shed."""
+    return JsonResponse(admission.metrics())
+
+
 @login_required
 def event_unregister(request, slug):
-    """Allow a user to unregister from an event."""
+    """
+    Allow a user to unregister from an event. The freed spot goes to the
+    head of the waitlist in the same transaction (see catalog/signals.py).
+    """
     event = get_object_or_404(Event, slug=slug)
     EventRegistration.objects.filter(event=event, user=request.user).delete()
     messages.info(request, "You have been unregistered from this event.")
     return redirect("event_detail", slug=event.slug)
 
 
+@login_required
+def event_waitlist_leave(request, slug):
+    """Take the user off an event's waitlist."""
+    event = get_object_or_404(Event, slug=slug)
+    if request.method == "POST" and waitlist.leave(event, request.user):
+        messages.info(request, "You have left the waitlist.")
+    return redirect("event_detail", slug=event.slug)
+
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import UserCreationForm
@@ -284,6 +613,61 @@ from .cart import Cart
 
 # ... all your existing product / auth / cart / event views ...
 
+# =========================
+# ARCHIVE (PAST EVENTS / BOOKING HISTORY)
+# =========================
+# Read the cold Archived* tables filled by catalog/archive.py; the regular
+# event and booking pages only ever see the hot tables.
+
+ARCHIVE_PAGE_SIZE = 50
+
+
+def _past_event_redirect(archived_id):
+    """Old links to an event that has been archived go to its past-event page."""
+    if archived_id is None:
+        raise Http404("No Event matches the given query.")
+    return redirect("past_event_detail", pk=archived_id)
+
+
+def past_event_list(request):
+    """Archived events, newest first, one page at a time."""
+    events = (
+        ArchivedEvent.objects
+        .annotate(num_registrations=Count("registrations"))
+        .order_by("-date", "-start_time")
+    )
+    page = Paginator(events, ARCHIVE_PAGE_SIZE).get_page(request.GET.get("page"))
+    return render(request, "events/past_event_list.html", {"page": page})
+
+
+def past_event_detail(request, pk):
+    event = get_object_or_404(
+        ArchivedEvent.objects.annotate(num_registrations=Count("registrations")), pk=pk
+    )
+    attended = (
+        request.user.is_authenticated
+        and event.registrations.filter(user=request.user).exists()
+    )
+    return render(
+        request,
+        "events/past_event_detail.html",
+        {"event": event, "attended": attended},
+    )
+
+
+@login_required
+def booking_history(request):
+    """The user's own archived room bookings, newest first."""
+    bookings = (
+        ArchivedRoomBooking.objects
+        .filter(user=request.user)
+        .select_related("room")
+        .order_by("-start_time")
+    )
+    page = Paginator(bookings, ARCHIVE_PAGE_SIZE).get_page(request.GET.get("page"))
+    return render(request, "rooms/booking_history.html", {"page": page})
+
+
 # =========================
 # ROOM BOOKING VIEWS
 # =========================
@@ -340,7 +724,37 @@ def room_booking_list(request):
         except Room.DoesNotExist:
             pass
 
-    if request.method == "POST":
+    booking_form = RoomBookingForm(initial=initial)
+    series_form = RoomBookingSeriesForm(initial=initial, prefix="series")
+
+    if request.method == "POST" and request.POST.get("kind") == "series":
+        # Recurring booking: every session is checked + inserted in one go
+        series_form = RoomBookingSeriesForm(request.POST, prefix="series")
+        if series_form.is_valid():
+            series = series_form.save(commit=False)
+            series.user = request.user
+            created, conflicts = book_series(series)
+
+            if conflicts:
+                clashes = ", ".join(
+                    f"{timezone.localtime(start):%b %d}" for start, _ in conflicts[:5]
+                )
+                more = f" (+{len(conflicts) - 5} more)" if len(conflicts) > 5 else ""
+                messages.error(
+                    request,
+                    f"{len(conflicts)} session(s) clash with existing bookings: "
+                    f"{clashes}{more}. Nothing was booked.",
+                )
+            elif not created:
+                messages.error(request, "That series has no sessions to book.")
+            else:
+                messages.success(
+                    request,
+                    f"You reserved {series.room.name} for {len(created)} sessions.",
+                )
+                return redirect("room_booking_list")
+
+    elif request.method == "POST":
         booking_form = RoomBookingForm(request.POST)
         if booking_form.is_valid():
             booking = booking_form.save(commit=False)
@@ -366,13 +780,15 @@ def room_booking_list(request):
                     f"{booking.start_time} to {booking.end_time}.",
                 )
                 return redirect("room_booking_list")
-    else:
-        booking_form = RoomBookingForm(initial=initial)
 
     context = {
         "rooms": rooms,
         "bookings": bookings,
         "booking_form": booking_form,
+        "series_form": series_form,
+        "my_calendar_url": request.build_absolute_uri(
+            reverse("user_calendar_feed", args=[calendar_token(request.user)])
+        ),
     }
     return render(request, "rooms/room_booking_list.html", context)
 
@@ -392,3 +808,413 @@ def room_booking_cancel(request, booking_id):
         messages.error(request, "You are not allowed to cancel this booking.")
 
     return redirect("room_booking_list")
+
+
+@login_required
+def room_booking_series_cancel(request, series_id):
+    """
+    Cancel the remaining (future) sessions of a recurring booking.
+    Same permissions as room_booking_cancel.
+    """
+    series = get_object_or_404(RoomBookingSeries, id=series_id)
+
+    if request.user == series.user or request.user.is_staff:
+        deleted, _ = series.bookings.filter(start_time__gte=timezone.now()).delete()
+        messages.info(request, f"Cancelled {deleted} upcoming session(s).")
+    else:
+        messages.error(request, "You are not allowed to cancel this booking.")
+
+    return redirect("room_booking_list")
+
+
+# =========================
+# ROOM UTILIZATION (STAFF)
+# =========================
+# Reads only the hourly RoomUsageRollup table (see catalog/rollups.py).
+
+WEEKDAY_NAMES = ["Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat"]
+
+
+def _utilization_report(request):
+    """Build the report sections for the ?room=<slug>&days=<n> filters."""
+    try:
+        days = max(int(request.GET.get("days", 90)), 1)
+    except ValueError:
+        days = 90
+
+    room = None
+    room_slug = request.GET.get("room")
+    if room_slug:
+        room = Room.objects.filter(slug=room_slug).first()
+
+    end = timezone.now()
+    filters = {"start": end - timedelta(days=days), "end": end, "room": room}
+    room_count = 1 if room else max(Room.objects.count(), 1)
+
+    def row(label, data, capacity_seconds=None):
+        seconds = data["seconds"] or 0
+        pct = round(100 * seconds / capacity_seconds, 1) if capacity_seconds else None
+        return {
+            "label": label,
+            "hours": round(seconds / 3600, 1),
+            "occupancy": pct,
+            "revenue": data["revenue"] or 0,
+        }
+
+    per_hour_capacity = days * 3600 * room_count
+    per_weekday_capacity = (days / 7) * 24 * 3600 * room_count
+
+    return {
+        "days": days,
+        "room": room,
+        "rooms": Room.objects.order_by("name"),
+        "by_hour": [
+            row(f"{d['bucket']:02d}:00", d, per_hour_capacity)
+            for d in rollups.usage_by_hour_of_day(**filters)
+        ],
+        "by_weekday": [
+            row(WEEKDAY_NAMES[d["bucket"] - 1], d, per_weekday_capacity)
+            for d in rollups.usage_by_weekday(**filters)
+        ],
+        "by_month": [
+            row(f"{d['bucket']:%Y-%m}", d) for d in rollups.usage_by_month(**filters)
+        ],
+        "by_room": [
+            row(d["room_name"], d, days * 24 * 3600)
+            for d in rollups.usage_by_room(**filters)
+        ],
+    }
+
+
+@user_passes_test(is_staff_user)
+def room_utilization_report(request):
+    """Staff-only: room occupancy by hour of day, weekday and month, plus revenue."""
+    report = _utilization_report(request)
+    return render(request, "rooms/room_utilization.html", report)
+
+
+@user_passes_test(is_staff_user)
+def room_utilization_csv(request):
+    """Same numbers as room_utilization_report, as a CSV download."""
+    report = _utilization_report(request)
+
+    response = HttpResponse(content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="room-utilization.csv"'
+    writer = csv.writer(response)
+    writer.writerow(["section", "bucket", "occupied_hours", "occupancy_pct", "revenue"])
+    for section in ("by_room", "by_hour", "by_weekday", "by_month"):
+        for r in report[section]:
+            writer.writerow([
+                section,
+                r["label"],
+                r["hours"],
+                "" if r["occupancy"] is None else r["occupancy"],
+                r["revenue"],
+            ])
+    return response
+
+
+# =========================
+# CALENDAR (.ics) FEEDS
+# =========================
+# Calendar apps poll these every few minutes. Rows are streamed in chunks
+# so memory stays flat as history grows, and each feed carries an ETag
+# built from a cheap aggregate so unchanged feeds answer 304.
+
+CALENDAR_SALT = "catalog.calendar"
+FEED_CHUNK_SIZE = 500
+
+
+def _calendar_version(user_id):
+    version = (
+        CalendarFeed.objects.filter(user_id=user_id)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return version or 0
+
+
+def calendar_token(user):
+    """
+    Signed token for a user's personal feed (calendar apps send no cookies).
+    Carries the user's CalendarFeed version, so reset_calendar_token()
+    invalidates it.
+    """
+    return signing.dumps([user.pk, _calendar_version(user.pk)], salt=CALENDAR_SALT)
+
+
+def _calendar_user(token):
+    try:
+        payload = signing.loads(token, salt=CALENDAR_SALT)
+    except signing.BadSignature:
+        return None
+    if isinstance(payload, int):
+        # links signed before feeds had versions count as version 0
+        payload = [payload, 0]
+    try:
+        user_id, version = payload
+    except (TypeError, ValueError):
+        return None
+    if version != _calendar_version(user_id):
+        return None
+    return get_user_model().objects.filter(pk=user_id).first()
+
+
+@login_required
+def reset_calendar_token(request):
+    """Revoke the user's feed link (e.g. it leaked) and show a fresh one."""
+    if request.method == "POST":
+        feed, _ = CalendarFeed.objects.get_or_create(user=request.user)
+        CalendarFeed.objects.filter(pk=feed.pk).update(version=F("version") + 1)
+        messages.info(
+            request,
+            "Your calendar link was reset. Subscribe again with the new link.",
+        )
+    return redirect("room_booking_list")
+
+
+def _feed_etag(*sources, extra=()):
+    """
+    Hash (row count, max id, last change) for each (queryset, field) pair,
+    plus any `extra` values the feed prints (e.g. the room's name).
+    Adding, cancelling or editing a row changes at least one of them.
+    """
+    parts = [str(value) for value in extra]
+    for qs, changed_field in sources:
+        agg = qs.order_by().aggregate(
+            n=Count("pk"), last_id=Max("pk"), last_change=Max(changed_field)
+        )
+        parts.append(f"{agg['n']}:{agg['last_id']}:{agg['last_change']}")
+    return hashlib.md5("|".join(parts).encode()).hexdigest()
+
+
+def _event_vevent(event):
+    return ics.vevent(
+        uid=f"event-{event.pk}@gamestore",
+        start=event.start_time,
+        summary=event.title,
+        description=event.description,
+        stamp=event.updated_at,
+    )
+
+
+def _booking_vevent(booking):
+    return ics.vevent(
+        uid=f"booking-{booking.pk}@gamestore",
+        start=booking.start_time,
+        end=booking.end_time,
+        summary=f"{booking.room.name} booking",
+        location=booking.room.name,
+        stamp=booking.updated_at,
+    )
+
+
+def _ics_response(name, filename, vevents):
+    response = StreamingHttpResponse(
+        ics.stream_calendar(name, vevents),
+        content_type="text/calendar; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'inline; filename="{filename}"'
+    return response
+
+
+def _events_feed_qs():
+    return Event.objects.order_by("date", "start_time")
+
+
+def _room_feed_qs(slug):
+    return RoomBooking.objects.filter(room__slug=slug)
+
+
+def _user_feed_querysets(user):
+    bookings = RoomBooking.objects.filter(user=user)
+    registrations = EventRegistration.objects.filter(user=user)
+    return bookings, registrations
+
+
+@condition(etag_func=lambda request: _feed_etag((_events_feed_qs(), "updated_at")))
+def events_calendar_feed(request):
+    """All events as an .ics feed."""
+    events = (
+        _events_feed_qs()
+        .only("pk", "title", "description", "start_time", "updated_at")
+        .iterator(chunk_size=FEED_CHUNK_SIZE)
+    )
+    return _ics_response(
+        "Game Store Events",
+        "events.ics",
+        (_event_vevent(e) for e in events),
+    )
+
+
+def _room_feed_etag(request, slug):
+    # the room's name is the calendar name and every event's summary, and
+    # Room has no updated_at, so it goes into the ETag as it is
+    room = Room.objects.filter(slug=slug).values_list("name", flat=True).first()
+    if room is None:
+        return None
+    return _feed_etag((_room_feed_qs(slug), "updated_at"), extra=[room])
+
+
+@condition(etag_func=_room_feed_etag)
+def room_calendar_feed(request, slug):
+    """Every booking for one room as an .ics feed."""
+    room = get_object_or_404(Room, slug=slug)
+    bookings = (
+        _room_feed_qs(slug)
+        .select_related("room")
+        .order_by("start_time")
+        .iterator(chunk_size=FEED_CHUNK_SIZE)
+    )
+    return _ics_response(
+        room.name,
+        f"{room.slug}.ics",
+        (_booking_vevent(b) for b in bookings),
+    )
+
+
+def _user_feed_etag(request, token):
+    user = _calendar_user(token)
+    if user is None:
+        return None
+    bookings, registrations = _user_feed_querysets(user)
+    # booking summaries print the room name (see _room_feed_etag)
+    rooms = (
+        Room.objects.filter(bookings__user=user)
+        .order_by("pk")
+        .values_list("pk", "name")
+        .distinct()
+    )
+    return _feed_etag(
+        (bookings, "updated_at"),
+        (registrations, "registered_at"),
+        (Event.objects.filter(registrations__user=user), "updated_at"),
+        extra=list(rooms),
+    )
+
+
+@condition(etag_func=_user_feed_etag)
+def user_calendar_feed(request, token):
+    """A user's own room bookings + registered events, via a signed token URL."""
+    user = _calendar_user(token)
+    if user is None:
+        raise Http404("Unknown calendar.")
+
+    bookings, registrations = _user_feed_querysets(user)
+    bookings = (
+        bookings
+        .select_related("room")
+        .order_by("start_time")
+        .iterator(chunk_size=FEED_CHUNK_SIZE)
+    )
+    registrations = (
+        registrations
+        .select_related("event")
+        .order_by("event__date", "event__start_time")
+        .iterator(chunk_size=FEED_CHUNK_SIZE)
+    )
+
+    def vevents():
+        for booking in bookings:
+            yield _booking_vevent(booking)
+        for registration in registrations:
+            yield _event_vevent(registration.event)
+
+    return _ics_response(f"{user.username} – Game Store", "my-calendar.ics", vevents())
+
+
+# =========================
+# ASYNC (ASGI) READ VIEWS
+# =========================
+# Same pages as product_list / product_detail / event_list / event_detail,
+# but using the async ORM so uvicorn can serve them without a trip through
+# the sync_to_async thread pool. shop/urls_async.py routes to these for
+# ASGI requests (see catalog.middleware.AsyncURLConfMiddleware).
+
+async def _aload_user(request):
+    """
+    Resolve request.user up front with the async auth API.
+    Templates read `user` lazily, which would otherwise hit the session
+    table from inside the event loop.
+    """
+    request.user = await request.auser()
+
+
+@cache_anonymous_page(Product)
+async def product_list_async(request):
+    """Async version of product_list."""
+    await _aload_user(request)
+    products = _product_list_snapshot(request)
+    if products is not None:
+        sort = "newest"
+    else:
+        products, sort = _product_list_queryset(request)
+        products = [p async for p in products]
+    return render(
+        request,
+        "catalog/product_list.html",
+        {"products": products, "sort": sort},
+    )
+
+
+@cache_anonymous_page(Product, RelatedProduct, on_hit=_count_cached_view)
+async def product_detail_async(request, slug):
+    """Async version of product_detail."""
+    await _aload_user(request)
+    snapshot = catalog_snapshot.current()
+    product = snapshot.by_slug(slug) if snapshot else None
+    related_products = None
+    if product is not None:
+        related_products = snapshot.by_ids([pk async for pk in _related_ids(product)])
+    else:
+        product = await aget_object_or_404(Product, slug=slug)
+    if related_products is None:
+        related_products = [link.related async for link in _related_links(product)]
+    product_counters.view(product.id)
+    response = render(
+        request,
+        "catalog/product_detail.html",
+        {"product": product, "related_products": related_products},
+    )
+    response.page_cache_meta = product.id
+    return response
+
+
+@cache_anonymous_page(Event, EventRegistration)
+async def event_list_async(request):
+    """Async version of event_list."""
+    await _aload_user(request)
+    events = [e async for e in _event_list_queryset()]
+    return render(request, "events/event_list.html", {"events": events})
+
+
+@cache_anonymous_page(Event, EventRegistration)
+async def event_detail_async(request, slug):
+    """Async version of event_detail."""
+    await _aload_user(request)
+    event = await Event.objects.filter(slug=slug).afirst()
+    if event is None:
+        return _past_event_redirect(
+            await ArchivedEvent.objects.filter(slug=slug).values_list("pk", flat=True).afirst()
+        )
+    is_registered = False
+    waitlist_position = None
+
+    if request.user.is_authenticated:
+        is_registered = await EventRegistration.objects.filter(
+            event=event, user=request.user
+        ).aexists()
+        if not is_registered:
+            waitlist_position = await waitlist.aposition(event, request.user)
+
+    current_count = await EventRegistration.objects.filter(event=event).acount()
+    # the template reads event.registrations_count; hand it the count we have
+    event.num_registrations = current_count
+
+    context = {
+        "event": event,
+        "is_registered": is_registered,
+        "waitlist_position": waitlist_position,
+        "current_count": current_count,
+    }
+    return render(request, "events/event_detail.html", context)
@@ -0,0 +1,81 @@
+# catalog/waitlist.py
+"""
+Event waitlists.
+
+A user who tries to register for a full event is queued once
+(EventWaitlistEntry) instead of being told to try again, so nobody has to
+keep refreshing. When a registration is deleted, promote() moves the head
+of the queue into the freed spot inside the same transaction (see the
+EventRegistration post_delete receiver in catalog/signals.py).
+
+Positions are not stored: a user's place is the number of entries for the
+event with an id <= theirs, one COUNT over the (event, id) index, so
+leaving or promoting never has to renumber anybody.
+"""
+from django.db import transaction
+from django.db.models import Subquery
+
+from . import pagecache
+from .models import Event, EventRegistration, EventWaitlistEntry
+
+
+def _position_qs(event, user):
+    mine = EventWaitlistEntry.objects.filter(event=event, user=user).values("pk")[:1]
+    # a user who isn't queued makes the subquery NULL, so the count is 0
+    return EventWaitlistEntry.objects.filter(event=event, pk__lte=Subquery(mine))
+
+
+def position(event, user):
+    """1-based place of `user` in the event's queue, or None. One query."""
+    return _position_qs(event, user).count() or None
+
+
+async def aposition(event, user):
+    return await _position_qs(event, user).acount() or None
+
+
+def join(event, user):
+    """Queue `user` (once) and return their position."""
+    EventWaitlistEntry.objects.get_or_create(event=event, user=user)
+    return position(event, user)
+
+
+def leave(event, user):
+    return EventWaitlistEntry.objects.filter(event=event, user=user).delete()[0] > 0
+
+
+def leave_many(event, user_ids):
+    """leave() for a batch of users (e.g. an attendee import), one DELETE."""
+    return EventWaitlistEntry.objects.filter(event=event, user_id__in=user_ids).delete()[0]
+
+
+def promote(event_id):
+    """
+    Register waiters from the head of the queue until the event is full
+    again (or everyone, for an unlimited event). Returns the promoted
+    user ids. Runs in the caller's transaction when there is one.
+    """
+    with transaction.atomic():
+        event = Event.objects.select_for_update().filter(pk=event_id).first()
+        if event is None:
+            return []
+
+        queue = EventWaitlistEntry.objects.filter(event=event).order_by("pk")
+        if event.capacity:
+            free = event.capacity - EventRegistration.objects.filter(event=event).count()
+            if free <= 0:
+                return []
+            queue = queue[:free]
+        heads = list(queue.values_list("pk", "user_id"))
+        if not heads:
+            return []
+
+        EventRegistration.objects.bulk_create(
+            [EventRegistration(event=event, user_id=user_id) for _, user_id in heads],
+            ignore_conflicts=True,
+        )
+        EventWaitlistEntry.objects.filter(pk__in=[pk for pk, _ in heads]).delete()
+
+    # bulk_create sends no signals
+    pagecache.bump(EventRegistration)
+    return [user_id for _, user_id in heads]
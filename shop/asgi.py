@@ -4,3 +4,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shop.settings")
 
 application = get_asgi_application()
+
+# Build the search autocomplete index now instead of on the first keystroke.
+from catalog.autocomplete import product_index  # noqa: E402
+
+product_index.warm()
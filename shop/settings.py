@@ -19,6 +19,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "catalog.middleware.AsyncURLConfMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -30,6 +31,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "shop.urls"
 
+# ASGI requests are routed through this URLconf instead, which swaps in
+# the async catalog views. Serve over ASGI with uvicorn (requirements.txt):
+#   uvicorn shop.asgi:application --workers 4
+ASGI_URLCONF = "shop.urls_async"
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -72,6 +78,74 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Shared by every process (web workers, run_tasks, management commands):
+# the page cache's version counters and locks (catalog/pagecache.py) and
+# the admission counters only work if they all see the same cache. The
+# table is created by `migrate` (catalog migration 0018) or
+# `python manage.py createcachetable`; for heavier traffic point this at
+# memcached / Redis instead.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "shop_cache",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+    # admission counters and "full" flags (catalog/admission.py), in their
+    # own table so culling page-cache entries never drops them
+    "admission": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "shop_admission_cache",
+    },
+}
+
+# Anonymous visitors get product / event pages from the page cache for up
+# to this long, or until the models they show change. 0 disables it.
+PAGE_CACHE_SECONDS = 300
+
 LOGIN_URL = "login"
 LOGIN_REDIRECT_URL = "product_list"
 LOGOUT_REDIRECT_URL = "product_list"
+
+# Product view / add-to-cart counters are buffered in memory and written
+# in batches this often (see catalog/counters.py). 0 disables the
+# background flusher (call product_counters.flush() yourself).
+PRODUCT_COUNTER_FLUSH_SECONDS = 30
+
+# Read-only product snapshot mmapped by every worker (catalog/snapshot.py).
+# Created by `python manage.py build_catalog_snapshot`; until the file
+# exists, or with None, catalog pages read the database as usual.
+CATALOG_SNAPSHOT_PATH = BASE_DIR / "catalog.snapshot"
+
+# Sitemap files (catalog/sitemaps.py) are cached here; /sitemap.xml checks
+# for changed shards at most this often. `manage.py build_sitemaps`
+# refreshes them on demand. <loc> URLs start with SITEMAP_BASE_URL (the
+# site's canonical scheme + host, never taken from a request).
+SITEMAP_ROOT = BASE_DIR / "sitemaps"
+SITEMAP_BASE_URL = "http://127.0.0.1:8000"
+SITEMAP_REFRESH_SECONDS = 3600
+
+# Product / event list cards are rendered by catalog/cards.py instead of
+# the per-card template loop (same markup, several times faster on long
+# pages). False renders catalog/_product_cards.html and
+# events/_event_cards.html instead; `manage.py bench_templates` compares.
+FAST_CARD_RENDERING = True
+
+# Background tasks (catalog/tasks.py) are stored in the Task table and run
+# by `python manage.py run_tasks`. When True, enqueue() runs them inline.
+TASKS_EAGER = False
+
+# Hot/cold archival (catalog/archive.py, `python manage.py archive_old_data`):
+# events dated more than N days ago and bookings that ended more than N
+# days ago are moved to the Archived* tables.
+ARCHIVE_EVENTS_AFTER_DAYS = 7
+ARCHIVE_BOOKINGS_AFTER_DAYS = 90
+
+# Admission control for event sign-ups (catalog/admission.py). Counters
+# and "full" flags live in this cache, which every worker process must
+# share (database / memcached / Redis, never local memory).
+ADMISSION_CACHE = "admission"
+# registration attempts per event per second that may reach the database
+ADMISSION_EVENT_RATE = 20
+# attempts per user per window (seconds)
+ADMISSION_USER_LIMIT = 5
+ADMISSION_USER_WINDOW = 10
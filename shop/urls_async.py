@@ -0,0 +1,25 @@
+# shop/urls_async.py
+"""
+URLconf used for ASGI requests (see catalog.middleware.AsyncURLConfMiddleware).
+
+The read-heavy catalog pages point at their async views; everything else
+falls through to the regular shop.urls patterns. Paths and names are the
+same, so {% url %} output does not change.
+"""
+from django.urls import path
+from catalog import views as catalog_views
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path("", catalog_views.product_list_async, name="product_list"),
+
+    # IMPORTANT: create / past paths BEFORE the async slug routes
+    path("product/create/", catalog_views.product_create, name="product_create"),
+    path("product/<slug:slug>/", catalog_views.product_detail_async, name="product_detail"),
+
+    path("events/", catalog_views.event_list_async, name="event_list"),
+    path("events/create/", catalog_views.event_create, name="event_create"),
+    path("events/past/", catalog_views.past_event_list, name="past_event_list"),
+    path("events/<slug:slug>/", catalog_views.event_detail_async, name="event_detail"),
+] + sync_urlpatterns
@@ -4,3 +4,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "shop.settings")
 
 application = get_wsgi_application()
+
+# Build the search autocomplete index now instead of on the first keystroke.
+from catalog.autocomplete import product_index  # noqa: E402
+
+product_index.warm()